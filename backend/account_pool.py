@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+import metrics
+from credentials import get_linkedin_accounts
+from linkedin_sessions import account_id, discard_storage_state
+from rate_limiter import IDLE_SECONDS, TokenBucketLimiter
+
+logger = logging.getLogger(__name__)
+
+# Pacing per account, shared by all workers through the rate limiter's SQLite file
+LINKEDIN_ACCOUNT_BURST = float(os.environ.get('LINKEDIN_ACCOUNT_BURST', 3))
+LINKEDIN_ACCOUNT_SCRAPES_PER_HOUR = float(os.environ.get('LINKEDIN_ACCOUNT_SCRAPES_PER_HOUR', 30))
+# Scrapes one account runs at once in this worker
+ACCOUNT_MAX_CONCURRENT_SCRAPES = int(os.environ.get('ACCOUNT_MAX_CONCURRENT_SCRAPES', 1))
+# Consecutive failed scrapes after which an account is quarantined
+ACCOUNT_MAX_FAILURES = int(os.environ.get('ACCOUNT_MAX_FAILURES', 3))
+ACCOUNT_ERROR_QUARANTINE_SECONDS = int(os.environ.get('ACCOUNT_ERROR_QUARANTINE_SECONDS', 300))
+ACCOUNT_CHALLENGE_QUARANTINE_SECONDS = int(os.environ.get('ACCOUNT_CHALLENGE_QUARANTINE_SECONDS', 3600))
+# Accounts whose password LinkedIn rejects sit out this long, or until their password is updated
+ACCOUNT_LOGIN_REJECTED_QUARANTINE_SECONDS = int(os.environ.get('ACCOUNT_LOGIN_REJECTED_QUARANTINE_SECONDS', 3600))
+# Longest a scrape waits for an account with budget left before giving up
+ACCOUNT_WAIT_SECONDS = int(os.environ.get('ACCOUNT_WAIT_SECONDS', 120))
+
+PACING_LIMITS = {'scrape': (LINKEDIN_ACCOUNT_BURST, LINKEDIN_ACCOUNT_SCRAPES_PER_HOUR / 3600.0)}
+
+accounts_healthy = metrics.gauge('linkedin_accounts_healthy', 'LinkedIn accounts not in quarantine')
+account_wait = metrics.histogram('linkedin_account_wait_seconds', 'Time scrapes waited for a LinkedIn account')
+unavailable_total = metrics.counter('linkedin_account_unavailable_total', 'Scrapes given up because no account had budget left')
+
+def _scrape_counter(outcome):
+    return metrics.counter('linkedin_account_scrapes_total', 'Scrapes by account outcome', {'outcome': outcome})
+
+def _quarantine_counter(reason):
+    return metrics.counter('linkedin_account_quarantines_total', 'Accounts put in quarantine, by reason', {'reason': reason})
+
+class AccountChallenged(Exception):
+    """LinkedIn answered with a security checkpoint or login wall"""
+
+class AccountLoginRejected(Exception):
+    """LinkedIn rejected the account's email or password on the login form"""
+
+class AccountUnavailable(Exception):
+    """No account can take a scrape within ACCOUNT_WAIT_SECONDS"""
+
+class LinkedInAccount:
+    """One set of LinkedIn credentials and its health in this worker"""
+
+    def __init__(self, email, password):
+        self.email = email
+        self.password = password
+        self.id = account_id(email)
+        self.active = 0
+        self.scrapes = 0
+        self.failures = 0
+        self.last_used = 0.0
+        self.quarantined_until = 0.0
+        self.quarantine_reason = None
+
+    @property
+    def masked_email(self):
+        return f'{self.email[:3]}***{self.email[-3:]}'
+
+    def healthy(self, now):
+        return now >= self.quarantined_until
+
+class AccountPool:
+    """
+    Routes each scrape to the least-loaded healthy LinkedIn account. Every account has
+    its own stored session and a token-bucket budget of scrapes; accounts that hit a
+    checkpoint, have their password rejected or keep failing are quarantined for a while. Accounts come from the
+    credentials module, so ones added at runtime are picked up on the next scrape.
+    Must only be used from the scraper loop.
+    """
+
+    def __init__(self, accounts=get_linkedin_accounts, limits=PACING_LIMITS,
+                 max_concurrent=ACCOUNT_MAX_CONCURRENT_SCRAPES, wait_seconds=ACCOUNT_WAIT_SECONDS):
+        self._list_accounts = accounts
+        self.limits = limits
+        self.max_concurrent = max(1, max_concurrent)
+        self.wait_seconds = wait_seconds
+        self._accounts = {}
+        self._limiter = None
+        self._released = None
+
+    def _sync(self):
+        """Pick up accounts added, removed or changed since the last scrape"""
+        configured = dict(self._list_accounts())
+        for email in list(self._accounts):
+            if email not in configured:
+                del self._accounts[email]
+        for email, password in configured.items():
+            account = self._accounts.get(email)
+            if account is None or account.password != password:
+                # New password: start afresh rather than keep a quarantine from the old one
+                self._accounts[email] = LinkedInAccount(email, password)
+        now = time.time()
+        accounts_healthy.set(sum(account.healthy(now) for account in self._accounts.values()))
+
+    def _take_token(self, account):
+        """Seconds until the account has budget for a scrape, or None after taking it"""
+        if self._limiter is None:
+            # Own table: the request limiter's LRU eviction must not hand an account a fresh burst,
+            # and a bucket is only dropped once idle long enough to have refilled
+            refill_seconds = max(capacity / rate if rate else math.inf for capacity, rate in self.limits.values())
+            self._limiter = TokenBucketLimiter(limits=self.limits, table='account_buckets',
+                                               idle_seconds=max(IDLE_SECONDS, refill_seconds))
+        try:
+            admitted, retry_after = self._limiter.acquire(account.id, 'scrape')
+        except Exception as e:
+            # Fail open, like the request rate limiter
+            logger.error(f'Account pacing error: {str(e)}')
+            return None
+        return None if admitted else retry_after
+
+    def stats(self):
+        """Per-account load and health, without credentials"""
+        now = time.time()
+        # Read-only, so accounts added since the last scrape are listed without syncing
+        accounts = [self._accounts.get(email) or LinkedInAccount(email, password)
+                    for email, password in self._list_accounts()]
+        return [
+            {
+                'email': account.masked_email,
+                'active_scrapes': account.active,
+                'scrapes': account.scrapes,
+                'consecutive_failures': account.failures,
+                'healthy': account.healthy(now),
+                'quarantined_for': max(0, round(account.quarantined_until - now)),
+                'quarantine_reason': account.quarantine_reason if not account.healthy(now) else None
+            }
+            for account in accounts
+        ]
+
+    async def _acquire(self):
+        if self._released is None:
+            # asyncio primitives bind to the loop they're first used on
+            self._released = asyncio.Condition()
+        loop = asyncio.get_running_loop()
+        started = time.time()
+        deadline = started + self.wait_seconds
+        while True:
+            self._sync()
+            if not self._accounts:
+                raise AccountUnavailable('LinkedIn credentials not set')
+            now = time.time()
+            waits = [account.quarantined_until - now for account in self._accounts.values() if not account.healthy(now)]
+            candidates = sorted(
+                (account for account in self._accounts.values()
+                 if account.healthy(now) and account.active < self.max_concurrent),
+                key=lambda account: (account.active, account.last_used)
+            )
+            for account in candidates:
+                # SQLite may wait on another worker's lock, so it runs off the loop
+                retry_after = await loop.run_in_executor(None, self._take_token, account)
+                if retry_after is None:
+                    account.active += 1
+                    account.last_used = time.time()
+                    account_wait.observe(account.last_used - started)
+                    return account
+                waits.append(retry_after)
+
+            # Wake on the next refill or quarantine end; busy accounts wake us on release
+            busy = any(account.healthy(now) and account.active >= self.max_concurrent
+                       for account in self._accounts.values())
+            remaining = deadline - time.time()
+            wait = min(waits + [remaining] if busy else waits, default=remaining)
+            if wait > remaining or remaining <= 0:
+                unavailable_total.inc()
+                raise AccountUnavailable(f'No LinkedIn account available for {round(wait)} seconds')
+            async with self._released:
+                try:
+                    await asyncio.wait_for(self._released.wait(), timeout=max(0.1, wait))
+                except asyncio.TimeoutError:
+                    pass
+
+    def _quarantine(self, account, reason, seconds):
+        account.quarantined_until = time.time() + seconds
+        account.quarantine_reason = reason
+        _quarantine_counter(reason).inc()
+        logger.warning(f'LinkedIn account {account.masked_email} quarantined for {seconds}s: {reason}')
+
+    async def _release(self, account, outcome):
+        account.active -= 1
+        account.scrapes += 1
+        _scrape_counter(outcome).inc()
+        if outcome == 'ok':
+            account.failures = 0
+        elif outcome == 'challenge':
+            # The stored session is what got challenged; the next login starts clean
+            discard_storage_state(account.email)
+            self._quarantine(account, 'challenge', ACCOUNT_CHALLENGE_QUARANTINE_SECONDS)
+        elif outcome == 'login_rejected':
+            # Retrying can't fix a wrong password; a new one resets the account in _sync()
+            self._quarantine(account, 'login_rejected', ACCOUNT_LOGIN_REJECTED_QUARANTINE_SECONDS)
+        else:
+            account.failures += 1
+            if account.failures >= ACCOUNT_MAX_FAILURES:
+                account.failures = 0
+                self._quarantine(account, 'errors', ACCOUNT_ERROR_QUARANTINE_SECONDS)
+        async with self._released:
+            self._released.notify_all()
+
+    @asynccontextmanager
+    async def account(self):
+        """An account to scrape with; exceptions raised in the block count against it"""
+        account = await self._acquire()
+        outcome = 'ok'
+        try:
+            yield account
+        except AccountChallenged:
+            outcome = 'challenge'
+            raise
+        except AccountLoginRejected:
+            outcome = 'login_rejected'
+            raise
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            await self._release(account, outcome)
+
+# Create global account pool instance (used on the scraper loop only)
+account_pool = AccountPool()
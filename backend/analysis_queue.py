@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Uncached analyses running at once per worker; each one starts a Chromium
+ANALYSIS_CONCURRENCY = int(os.environ.get('ANALYSIS_CONCURRENCY', 2))
+# Live requests allowed to wait for a slot before new ones are turned away
+ANALYSIS_QUEUE_DEPTH = int(os.environ.get('ANALYSIS_QUEUE_DEPTH', 8))
+# Longest a live request waits for a slot before it is turned away after all
+ANALYSIS_QUEUE_WAIT_SECONDS = float(os.environ.get('ANALYSIS_QUEUE_WAIT_SECONDS', 120))
+# Processing time assumed until a few analyses have been measured
+INITIAL_ANALYSIS_SECONDS = 60.0
+
+queue_depth = metrics.gauge('analysis_queue_depth', 'Analyses waiting for a slot')
+running = metrics.gauge('analyses_running', 'Analyses holding a slot')
+queue_wait = metrics.histogram('analysis_queue_wait_seconds', 'Time analyses waited for a slot')
+processing = metrics.histogram('analysis_processing_seconds', 'Time analyses held a slot')
+rejected = metrics.counter('analysis_queue_rejections_total', 'Analyses turned away because the queue was full')
+
+class QueueFull(Exception):
+    """The analysis queue is at its maximum depth"""
+
+    def __init__(self, position, retry_after):
+        super().__init__(f'Analysis queue is full ({position - 1} waiting)')
+        self.position = position
+        self.retry_after = retry_after
+
+def queue_full_response(error):
+    """Fast 503 as (body, status, headers), which Flask and Quart views can both return, telling
+    the client where it would have been in the queue and when to retry"""
+    logger.warning(f'Analysis queue full, rejecting request at position {error.position}')
+    body = {
+        'error': 'The server is busy with other analyses, please retry shortly',
+        'queue_position': error.position,
+        'retry_after': error.retry_after
+    }
+    return body, 503, {'Retry-After': str(error.retry_after)}
+
+class _Waiter:
+    """A queued analysis; woken through a threading.Event or an asyncio future"""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def grant(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+class Timing:
+    """Queue wait and processing time of one analysis, in seconds"""
+
+    def __init__(self):
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def wait(self):
+        return (self.started_at or time.time()) - self.queued_at
+
+    @property
+    def processing(self):
+        return (self.finished_at or time.time()) - (self.started_at or time.time())
+
+    def server_timing(self):
+        """Server-Timing header value, so clients see both parts"""
+        return f'queue;dur={self.wait * 1000:.0f}, processing;dur={self.processing * 1000:.0f}'
+
+class AnalysisQueue:
+    """
+    Admission control for uncached analyses. At most `concurrency` run at once; live
+    requests wait in FIFO order up to `max_depth` and are turned away beyond it with an
+    estimate of when to retry, as are those still waiting after `max_wait` seconds.
+    Background refreshes wait behind live requests and are never turned away.
+    Works for both threads and asyncio tasks; a waiting thread holds its server thread,
+    so sync servers need more threads than `concurrency + max_depth`.
+    """
+
+    def __init__(self, concurrency=ANALYSIS_CONCURRENCY, max_depth=ANALYSIS_QUEUE_DEPTH,
+                 max_wait=ANALYSIS_QUEUE_WAIT_SECONDS):
+        self.concurrency = max(1, concurrency)
+        self.max_depth = max_depth
+        self.max_wait = max_wait
+        self._running = 0
+        self._live = deque()
+        self._background = deque()
+        self._avg_seconds = INITIAL_ANALYSIS_SECONDS
+        self._lock = threading.Lock()
+
+    def estimate_wait(self, position):
+        """Seconds until the analysis at this queue position (1 = next) gets a slot"""
+        return math.ceil(position / self.concurrency) * self._avg_seconds
+
+    def _enqueue(self, loop, background):
+        """Take a slot now (returns None) or queue a waiter for one"""
+        with self._lock:
+            waiting = len(self._live) + len(self._background)
+            if self._running < self.concurrency and waiting == 0:
+                self._running += 1
+                running.set(self._running)
+                return None
+            if not background and len(self._live) >= self.max_depth:
+                position = len(self._live) + 1
+                rejected.inc()
+                raise QueueFull(position, math.ceil(self.estimate_wait(position)))
+            waiter = _Waiter(loop)
+            (self._background if background else self._live).append(waiter)
+            queue_depth.set(waiting + 1)
+            return waiter
+
+    def _release(self, timing):
+        timing.finished_at = time.time()
+        with self._lock:
+            if timing.started_at is not None:
+                processing.observe(timing.processing)
+                # Moving average of processing time for queue position estimates
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * timing.processing
+            waiter = (self._live or self._background or [None])[0]
+            if waiter is None:
+                self._running -= 1
+            else:
+                # Hand the slot straight to the next waiter, live requests first
+                (self._live if self._live else self._background).popleft()
+                waiter.grant()
+            running.set(self._running)
+            queue_depth.set(len(self._live) + len(self._background))
+
+    def _abandon(self, waiter):
+        """Remove a waiter that gave up; True if it was granted the slot meanwhile"""
+        with self._lock:
+            for waiters in (self._live, self._background):
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                    queue_depth.set(len(self._live) + len(self._background))
+                    return False
+        return True
+
+    def _timed_out(self, waiter):
+        """Turn away a live waiter that waited max_wait, unless it got the slot meanwhile"""
+        if self._abandon(waiter):
+            return
+        position = len(self._live) + 1
+        rejected.inc()
+        raise QueueFull(position, math.ceil(self.estimate_wait(position)))
+
+    def _started(self, timing):
+        timing.started_at = time.time()
+        queue_wait.observe(timing.wait)
+
+    @contextmanager
+    def slot(self, background=False):
+        """Hold an analysis slot for the duration of the block; raises QueueFull when full,
+        or when a live request waited max_wait without getting a slot"""
+        timing = Timing()
+        waiter = self._enqueue(None, background)
+        if waiter is not None and not waiter.event.wait(None if background else self.max_wait):
+            self._timed_out(waiter)
+        self._started(timing)
+        try:
+            yield timing
+        finally:
+            self._release(timing)
+
+    @asynccontextmanager
+    async def aslot(self):
+        """slot() for asyncio tasks: waits without blocking the event loop"""
+        timing = Timing()
+        waiter = self._enqueue(asyncio.get_running_loop(), False)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+            except asyncio.TimeoutError:
+                self._timed_out(waiter)
+            except asyncio.CancelledError:
+                # Client went away while queued
+                if self._abandon(waiter):
+                    self._release(timing)
+                raise
+        self._started(timing)
+        try:
+            yield timing
+        finally:
+            self._release(timing)
+
+# Create global analysis queue instance
+analysis_queue = AnalysisQueue()
@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+import metrics
+from similarity_calculator import SimilarityCalculator
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: a cached answer is only as good as the question it was stored for
+ANSWER_CACHE_ENABLED = os.environ.get('CHAT_ANSWER_CACHE_ENABLED', '').lower() in ('1', 'true', 'yes')
+# Cosine similarity above which two questions are treated as the same question
+ANSWER_CACHE_THRESHOLD = float(os.environ.get('CHAT_ANSWER_CACHE_THRESHOLD', 0.92))
+MAX_ANSWERS_PER_ANALYSIS = 200
+# Analyses with cached answers held per worker; the least recently used are dropped
+MAX_CACHED_ANALYSES = int(os.environ.get('CHAT_ANSWER_CACHE_MAX_ANALYSES', 500))
+
+hits_total = metrics.counter('chat_answer_cache_requests_total', 'Semantic answer cache lookups', {'result': 'hit'})
+misses_total = metrics.counter('chat_answer_cache_requests_total', 'Semantic answer cache lookups', {'result': 'miss'})
+hit_rate = metrics.gauge('chat_answer_cache_hit_rate', 'Share of first-turn chat questions answered from cache')
+
+class SemanticAnswerCache:
+    """
+    Answers to first-turn chat questions, per analysis, looked up by question embedding.
+    Only first turns are cached because later answers depend on the conversation so far.
+    Answers are tied to the version (file mtime) of the analysis they were given for, so
+    every worker drops them once the analysis is regenerated, wherever that happened.
+    """
+
+    def __init__(self, enabled: bool = ANSWER_CACHE_ENABLED, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = MAX_ANSWERS_PER_ANALYSIS, max_analyses: int = MAX_CACHED_ANALYSES):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_analyses = max_analyses
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, analysis_id: str, version) -> Optional[dict]:
+        """The analysis's entry if it is for this version; a stale one is dropped. Call with the lock held."""
+        entry = self._entries.get(analysis_id)
+        if entry is None:
+            return None
+        if entry['version'] != version:
+            del self._entries[analysis_id]
+            return None
+        self._entries.move_to_end(analysis_id)
+        return entry
+
+    def lookup(self, analysis_id: str, version, question: str) -> Tuple[Optional[str], np.ndarray]:
+        """
+        Find a stored answer to a similar question about this version of the analysis.
+        Returns:
+            Tuple containing:
+            - the stored answer, or None on a miss
+            - the question's embedding, to pass to store() on a miss
+        """
+        vector = SimilarityCalculator().get_embeddings([question.strip()])[0]
+        answer = None
+        with self._lock:
+            entry = self._entry(analysis_id, version)
+            if entry and len(entry['answers']):
+                scores = entry['vectors'] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    answer = entry['answers'][best]
+                    logger.info(f'Answer cache hit ({scores[best]:.3f}) for "{question}" ~ "{entry["questions"][best]}"')
+
+        (hits_total if answer is not None else misses_total).inc()
+        total = hits_total.value + misses_total.value
+        hit_rate.set(hits_total.value / total)
+        return answer, vector
+
+    def store(self, analysis_id: str, version, question: str, vector: np.ndarray, answer: str):
+        """Remember the answer to a first-turn question about this version of the analysis"""
+        with self._lock:
+            entry = self._entry(analysis_id, version)
+            if entry is None:
+                entry = self._entries[analysis_id] = {
+                    'version': version,
+                    'vectors': np.zeros((0, len(vector)), dtype=np.float32),
+                    'questions': [],
+                    'answers': []
+                }
+                while len(self._entries) > self.max_analyses:
+                    self._entries.popitem(last=False)
+            # Oldest answers make room for new ones
+            start = max(0, len(entry['answers']) - self.max_entries + 1)
+            entry['vectors'] = np.vstack([entry['vectors'][start:], vector[np.newaxis, :].astype(np.float32)])
+            entry['questions'] = entry['questions'][start:] + [question]
+            entry['answers'] = entry['answers'][start:] + [answer]
+
+    def clear(self, analysis_id: Optional[str] = None):
+        """Forget cached answers for one analysis, or for all of them"""
+        with self._lock:
+            if analysis_id:
+                self._entries.pop(analysis_id, None)
+            else:
+                self._entries.clear()
+
+# Create global answer cache instance
+answer_cache = SemanticAnswerCache()
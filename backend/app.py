@@ -1,68 +1,87 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from generate_summary import main as generate_summary_main
+from generate_summary import main as generate_summary_main, parse_linkedin_data
 import os
 import time
-from functools import wraps
 import logging
-import sys
 from io import StringIO
 import json
+import hashlib
+import re
 import pathlib
+import tempfile
 import uuid
 from chatbot import chat_manager
+from answer_cache import answer_cache
 from similarity_calculator import SimilarityCalculator
+from profile_index import profile_index, get_profile_id, section_text
+from section_store import SECTIONS_DIR
+import metrics
+from metrics import span
+from logging_setup import configure_logging, log_request
+from rate_limiter import rate_limit, check_rate_limit, rate_limited
+from background_refresh import RefreshScheduler, CACHE_TTL_SECONDS, CACHE_MAX_STALE_SECONDS
+from response_cache import ResponseCache, CachedResponse
+from analysis_queue import analysis_queue, QueueFull, queue_full_response
+from browser_manager import browser_manager
+from werkzeug.middleware.proxy_fix import ProxyFix
 import requests
 from credentials import (
     set_linkedin_credentials, 
     set_gemini_api_key, 
     get_linkedin_credentials, 
-    get_gemini_api_key
+    get_gemini_api_key,
+    add_linkedin_account,
+    remove_linkedin_account
+)
+from account_pool import account_pool
+from export_analyses import (
+    SCHEMAS as EXPORT_SCHEMAS,
+    ExportUnavailable,
+    ExportJobs,
+    parse_watermark,
+    iter_analysis_files,
+    iter_export_rows,
+    iter_csv
 )
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('app.log')
-    ]
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-# More verbose CORS configuration
+# Behind a load balancer (e.g. Render) the client IP is in X-Forwarded-For
+if int(os.environ.get('TRUSTED_PROXY_HOPS', 0)):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ['TRUSTED_PROXY_HOPS']))
+# More verbose CORS configuration (shared with the async app)
+CORS_ORIGINS = [
+    "http://localhost:5173",  # Vite dev server
+    "http://127.0.0.1:5173",
+    "http://localhost:5000",  # Flask server
+    "http://127.0.0.1:5000",
+    "https://easyrecruit-ai.netlify.app"
+]
+CORS_HEADERS = [
+    "Content-Type", 
+    "X-Requested-With",
+    "Authorization", 
+    "Access-Control-Allow-Origin",
+    "Access-Control-Allow-Headers",
+    "Access-Control-Allow-Credentials"
+]
 CORS(app, resources={
     r"/*": {
-        "origins": [
-            "http://localhost:5173",  # Vite dev server
-            "http://127.0.0.1:5173",
-            "http://localhost:5000",  # Flask server
-            "http://127.0.0.1:5000",
-            "https://easyrecruit-ai.netlify.app"
-        ],
-        "allow_headers": [
-            "Content-Type", 
-            "X-Requested-With",
-            "Authorization", 
-            "Access-Control-Allow-Origin",
-            "Access-Control-Allow-Headers",
-            "Access-Control-Allow-Credentials"
-        ],
+        "origins": CORS_ORIGINS,
+        "allow_headers": CORS_HEADERS,
         "supports_credentials": True,
         "methods": ["GET", "POST", "OPTIONS"]
     }
 })
 
-# Add a catch-all logging middleware
+# Add a catch-all logging middleware (sampled, redacted and truncated)
 @app.before_request
 def log_request_info():
-    app.logger.info('Request Headers: %s', request.headers)
-    app.logger.info('Request Method: %s', request.method)
-    app.logger.info('Request URL: %s', request.url)
-    if request.get_data():
-        app.logger.info('Request Data: %s', request.get_data())
+    log_request(app.logger, request)
 
 # Explicit OPTIONS handler
 @app.route('/api/set-credentials', methods=['OPTIONS'])
@@ -76,60 +95,211 @@ def handle_options():
 # File-based cache configuration
 CACHE_DIR = pathlib.Path('cache')
 CACHE_DIR.mkdir(exist_ok=True)
+# Pre-serialized responses of recently requested analyses
+response_cache = ResponseCache(CACHE_DIR, CACHE_TTL_SECONDS)
+
+def get_analysis_id(url, custom_prompt=None):
+    """Stable ID of the analysis of a URL and optional custom prompt (hash() differs between workers)"""
+    key = f"{get_profile_id(url)}_{custom_prompt or 'default'}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
 
 def get_cache_key(url, custom_prompt=None):
     """Generate a safe filename from URL and optional custom prompt"""
-    key = f"{url}_{hash(custom_prompt) if custom_prompt else 'default'}"
-    return str(hash(key)) + '.json'
+    return get_analysis_id(url, custom_prompt) + '.json'
+
+def get_analysis(analysis_id):
+    """Load a stored analysis by ID, regardless of its age"""
+    if not re.fullmatch(r'[0-9a-f]{20}', analysis_id or ''):
+        return None
+    try:
+        cache_file = CACHE_DIR / f'{analysis_id}.json'
+        if cache_file.exists():
+            with open(cache_file, 'r') as f:
+                return json.load(f)
+        return None
+    except Exception as e:
+        logger.error(f'Error reading stored analysis: {str(e)}')
+        return None
+
+def analysis_mtime(analysis_id):
+    """When an analysis was last written, which versions it across workers; None if it isn't stored"""
+    try:
+        return (CACHE_DIR / f'{analysis_id}.json').stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+def cache_age(analysis_id):
+    """Seconds since an analysis was cached, or None if it isn't"""
+    mtime = analysis_mtime(analysis_id)
+    return None if mtime is None else time.time() - mtime
 
 def get_from_cache(url, custom_prompt=None):
-    """Get cached result for a URL and custom prompt combination"""
+    """
+    Get cached result for a URL and custom prompt combination, from memory if possible.
+    Returns:
+        Tuple containing:
+        - the serialized cached result, or None
+        - whether it is stale and should be rebuilt
+    """
+    return get_cached_analysis(get_analysis_id(url, custom_prompt), url)
+
+def get_cached_analysis(analysis_id, url=None):
+    """get_from_cache() by analysis ID; `url` is only used in log lines"""
+    url = url or analysis_id
     try:
-        cache_file = CACHE_DIR / get_cache_key(url, custom_prompt)
+        # Before the file is read, so a clear() racing the read can't be missed
+        generation = response_cache.generation
+        entry = response_cache.get(analysis_id)
+        if entry:
+            logger.info(f'Memory cache hit for URL: {url}')
+            metrics.counter('analysis_cache_requests_total', 'Analysis cache lookups', {'result': 'hit'}).inc()
+            return entry, False
+
+        cache_file = CACHE_DIR / f'{analysis_id}.json'
         if cache_file.exists():
-            # Check if cache is less than 24 hours old
-            if time.time() - cache_file.stat().st_mtime < 86400:  # 24 hours
-                with open(cache_file, 'r') as f:
-                    logger.info(f'Cache hit for URL: {url}')
-                    return json.load(f)
+            mtime = cache_file.stat().st_mtime
+            age = time.time() - mtime
+            if age < CACHE_TTL_SECONDS:
+                logger.info(f'Cache hit for URL: {url}')
+                metrics.counter('analysis_cache_requests_total', 'Analysis cache lookups', {'result': 'hit'}).inc()
+                return response_cache.put(analysis_id, cache_file.read_bytes(), mtime, generation), False
+            elif age < CACHE_MAX_STALE_SECONDS:
+                # Serve it now and rebuild it in the background
+                logger.info(f'Serving stale cache for URL: {url}')
+                metrics.counter('analysis_cache_requests_total', 'Analysis cache lookups', {'result': 'stale'}).inc()
+                return CachedResponse(cache_file.read_bytes(), mtime, generation), True
             else:
                 logger.info(f'Cache expired for URL: {url}')
+                metrics.counter('analysis_cache_requests_total', 'Analysis cache lookups', {'result': 'expired'}).inc()
                 cache_file.unlink()  # Delete expired cache
-        return None
+                return None, False
+        metrics.counter('analysis_cache_requests_total', 'Analysis cache lookups', {'result': 'miss'}).inc()
+        return None, False
     except Exception as e:
         logger.error(f'Error reading cache: {str(e)}')
-        return None
+        return None, False
 
 def save_to_cache(url, data, custom_prompt=None):
-    """Save result to cache"""
+    """Save result to cache, keeping its serialized form in memory too"""
     try:
+        generation = response_cache.generation
+        analysis_id = get_analysis_id(url, custom_prompt)
         cache_file = CACHE_DIR / get_cache_key(url, custom_prompt)
-        with open(cache_file, 'w') as f:
-            json.dump(data, f)
+        body = json.dumps(data).encode('utf-8')
+        # Write to a temporary file and swap it in, so readers never see a half-written analysis
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, cache_file)
+        except BaseException:
+            pathlib.Path(tmp_path).unlink(missing_ok=True)
+            raise
+        response_cache.put(analysis_id, body, cache_file.stat().st_mtime, generation)
         logger.info(f'Saved to cache: {url}')
     except Exception as e:
         logger.error(f'Error saving to cache: {str(e)}')
 
-def rate_limit(limit_seconds=60):
-    """Rate limiting decorator"""
-    def decorator(f):
-        last_request_time = {}
-        
-        @wraps(f)
-        def wrapped(*args, **kwargs):
-            current_time = time.time()
-            if request.remote_addr in last_request_time:
-                time_passed = current_time - last_request_time[request.remote_addr]
-                if time_passed < limit_seconds:
-                    logger.warning(f'Rate limit exceeded for IP {request.remote_addr}')
-                    return jsonify({
-                        'error': f'Please wait {int(limit_seconds - time_passed)} seconds before making another request'
-                    }), 429
-            
-            last_request_time[request.remote_addr] = current_time
-            return f(*args, **kwargs)
-        return wrapped
-    return decorator
+def cached_analysis_response(analysis_id, entry, stale):
+    """
+    A cached analysis as (body, status, headers), which Flask and Quart views can both return.
+    Stale ones are marked as such and queued for a refresh.
+    """
+    logger.info('Returning cached result')
+    if not stale:
+        return entry.body, 200, {'Content-Type': 'application/json'}
+    refresher.submit(analysis_id)
+    cached_result = json.loads(entry.body)
+    cached_result['stale'] = True
+    cached_result['refreshing'] = refresher.is_refreshing(analysis_id)
+    return cached_result, 200, {}
+
+def cached_json_response(entry):
+    """Serve a pre-serialized response to a GET, or a 304 if the client already has this version"""
+    if request.if_none_match.contains(entry.etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    # Browsers keep the response but revalidate it with If-None-Match on every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def index_profile(url, raw_data, summary):
+    """Add an analyzed profile to the vector index used for similarity search"""
+    try:
+        sections = parse_linkedin_data(raw_data)
+        profile = sections.get('profile') or {}
+        documents = {
+            'summary': summary,
+            'profile': section_text(profile),
+            'experience': section_text(sections.get('experience')),
+            'education': section_text(sections.get('education')),
+            'posts': section_text(sections.get('posts'))
+        }
+        metadata = {
+            'name': profile.get('Name', 'N/A'),
+            'designation': profile.get('Designation', 'N/A')
+        }
+        profile_index.add(get_profile_id(url), url, documents, metadata)
+    except Exception as e:
+        logger.error(f'Error indexing profile: {str(e)}')
+
+def finish_analysis(url, custom_prompt, summary_options, output):
+    """Score, cache and index the output of a summary run; returns the response data or None on failure"""
+    # Parse the output to extract the summary
+    summary_marker = "=== Generated Professional Summary ==="
+    if summary_marker not in output:
+        return None
+
+    summary = output.split(summary_marker)[1].strip()
+    
+    # Calculate similarity between raw data and summary
+    calculator = SimilarityCalculator()
+    with span('similarity'):
+        similarity_score, similarity_metrics = calculator.calculate_similarity(output, summary)
+    
+    # Create response data
+    response_data = {
+        'analysis_id': get_analysis_id(url, custom_prompt),
+        'url': url,
+        'analyzed_at': time.time(),
+        'summary_options': summary_options,
+        'summary': summary,
+        'raw_data': output,
+        'similarity_analysis': {
+            'score': similarity_score,
+            'metrics': similarity_metrics
+        }
+    }
+    
+    # Save to cache
+    save_to_cache(url, response_data, custom_prompt)
+    chat_manager.invalidate_analysis(response_data['analysis_id'])
+    with span('index_profile'):
+        index_profile(url, output, summary)
+    return response_data
+
+def run_analysis(url, custom_prompt=None, summary_options=None):
+    """Scrape, summarize, score and cache one profile; returns the response data or None on failure"""
+    # Run the main function from generate_summary.py with the URL and custom prompt
+    string_buffer = StringIO()
+    
+    with span('generate_summary'):
+        generate_summary_main(url, custom_prompt, summary_options, out=string_buffer)
+    
+    return finish_analysis(url, custom_prompt, summary_options, string_buffer.getvalue())
+
+def refresh_analysis(entry):
+    """Rebuild a cached analysis in the background with the options it was last requested with"""
+    # Refreshes wait for a slot behind live requests
+    with analysis_queue.slot(background=True):
+        response_data = run_analysis(entry['url'], entry['custom_prompt'], entry['summary_options'])
+    if response_data is None:
+        raise RuntimeError('Failed to generate summary')
+
+refresher = RefreshScheduler(refresh_analysis, cache_age, CACHE_DIR)
+export_jobs = ExportJobs(cache_dir=CACHE_DIR)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -137,6 +307,16 @@ def health_check():
     logger.info('Health check endpoint called')
     return jsonify({'status': 'healthy'})
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Current metric values of this worker process, plus the usage of each running browser"""
+    return jsonify({**metrics.snapshot(), 'browsers': browser_manager.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Metrics of this worker process in the Prometheus text format"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/analyze-profile', methods=['POST'])
 def analyze_profile():
     try:
@@ -155,99 +335,277 @@ def analyze_profile():
         logger.info(f'Analyzing profile: {linkedin_url}')
         logger.info(f'Custom prompt provided: {custom_prompt if custom_prompt else "None"}')
         
-        # Create cache key that includes both URL and prompt
-        cache_key = f"{linkedin_url}_{hash(custom_prompt) if custom_prompt else 'default'}"
-        
+        analysis_id = get_analysis_id(linkedin_url, custom_prompt)
+        refresher.record_request(analysis_id, linkedin_url, custom_prompt, summary_options)
+
         # Check cache first
-        cached_result = get_from_cache(linkedin_url, custom_prompt)
-        if cached_result:
-            logger.info('Returning cached result')
-            return jsonify(cached_result)
-        
-        # Run the main function from generate_summary.py with the URL and custom prompt
-        old_stdout = sys.stdout
-        string_buffer = StringIO()
-        sys.stdout = string_buffer
-        
-        generate_summary_main(linkedin_url, custom_prompt, summary_options)
-        
-        # Get the output and restore stdout
-        output = string_buffer.getvalue()
-        sys.stdout = old_stdout
-        
-        # Parse the output to extract the summary
-        summary_marker = "=== Generated Professional Summary ==="
-        if summary_marker in output:
-            summary = output.split(summary_marker)[1].strip()
-            
-            # Calculate similarity between raw data and summary
-            calculator = SimilarityCalculator()
-            similarity_score, similarity_metrics = calculator.calculate_similarity(output, summary)
-            
-            # Create response data
-            response_data = {
-                'summary': summary,
-                'raw_data': output,
-                'similarity_analysis': {
-                    'score': similarity_score,
-                    'metrics': similarity_metrics
-                }
-            }
-            
-            # Save to cache
-            save_to_cache(linkedin_url, response_data, custom_prompt)
-            
-            end_time = time.time()
-            logger.info(f'Profile analysis completed in {end_time - start_time:.2f} seconds')
-            
-            return jsonify(response_data)
-        else:
+        cached_entry, stale = get_from_cache(linkedin_url, custom_prompt)
+        if cached_entry:
+            return cached_analysis_response(analysis_id, cached_entry, stale)
+
+        # Only analyses that start a scrape use up the client's analyze budget
+        retry_after = check_rate_limit(request.remote_addr, 'analyze')
+        if retry_after is not None:
+            return rate_limited(retry_after)
+
+        try:
+            with analysis_queue.slot() as timing, refresher.live_analysis():
+                response_data = run_analysis(linkedin_url, custom_prompt, summary_options)
+        except QueueFull as e:
+            return queue_full_response(e)
+        if response_data is None:
             logger.error('Failed to generate summary')
             return jsonify({'error': 'Failed to generate summary'}), 500
+
+        end_time = time.time()
+        metrics.histogram('analysis_duration_seconds', 'End-to-end latency of uncached profile analyses').observe(end_time - start_time)
+        logger.info(f'Profile analysis completed in {end_time - start_time:.2f} seconds '
+                    f'({timing.wait:.2f}s queued, {timing.processing:.2f}s processing)')
+
+        response = jsonify(response_data)
+        response.headers['Server-Timing'] = timing.server_timing()
+        return response
             
     except Exception as e:
         logger.error(f'Unexpected error during profile analysis: {str(e)}', exc_info=True)
-        if 'sys.stdout' in locals():
-            sys.stdout = old_stdout  # Ensure stdout is restored in case of error
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analyses/<analysis_id>', methods=['GET'])
+def get_stored_analysis(analysis_id):
+    """
+    A fresh stored analysis, with an ETag so repeat requests are answered with a 304.
+    Stale, expired and unknown analyses are a 404; POST /api/analyze-profile rebuilds them.
+    """
+    if not re.fullmatch(r'[0-9a-f]{20}', analysis_id):
+        return jsonify({'error': 'Invalid analysis ID'}), 400
+    cached_entry, stale = get_cached_analysis(analysis_id)
+    if not cached_entry or stale:
+        return jsonify({'error': 'Analysis not found or out of date'}), 404
+    return cached_json_response(cached_entry)
+
 @app.route('/api/clear-cache', methods=['POST'])
 def clear_cache():
     """Clear the cache directory"""
     try:
         for cache_file in CACHE_DIR.glob('*.json'):
             cache_file.unlink()
+        for section_file in SECTIONS_DIR.glob('*.json'):
+            section_file.unlink()
+        response_cache.clear()
+        answer_cache.clear()
         logger.info('Cache cleared successfully')
         return jsonify({'message': 'Cache cleared successfully'})
     except Exception as e:
         logger.error(f'Error clearing cache: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/export', methods=['GET'])
+@rate_limit('export')
+def export_profiles():
+    """
+    Export stored analyses. CSV streams one table (`table`, default profiles). Parquet (one
+    table) and XLSX (a workbook with every table) are built in the background: the response
+    is a 202 pointing at GET /api/export/<export_id>, which serves the file once it is ready.
+    `since` takes the watermark from the X-Export-Watermark header of the previous export.
+    """
+    try:
+        export_format = request.args.get('format', 'csv')
+        table = request.args.get('table', 'profiles')
+        since = request.args.get('since')
+
+        if export_format not in ('csv', 'parquet', 'xlsx'):
+            return jsonify({'error': 'format must be csv, parquet or xlsx'}), 400
+        if table not in EXPORT_SCHEMAS:
+            return jsonify({'error': f'table must be one of {", ".join(EXPORT_SCHEMAS)}'}), 400
+        if since is not None:
+            try:
+                parse_watermark(since)
+            except ValueError:
+                return jsonify({'error': 'since must be a watermark from a previous export'}), 400
+
+        if export_format != 'csv':
+            tables = [table] if export_format == 'parquet' else list(EXPORT_SCHEMAS)
+            export_id = export_jobs.start(export_format, since, tables)
+            status_url = f'/api/export/{export_id}'
+            response = jsonify({'export_id': export_id, 'status': 'building', 'url': status_url})
+            response.headers['Location'] = status_url
+            response.headers['Retry-After'] = '2'
+            return response, 202
+
+        files, watermark = iter_analysis_files(CACHE_DIR, since)
+        response = Response(
+            stream_with_context(iter_csv(iter_export_rows(files, [table]), table)),
+            mimetype='text/csv'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename={table}.csv'
+        if watermark is not None:
+            response.headers['X-Export-Watermark'] = watermark
+        return response
+
+    except ExportUnavailable as e:
+        return jsonify({'error': str(e)}), 501
+    except Exception as e:
+        logger.error(f'Error exporting analyses: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export/<export_id>', methods=['GET'])
+def get_export(export_id):
+    """A Parquet or XLSX export started by GET /api/export: 202 while building, then the file"""
+    if not re.fullmatch(r'[0-9a-f]{32}', export_id):
+        return jsonify({'error': 'Invalid export ID'}), 400
+    state = export_jobs.status(export_id)
+    if state is None:
+        return jsonify({'error': 'Export not found or expired'}), 404
+    if state['status'] == 'building':
+        response = jsonify({'export_id': export_id, 'status': 'building'})
+        response.headers['Retry-After'] = '2'
+        return response, 202
+    if state['status'] == 'failed':
+        return jsonify({'export_id': export_id, 'status': 'failed', 'error': state['error']}), 500
+
+    try:
+        # Opens the file, so cleanup can no longer remove it from under the response
+        response = send_file(export_jobs.file_path(export_id).resolve(), as_attachment=True,
+                             download_name=state['filename'])
+    except FileNotFoundError:
+        # Expired and cleaned up since the status check
+        return jsonify({'error': 'Export not found or expired'}), 404
+    if state['watermark'] is not None:
+        response.headers['X-Export-Watermark'] = state['watermark']
+    return response
+
+@app.route('/api/similar-profiles', methods=['POST'])
+def similar_profiles():
+    """Find previously analyzed profiles most similar to a profile or a job description"""
+    try:
+        start_time = time.time()
+        data = request.json or {}
+        linkedin_url = data.get('url')
+        profile_id = data.get('profile_id')
+        job_description = data.get('job_description')
+        try:
+            top_k = max(1, min(int(data.get('top_k', 10)), 100))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'top_k must be a number'}), 400
+
+        if linkedin_url or profile_id:
+            profile_id = profile_id or get_profile_id(linkedin_url)
+            results = profile_index.search_profile(profile_id, top_k)
+            if results is None:
+                return jsonify({'error': 'Profile has not been analyzed yet'}), 404
+        elif job_description:
+            results = profile_index.search_text(job_description, top_k)
+        else:
+            return jsonify({'error': 'A profile URL, profile ID or job description is required'}), 400
+
+        return jsonify({
+            'results': results,
+            'indexed_profiles': len(profile_index),
+            'search_time_ms': round((time.time() - start_time) * 1000, 2)
+        })
+
+    except Exception as e:
+        logger.error(f'Error searching similar profiles: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/rank-candidates', methods=['POST'])
+def rank_candidates():
+    """Rank already analyzed candidates against a job description"""
+    try:
+        start_time = time.time()
+        data = request.json or {}
+        job_description = data.get('job_description')
+        candidates = data.get('candidates') or []
+
+        if not job_description or not candidates:
+            return jsonify({'error': 'Job description and candidates are required'}), 400
+        if not isinstance(candidates, list) or not all(isinstance(candidate, str) for candidate in candidates):
+            return jsonify({'error': 'candidates must be a list of profile IDs or URLs'}), 400
+
+        # Candidates may be given as profile IDs or as LinkedIn URLs
+        profile_ids = [
+            get_profile_id(candidate) if '/' in candidate else candidate
+            for candidate in candidates
+        ]
+        results, missing = profile_index.rank_text(job_description, profile_ids)
+
+        return jsonify({
+            'results': results,
+            'not_found': missing,
+            'ranking_time_ms': round((time.time() - start_time) * 1000, 2)
+        })
+
+    except Exception as e:
+        logger.error(f'Error ranking candidates: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+def build_chat_context(summary, sections):
+    """Chat context from a summary and the structured profile sections (without the summary twice)"""
+    return f"""
+        Summary:
+        {summary}
+        
+        Profile Information:
+        {section_text(sections.get('profile'))}
+        
+        Experience:
+        {section_text(sections.get('experience'))}
+        
+        Education:
+        {section_text(sections.get('education'))}
+        
+        Recent Posts:
+        {section_text(sections.get('posts'))}
+        """
+
+def analysis_chat_context(analysis_id):
+    """
+    Chat context of a stored analysis.
+    Returns:
+        Tuple containing:
+        - the context, or None if there is no such analysis
+        - the analysis version the context was built from
+    """
+    # Read before the analysis, so a concurrent refresh can only make cached answers miss
+    analysis_version = analysis_mtime(analysis_id)
+    analysis = get_analysis(analysis_id)
+    if not analysis:
+        return None, None
+    return build_chat_context(analysis['summary'], parse_linkedin_data(analysis['raw_data'])), analysis_version
+
 @app.route('/api/chat/init', methods=['POST'])
+@rate_limit('chat')
 def init_chat():
     """Initialize a new chat session with the summary context."""
     try:
         data = request.json
+        analysis_id = data.get('analysis_id')
         summary_data = data.get('summary')
         raw_data = data.get('raw_data')
         
-        if not summary_data or not raw_data:
-            return jsonify({'error': 'Summary and raw data are required'}), 400
-            
-        # Create a unique session ID
-        session_id = str(uuid.uuid4())
-        
-        # Combine summary and raw data for context
-        context_data = f"""
+        analysis_version = None
+        if analysis_id:
+            # Build the context from the stored analysis instead of a re-upload
+            context_data, analysis_version = analysis_chat_context(analysis_id)
+            if context_data is None:
+                return jsonify({'error': 'Analysis not found'}), 404
+        elif summary_data and raw_data:
+            # Combine summary and raw data for context
+            context_data = f"""
         Summary:
         {summary_data}
         
         Raw Profile Data:
         {raw_data}
         """
+        else:
+            return jsonify({'error': 'An analysis ID, or summary and raw data, are required'}), 400
+            
+        # Create a unique session ID
+        session_id = str(uuid.uuid4())
         
-        # Create new chat session
-        chat_manager.create_session(session_id, context_data)
+        # Create new chat session; sessions created from an analysis ID share a context cache
+        chat_manager.create_session(session_id, context_data, analysis_id, analysis_version)
         
         return jsonify({
             'session_id': session_id,
@@ -259,6 +617,7 @@ def init_chat():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/chat/message', methods=['POST'])
+@rate_limit('chat')
 def chat_message():
     """Handle chat message exchange."""
     try:
@@ -318,6 +677,36 @@ def set_credentials():
             'message': str(e)
         }), 500
 
+@app.route('/api/linkedin-accounts', methods=['GET'])
+def list_linkedin_accounts():
+    """Load and health of the LinkedIn accounts scrapes are spread over"""
+    return jsonify({'accounts': account_pool.stats()})
+
+@app.route('/api/linkedin-accounts', methods=['POST'])
+def update_linkedin_accounts():
+    """Add an account to the scraping pool, or take one out with `remove`"""
+    try:
+        data = request.json
+        linkedin_email = data.get('linkedin_email')
+        linkedin_password = data.get('linkedin_password')
+
+        if data.get('remove'):
+            if not linkedin_email:
+                return jsonify({'status': 'error', 'message': 'An email is required'}), 400
+            remove_linkedin_account(linkedin_email)
+            return jsonify({'status': 'success', 'message': 'Account removed'}), 200
+
+        if not linkedin_email or not linkedin_password:
+            return jsonify({'status': 'error', 'message': 'Email and password are required'}), 400
+        add_linkedin_account(linkedin_email, linkedin_password)
+        return jsonify({'status': 'success', 'message': 'Account added'}), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error', 
+            'message': str(e)
+        }), 500
+
 if __name__ == '__main__':
     logger.info('Starting Flask application')
     app.run(debug=True, port=5000) 
\ No newline at end of file
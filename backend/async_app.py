@@ -0,0 +1,232 @@
+"""
+Asyncio serving mode.
+
+The endpoints that spend their time waiting on Chromium or Gemini (profile analysis and
+chat) run as async Quart handlers: scrapes are awaited on the shared scraper loop, Gemini
+calls go through one async HTTP client, and embedding work runs on a small thread pool.
+Every other route is served by the regular Flask app, so both modes share one code path
+for caching, indexing and credentials.
+
+Run with:
+    hypercorn async_app:application --bind 0.0.0.0:5000
+
+The sync mode (`gunicorn app:app`) is unchanged.
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, request, jsonify
+from quart_cors import cors
+
+import metrics
+from metrics import span
+from app import (
+    app as sync_app,
+    CORS_ORIGINS,
+    CORS_HEADERS,
+    get_analysis_id,
+    get_from_cache,
+    cached_analysis_response,
+    finish_analysis,
+    analysis_chat_context,
+    refresher
+)
+from analysis_queue import analysis_queue, QueueFull, queue_full_response
+from async_http import close_async_client
+from chatbot import chat_manager
+from generate_summary import amain as generate_summary_amain
+from logging_setup import alog_request
+from rate_limiter import check_rate_limit, rate_limited
+
+logger = logging.getLogger(__name__)
+
+# Threads for embeddings and other CPU-bound work; the model releases the GIL while encoding
+EMBEDDING_THREADS = int(os.environ.get('EMBEDDING_THREADS', 2))
+# Paths handled by the async handlers below; everything else goes to the Flask app
+ASYNC_PATHS = {'/api/analyze-profile', '/api/chat/init', '/api/chat/message'}
+
+cpu_pool = ThreadPoolExecutor(max_workers=EMBEDDING_THREADS, thread_name_prefix='embedding')
+
+async def run_cpu(fn, *args):
+    """Run blocking work on the CPU pool without holding up the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool, functools.partial(fn, *args))
+
+quart_app = cors(
+    Quart(__name__),
+    allow_origin=CORS_ORIGINS,
+    allow_headers=CORS_HEADERS,
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_credentials=True
+)
+
+@quart_app.before_request
+async def log_request_info():
+    await alog_request(logger, request)
+
+@quart_app.after_serving
+async def shutdown():
+    await close_async_client()
+
+async def acheck_rate_limit(endpoint_class):
+    """rate_limiter.check_rate_limit for the current request; SQLite may wait on another
+    worker's lock, so it runs off the event loop"""
+    return await asyncio.to_thread(check_rate_limit, request.remote_addr, endpoint_class)
+
+def rate_limit(endpoint_class):
+    """rate_limiter.rate_limit for async handlers"""
+    def decorator(f):
+        @functools.wraps(f)
+        async def wrapped(*args, **kwargs):
+            retry_after = await acheck_rate_limit(endpoint_class)
+            if retry_after is not None:
+                return rate_limited(retry_after)
+            return await f(*args, **kwargs)
+        return wrapped
+    return decorator
+
+@quart_app.route('/api/analyze-profile', methods=['POST'])
+async def analyze_profile():
+    try:
+        start_time = time.time()
+        logger.info('Starting profile analysis')
+
+        data = await request.get_json()
+        linkedin_url = data.get('url')
+        custom_prompt = data.get('customPrompt')
+        summary_options = data.get('summaryOptions')
+
+        if not linkedin_url:
+            logger.error('No URL provided in request')
+            return jsonify({'error': 'No URL provided'}), 400
+
+        logger.info(f'Analyzing profile: {linkedin_url}')
+
+        analysis_id = get_analysis_id(linkedin_url, custom_prompt)
+        refresher.record_request(analysis_id, linkedin_url, custom_prompt, summary_options)
+
+        # Check cache first; a disk hit stats and reads the cache file
+        cached_entry, stale = await asyncio.to_thread(get_from_cache, linkedin_url, custom_prompt)
+        if cached_entry:
+            # Stale hits are parsed to be marked as such
+            return await run_cpu(cached_analysis_response, analysis_id, cached_entry, stale)
+
+        # Only analyses that start a scrape use up the client's analyze budget
+        retry_after = await acheck_rate_limit('analyze')
+        if retry_after is not None:
+            return rate_limited(retry_after)
+
+        try:
+            async with analysis_queue.aslot() as timing:
+                with refresher.live_analysis():
+                    string_buffer = StringIO()
+                    with span('generate_summary'):
+                        await generate_summary_amain(linkedin_url, custom_prompt, summary_options, out=string_buffer)
+                    # Similarity and indexing embed the whole profile
+                    response_data = await run_cpu(finish_analysis, linkedin_url, custom_prompt, summary_options, string_buffer.getvalue())
+        except QueueFull as e:
+            return queue_full_response(e)
+        if response_data is None:
+            logger.error('Failed to generate summary')
+            return jsonify({'error': 'Failed to generate summary'}), 500
+
+        end_time = time.time()
+        metrics.histogram('analysis_duration_seconds', 'End-to-end latency of uncached profile analyses').observe(end_time - start_time)
+        logger.info(f'Profile analysis completed in {end_time - start_time:.2f} seconds '
+                    f'({timing.wait:.2f}s queued, {timing.processing:.2f}s processing)')
+
+        response = jsonify(response_data)
+        response.headers['Server-Timing'] = timing.server_timing()
+        return response
+
+    except Exception as e:
+        logger.error(f'Unexpected error during profile analysis: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@quart_app.route('/api/chat/init', methods=['POST'])
+@rate_limit('chat')
+async def init_chat():
+    """Initialize a new chat session with the summary context."""
+    try:
+        data = await request.get_json()
+        analysis_id = data.get('analysis_id')
+        summary_data = data.get('summary')
+        raw_data = data.get('raw_data')
+
+        analysis_version = None
+        if analysis_id:
+            # Loading and parsing the stored analysis runs off the event loop
+            context_data, analysis_version = await run_cpu(analysis_chat_context, analysis_id)
+            if context_data is None:
+                return jsonify({'error': 'Analysis not found'}), 404
+        elif summary_data and raw_data:
+            context_data = f"""
+        Summary:
+        {summary_data}
+
+        Raw Profile Data:
+        {raw_data}
+        """
+        else:
+            return jsonify({'error': 'An analysis ID, or summary and raw data, are required'}), 400
+
+        session_id = str(uuid.uuid4())
+        await chat_manager.acreate_session(session_id, context_data, analysis_id, analysis_version)
+
+        return jsonify({
+            'session_id': session_id,
+            'message': 'Chat session initialized successfully'
+        })
+
+    except Exception as e:
+        logger.error(f'Error initializing chat session: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+@quart_app.route('/api/chat/message', methods=['POST'])
+@rate_limit('chat')
+async def chat_message():
+    """Handle chat message exchange."""
+    try:
+        data = await request.get_json()
+        session_id = data.get('session_id')
+        message = data.get('message')
+
+        if not session_id or not message:
+            return jsonify({'error': 'Session ID and message are required'}), 400
+
+        session = chat_manager.get_session(session_id)
+        if not session:
+            return jsonify({'error': 'Chat session not found or expired'}), 404
+
+        response = await session.asend_message(message, run_cpu)
+
+        return jsonify({
+            'response': response
+        })
+
+    except Exception as e:
+        logger.error(f'Error in chat message exchange: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+class EndpointDispatcher:
+    """ASGI app sending ASYNC_PATHS to the Quart app and every other request to the Flask app"""
+
+    def __init__(self, async_app, wsgi_app, async_paths=ASYNC_PATHS):
+        self.async_app = async_app
+        self.wsgi_app = AsyncioWSGIMiddleware(wsgi_app)
+        self.async_paths = async_paths
+
+    async def __call__(self, scope, receive, send):
+        # Lifespan events start and stop the Quart app (and its HTTP client)
+        if scope['type'] == 'lifespan' or scope.get('path') in self.async_paths:
+            await self.async_app(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+
+application = EndpointDispatcher(quart_app, sync_app)
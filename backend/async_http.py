@@ -0,0 +1,34 @@
+import asyncio
+import logging
+import os
+import weakref
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Gemini calls on long profiles take tens of seconds; httpx defaults to 5
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_TIMEOUT_SECONDS', 120))
+# Connections kept open to Gemini per event loop
+GEMINI_MAX_CONNECTIONS = int(os.environ.get('GEMINI_MAX_CONNECTIONS', 100))
+
+# One client per event loop: the serving loop in async mode, the scraper loop for sync callers
+_clients = weakref.WeakKeyDictionary()
+
+def get_async_client():
+    """Async HTTP client of the running event loop, so concurrent Gemini calls share a connection pool"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = httpx.AsyncClient(
+            timeout=httpx.Timeout(GEMINI_TIMEOUT_SECONDS, connect=10.0),
+            limits=httpx.Limits(max_connections=GEMINI_MAX_CONNECTIONS),
+            headers={'Content-Type': 'application/json'}
+        )
+    return client
+
+async def close_async_client():
+    """Close the running event loop's client"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cached analyses older than this are served stale while a fresh one is built
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', 86400))
+# Past this age a cached analysis is too old to serve even once
+CACHE_MAX_STALE_SECONDS = int(os.environ.get('CACHE_MAX_STALE_SECONDS', 7 * 86400))
+# Refreshes running at once per worker; each one starts a Chromium
+REFRESH_CONCURRENCY = int(os.environ.get('REFRESH_CONCURRENCY', 1))
+# Hot profiles are refreshed this long before they would go stale
+REFRESH_AHEAD_SECONDS = int(os.environ.get('REFRESH_AHEAD_SECONDS', 3600))
+REFRESH_INTERVAL_SECONDS = int(os.environ.get('REFRESH_INTERVAL_SECONDS', 300))
+# How many of the most requested profiles are kept fresh, and how often they must have been requested
+REFRESH_HOT_COUNT = int(os.environ.get('REFRESH_HOT_COUNT', 10))
+REFRESH_MIN_HITS = float(os.environ.get('REFRESH_MIN_HITS', 2))
+MAX_TRACKED_ANALYSES = 1000
+# After a failed refresh the analysis isn't retried for this long, doubling per failure up to the max
+REFRESH_BACKOFF_SECONDS = int(os.environ.get('REFRESH_BACKOFF_SECONDS', 300))
+REFRESH_BACKOFF_MAX_SECONDS = int(os.environ.get('REFRESH_BACKOFF_MAX_SECONDS', 6 * 3600))
+# A refresh marker older than this belongs to a worker that died mid-refresh
+REFRESH_LOCK_TIMEOUT = 15 * 60
+
+refreshes_in_flight = metrics.gauge('analysis_refreshes_in_flight', 'Background analysis refreshes running or queued')
+
+def _refresh_counter(trigger, outcome):
+    return metrics.counter('analysis_refreshes_total', 'Background analysis refreshes',
+                           {'trigger': trigger, 'outcome': outcome})
+
+class RefreshScheduler:
+    """
+    Rebuilds cached analyses in the background: stale ones when they are served, and the
+    most requested ones shortly before they go stale. Refreshes run on a small pool and
+    scheduled ones wait while live analyses are running, so live traffic comes first.
+
+    `refresh(entry)` rebuilds one analysis from its tracked entry (url, custom_prompt,
+    summary_options); `cache_age(analysis_id)` returns the age of its cache file or None.
+    """
+
+    def __init__(self, refresh, cache_age, lock_dir, concurrency=REFRESH_CONCURRENCY,
+                 ttl=CACHE_TTL_SECONDS, refresh_ahead=REFRESH_AHEAD_SECONDS,
+                 interval=REFRESH_INTERVAL_SECONDS, hot_count=REFRESH_HOT_COUNT, min_hits=REFRESH_MIN_HITS):
+        self.refresh = refresh
+        self.cache_age = cache_age
+        self.lock_dir = lock_dir
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.interval = interval
+        self.hot_count = hot_count
+        self.min_hits = min_hits
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='refresh')
+        self._tracked = {}
+        self._in_flight = set()
+        # Consecutive failed refreshes and the earliest next attempt, per analysis
+        self._failures = {}
+        self._live = 0
+        self._lock = threading.Lock()
+        self._scheduler = None
+
+    def record_request(self, analysis_id, url, custom_prompt=None, summary_options=None):
+        """Count a request for an analysis so the scheduler knows which profiles are hot"""
+        with self._lock:
+            entry = self._tracked.setdefault(analysis_id, {'hits': 0.0})
+            entry.update(url=url, custom_prompt=custom_prompt, summary_options=summary_options, last_hit=time.time())
+            entry['hits'] += 1
+            if len(self._tracked) > MAX_TRACKED_ANALYSES:
+                coldest = min(self._tracked, key=lambda key: (self._tracked[key]['hits'], self._tracked[key]['last_hit']))
+                del self._tracked[coldest]
+                self._failures.pop(coldest, None)
+        self._start_scheduler()
+
+    @contextmanager
+    def live_analysis(self):
+        """Wrap an analysis a user is waiting for; scheduled refreshes hold off meanwhile"""
+        with self._lock:
+            self._live += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._live -= 1
+
+    def is_refreshing(self, analysis_id):
+        return analysis_id in self._in_flight or self._lock_path(analysis_id).exists()
+
+    def submit(self, analysis_id, trigger='stale'):
+        """Queue a refresh of a tracked analysis unless one is already running in any worker,
+        or its last refresh failed and it is still backing off"""
+        with self._lock:
+            entry = self._tracked.get(analysis_id)
+            if entry is None or analysis_id in self._in_flight:
+                return False
+            failure = self._failures.get(analysis_id)
+            if failure and time.time() < failure['retry_at']:
+                return False
+            self._in_flight.add(analysis_id)
+            entry = dict(entry)
+        refreshes_in_flight.inc()
+        self._executor.submit(self._run, analysis_id, entry, trigger)
+        return True
+
+    def _lock_path(self, analysis_id):
+        return self.lock_dir / f'{analysis_id}.refreshing'
+
+    def _acquire_lock(self, analysis_id):
+        """Mark the analysis as refreshing on disk so other workers leave it alone"""
+        path = self._lock_path(analysis_id)
+        try:
+            if time.time() - path.stat().st_mtime > REFRESH_LOCK_TIMEOUT:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            return False
+
+    def _run(self, analysis_id, entry, trigger):
+        try:
+            if not self._acquire_lock(analysis_id):
+                logger.info(f'Analysis {analysis_id} is already being refreshed by another worker')
+                return
+            try:
+                logger.info(f'Refreshing analysis {analysis_id} ({trigger}): {entry["url"]}')
+                self.refresh(entry)
+                _refresh_counter(trigger, 'ok').inc()
+                with self._lock:
+                    self._failures.pop(analysis_id, None)
+            finally:
+                self._lock_path(analysis_id).unlink(missing_ok=True)
+        except Exception as e:
+            _refresh_counter(trigger, 'error').inc()
+            with self._lock:
+                failures = self._failures.get(analysis_id, {'count': 0})['count'] + 1
+                backoff = min(REFRESH_BACKOFF_MAX_SECONDS, REFRESH_BACKOFF_SECONDS * 2 ** (failures - 1))
+                self._failures[analysis_id] = {'count': failures, 'retry_at': time.time() + backoff}
+            logger.error(f'Error refreshing analysis {analysis_id} (failure {failures}, retrying in {backoff}s): {str(e)}')
+        finally:
+            with self._lock:
+                self._in_flight.discard(analysis_id)
+            refreshes_in_flight.dec()
+
+    def _start_scheduler(self):
+        if self._scheduler is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._schedule_loop, name='refresh-scheduler', daemon=True)
+                self._scheduler.start()
+
+    def _schedule_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.schedule_hot()
+            except Exception as e:
+                logger.error(f'Error scheduling refreshes: {str(e)}')
+
+    def schedule_hot(self):
+        """Refresh the most requested analyses that will go stale within refresh_ahead"""
+        with self._lock:
+            if self._live:
+                logger.info('Live analyses running, deferring scheduled refreshes')
+                return []
+            hot = sorted(self._tracked, key=lambda key: self._tracked[key]['hits'], reverse=True)[:self.hot_count]
+            hot = [key for key in hot if self._tracked[key]['hits'] >= self.min_hits]
+            # Halve hit counts every round so profiles that stopped being requested cool off
+            for entry in self._tracked.values():
+                entry['hits'] /= 2
+
+        scheduled = []
+        for analysis_id in hot:
+            age = self.cache_age(analysis_id)
+            if age is not None and age > self.ttl - self.refresh_ahead and self.submit(analysis_id, 'scheduled'):
+                scheduled.append(analysis_id)
+        if scheduled:
+            logger.info(f'Scheduled refresh of {len(scheduled)} hot analyses')
+        return scheduled
@@ -0,0 +1,90 @@
+"""
+Local HTTP server that replays recorded LinkedIn pages.
+
+Routes mirror the URLs the scraper visits, so pointing LINKEDIN_BASE_URL at this server
+and analyzing http://127.0.0.1:<port>/in/<anyone>/ runs the real Playwright scrapers
+without touching LinkedIn. Every response is delayed by a configurable latency.
+
+Usage:
+    python fixture_server.py --port 8765 --latency-ms 200
+"""
+import argparse
+import pathlib
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = pathlib.Path(__file__).parent / 'fixtures'
+SESSION_COOKIE = 'li_at=benchmark-session'
+
+ROUTES = [
+    (re.compile(r'^/in/[^/]+/details/experience/?$'), 'experience.html'),
+    (re.compile(r'^/in/[^/]+/details/education/?$'), 'education.html'),
+    (re.compile(r'^/in/[^/]+/recent-activity/all/?$'), 'activity.html'),
+    (re.compile(r'^/in/[^/]+/?$'), 'profile.html'),
+]
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    pages = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _logged_in(self):
+        return SESSION_COOKIE in self.headers.get('Cookie', '')
+
+    def _send(self, status, body=b'', headers=None):
+        time.sleep(self.latency)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/login':
+            return self._send(200, self.pages['login.html'])
+        if path == '/feed/':
+            if self._logged_in():
+                return self._send(200, self.pages['feed.html'])
+            return self._send(302, headers={'Location': '/login'})
+        for pattern, fixture in ROUTES:
+            if pattern.match(path):
+                return self._send(200, self.pages[fixture])
+        self._send(404, b'Not found')
+
+    def do_POST(self):
+        if self.path.split('?')[0] == '/login':
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            return self._send(302, headers={
+                'Location': '/feed/',
+                'Set-Cookie': f'{SESSION_COOKIE}; Path=/; HttpOnly'
+            })
+        self._send(404, b'Not found')
+
+def start_fixture_server(port=0, latency_ms=0):
+    """Start the server on a background thread and return it; the bound port is server.server_port"""
+    handler = type('Handler', (FixtureHandler,), {
+        'latency': latency_ms / 1000.0,
+        'pages': {path.name: path.read_bytes() for path in FIXTURES_DIR.glob('*.html')}
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve recorded LinkedIn pages')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+    server = start_fixture_server(args.port, args.latency_ms)
+    print(f'Serving LinkedIn fixtures on http://127.0.0.1:{server.server_port}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
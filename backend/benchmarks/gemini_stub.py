@@ -0,0 +1,113 @@
+"""
+Local stand-in for the Gemini generateContent and cachedContents APIs.
+
+Answers every generateContent call with a canned markdown response after a configurable
+latency, and counts calls and prompt sizes so benchmarks can report them. Cached contents
+are kept in memory with their TTL; generateContent calls referring to an unknown or
+expired cache get a 404 like the real API. Point GEMINI_API_BASE at this server to use it.
+
+Usage:
+    python gemini_stub.py --port 8766 --latency-ms 800
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_SUMMARY = """# Professional Summary
+
+## Current Role
+- **Staff Machine Learning Engineer** at DataWorks, leading search and recommendation work
+
+## Career Progression
+- Grew from intern to staff engineer over roughly a decade
+- Moved from platform engineering at CloudScale Inc. into applied machine learning
+
+## Education
+- **MS Computer Science**, University of Washington
+- **BS Mathematics**, University of Oregon
+
+## Areas of Expertise
+- Retrieval and ranking models, feature stores, ML platforms
+- Mentoring and technical leadership
+"""
+
+GENERATE_PATH = re.compile(r'^/v1beta/models/[^/:]+:generateContent$')
+CACHED_CONTENTS_PATH = '/v1beta/cachedContents'
+
+class GeminiStubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    stats = None
+    caches = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        path = self.path.split('?')[0]
+        raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if path == CACHED_CONTENTS_PATH:
+            return self._create_cached_content(json.loads(raw))
+        if not GENERATE_PATH.match(path):
+            return self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+        cached_content = json.loads(raw).get('cachedContent')
+        with self.stats['lock']:
+            if cached_content:
+                expires_at = self.caches.get(cached_content)
+                if expires_at is None or time.time() > expires_at:
+                    return self._send_json(404, {'error': {'code': 404, 'message': f'{cached_content} not found'}})
+                self.stats['cached_calls'] += 1
+            self.stats['calls'] += 1
+            self.stats['prompt_bytes'] += len(raw)
+        time.sleep(self.latency)
+        self._send_json(200, {
+            'candidates': [{
+                'content': {'role': 'model', 'parts': [{'text': CANNED_SUMMARY}]},
+                'finishReason': 'STOP'
+            }]
+        })
+
+    def _create_cached_content(self, body):
+        ttl = float(body.get('ttl', '3600s').rstrip('s'))
+        name = f'cachedContents/{uuid.uuid4().hex[:12]}'
+        with self.stats['lock']:
+            self.caches[name] = time.time() + ttl
+            self.stats['cache_creates'] += 1
+        self._send_json(200, {'name': name, 'model': body.get('model')})
+
+def start_gemini_stub(port=0, latency_ms=0):
+    """Start the stub on a background thread and return it; call counters are in server.stats"""
+    stats = {'calls': 0, 'cached_calls': 0, 'cache_creates': 0, 'prompt_bytes': 0, 'lock': threading.Lock()}
+    handler = type('Handler', (GeminiStubHandler,), {
+        'latency': latency_ms / 1000.0,
+        'stats': stats,
+        'caches': {}
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local Gemini-compatible stub')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+    server = start_gemini_stub(args.port, args.latency_ms)
+    print(f'Serving Gemini stub on http://127.0.0.1:{server.server_port}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
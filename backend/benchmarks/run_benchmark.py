@@ -0,0 +1,221 @@
+"""
+Offline benchmark for the full analyze_profile pipeline.
+
+Starts the LinkedIn fixture server and the Gemini stub, points the backend at them and
+drives POST /api/analyze-profile through the Flask test client. Scraping (real Chromium),
+summary generation, similarity and indexing all run for real; only the network peers
+are local. Every request uses a distinct profile URL so nothing is served from cache.
+
+Reports end-to-end latency, per-stage latency (from the metrics spans), throughput at
+each concurrency level and peak RSS of this process and its Chromium children, sampled
+while the analyses run (Chromium is still running at the end, so the kernel's peak for
+reaped children would miss it).
+
+Usage (from the backend directory):
+    python benchmarks/run_benchmark.py --requests 8 --concurrency 1,4 --page-latency-ms 150 --gemini-latency-ms 800
+"""
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCHMARKS_DIR = pathlib.Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARKS_DIR.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from fixture_server import start_fixture_server
+from gemini_stub import start_gemini_stub
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+class RssSampler:
+    """
+    Samples the resident memory of this process and of all its descendants (the Playwright
+    driver, Chromium and its renderers) in the background, keeping the peaks.
+    """
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.peak = {'self': 0, 'children': 0, 'total': 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        process = psutil.Process()
+        own = process.memory_info().rss
+        children = 0
+        for child in process.children(recursive=True):
+            try:
+                children += child.memory_info().rss
+            except psutil.Error:
+                continue
+        for key, value in (('self', own), ('children', children), ('total', own + children)):
+            self.peak[key] = max(self.peak[key], value)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def peak_mb(self):
+        return {key: round(value / (1024 * 1024), 1) for key, value in self.peak.items()}
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its reaped children, without psutil"""
+    if resource is None:
+        return {}
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)
+    }
+
+def stage_totals(snapshot):
+    """Extract {stage: (count, sum)} from a metrics snapshot"""
+    prefix = 'stage_duration_seconds{stage="'
+    return {
+        name[len(prefix):-2]: (value['count'], value['sum'])
+        for name, value in snapshot.items()
+        if name.startswith(prefix)
+    }
+
+def run_level(app, fixture_url, total_requests, concurrency):
+    """Run total_requests uncached analyses with the given concurrency"""
+    import metrics
+
+    def analyze(_):
+        profile_url = f'{fixture_url}/in/bench-{uuid.uuid4().hex[:12]}/'
+        start_time = time.perf_counter()
+        response = app.test_client().post('/api/analyze-profile', json={'url': profile_url})
+        return time.perf_counter() - start_time, response.status_code
+
+    before = stage_totals(metrics.snapshot())
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(analyze, range(total_requests)))
+    wall_time = time.perf_counter() - start_time
+    after = stage_totals(metrics.snapshot())
+
+    latencies = [latency for latency, status in outcomes if status == 200]
+    stages = {}
+    for stage, (count, total) in after.items():
+        prev_count, prev_total = before.get(stage, (0, 0.0))
+        if count > prev_count:
+            stages[stage] = round((total - prev_total) / (count - prev_count), 3)
+
+    return {
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'errors': sum(1 for _, status in outcomes if status != 200),
+        'throughput_rps': round(len(latencies) / wall_time, 3),
+        'latency_seconds': {
+            'mean': round(statistics.mean(latencies), 3),
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'max': round(max(latencies), 3)
+        } if latencies else {},
+        'stage_mean_seconds': dict(sorted(stages.items(), key=lambda item: -item[1]))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark analyze_profile against local fixtures')
+    parser.add_argument('--requests', type=int, default=4, help='Analyses per concurrency level')
+    parser.add_argument('--concurrency', default='1,4', help='Comma separated concurrency levels')
+    parser.add_argument('--page-latency-ms', type=float, default=100)
+    parser.add_argument('--gemini-latency-ms', type=float, default=500)
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    args = parser.parse_args()
+    output_path = pathlib.Path(args.output).resolve() if args.output else None
+
+    fixture_server = start_fixture_server(latency_ms=args.page_latency_ms)
+    gemini_stub = start_gemini_stub(latency_ms=args.gemini_latency_ms)
+    fixture_url = f'http://127.0.0.1:{fixture_server.server_port}'
+    os.environ['LINKEDIN_BASE_URL'] = fixture_url
+    os.environ['GEMINI_API_BASE'] = f'http://127.0.0.1:{gemini_stub.server_port}'
+
+    # Every benchmark request is an uncached analysis from one address; don't rate limit them
+    os.environ.setdefault('RATE_LIMIT_ANALYZE_BURST', '1000000')
+    os.environ.setdefault('RATE_LIMIT_ANALYZE_PER_MINUTE', '1000000')
+    # ...nor pace or serialize the single benchmark LinkedIn account
+    os.environ.setdefault('LINKEDIN_ACCOUNT_BURST', '1000000')
+    os.environ.setdefault('LINKEDIN_ACCOUNT_SCRAPES_PER_HOUR', '1000000000')
+    os.environ.setdefault('ACCOUNT_MAX_CONCURRENT_SCRAPES', '1000')
+    # ...nor queue or turn away analyses below the benchmarked concurrency
+    levels = [int(level) for level in args.concurrency.split(',')]
+    os.environ.setdefault('ANALYSIS_CONCURRENCY', str(max(levels)))
+    os.environ.setdefault('ANALYSIS_QUEUE_DEPTH', str(args.requests))
+
+    # The backend keeps its caches relative to the working directory; keep them out of the tree
+    os.chdir(tempfile.mkdtemp(prefix='linkedin-analyzer-bench-'))
+
+    from app import app
+    from credentials import set_linkedin_credentials, set_gemini_api_key
+    set_linkedin_credentials('benchmark@example.com', 'benchmark-password')
+    set_gemini_api_key('benchmark-key')
+
+    report = {
+        'page_latency_ms': args.page_latency_ms,
+        'gemini_latency_ms': args.gemini_latency_ms,
+        'levels': []
+    }
+    for concurrency in levels:
+        print(f'Running {args.requests} analyses at concurrency {concurrency}...', file=sys.stderr)
+        if psutil is None:
+            level = run_level(app, fixture_url, args.requests, concurrency)
+        else:
+            with RssSampler() as sampler:
+                level = run_level(app, fixture_url, args.requests, concurrency)
+            level['peak_rss_mb'] = sampler.peak_mb()
+        report['levels'].append(level)
+
+    report['gemini_calls'] = gemini_stub.stats['calls']
+    report['gemini_prompt_bytes'] = gemini_stub.stats['prompt_bytes']
+    if psutil is None:
+        report['peak_rss_mb'] = peak_rss_mb()
+    else:
+        report['peak_rss_mb'] = {
+            key: max(level['peak_rss_mb'][key] for level in report['levels'])
+            for key in ('self', 'children', 'total')
+        }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if output_path:
+        output_path.write_text(output)
+
+    fixture_server.shutdown()
+    gemini_stub.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Offline benchmark for chat sessions against the Gemini stub.
+
+Opens several sessions on the same analysis, first without and then with the shared
+context cache, and reports Gemini calls, prompt bytes sent and latency for both runs.
+
+Usage (from the backend directory):
+    python benchmarks/run_chat_benchmark.py --sessions 5 --messages 4 --gemini-latency-ms 300
+"""
+import argparse
+import json
+import os
+import pathlib
+import sys
+import time
+import uuid
+
+BENCHMARKS_DIR = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR.parent))
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from fixture_server import FIXTURES_DIR
+from gemini_stub import start_gemini_stub
+
+QUESTIONS = [
+    "What is their current role?",
+    "How many years of experience do they have?",
+    "What did they study?",
+    "What kind of role would suit them next?",
+]
+
+def run(chat_manager, stub, context, sessions, messages, analysis_id):
+    """Open `sessions` sessions with `messages` messages each and report the stub's counters"""
+    with stub.stats['lock']:
+        before = {key: value for key, value in stub.stats.items() if key != 'lock'}
+    start_time = time.perf_counter()
+    for _ in range(sessions):
+        session = chat_manager.create_session(str(uuid.uuid4()), context, analysis_id)
+        for i in range(messages):
+            session.send_message(QUESTIONS[i % len(QUESTIONS)])
+    elapsed = time.perf_counter() - start_time
+    with stub.stats['lock']:
+        after = {key: value for key, value in stub.stats.items() if key != 'lock'}
+    report = {key: after[key] - before[key] for key in after}
+    report['seconds'] = round(elapsed, 3)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark chat sessions with and without context caching')
+    parser.add_argument('--sessions', type=int, default=5)
+    parser.add_argument('--messages', type=int, default=4)
+    parser.add_argument('--gemini-latency-ms', type=float, default=300)
+    args = parser.parse_args()
+
+    stub = start_gemini_stub(latency_ms=args.gemini_latency_ms)
+    os.environ['GEMINI_API_BASE'] = f'http://127.0.0.1:{stub.server_port}'
+
+    from chatbot import ChatManager
+    from credentials import set_gemini_api_key
+    set_gemini_api_key('benchmark-key')
+
+    # A realistic amount of profile context: the recorded pages' text
+    context = '\n'.join(path.read_text() for path in sorted(FIXTURES_DIR.glob('*.html')))
+    report = {
+        'full_history': run(ChatManager(), stub, context, args.sessions, args.messages, None),
+        'context_cache': run(ChatManager(), stub, context, args.sessions, args.messages, uuid.uuid4().hex[:20])
+    }
+    print(json.dumps(report, indent=2))
+    stub.shutdown()
+
+if __name__ == '__main__':
+    main()
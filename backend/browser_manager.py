@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+import metrics
+from metrics import span
+
+try:
+    import psutil
+except ImportError:  # Without it browsers are only recycled by profile count
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# A browser is replaced after serving this many profiles...
+BROWSER_MAX_PROFILES = int(os.environ.get('BROWSER_MAX_PROFILES', 25))
+# ...or once it and its renderers use this much memory
+BROWSER_MAX_RSS_MB = int(os.environ.get('BROWSER_MAX_RSS_MB', 1024))
+# Memory all Chromium processes of this worker may use; new scrapes wait above it
+CHROMIUM_MEMORY_CAP_MB = int(os.environ.get('CHROMIUM_MEMORY_CAP_MB', 2048))
+# Idle browsers are closed after this long
+BROWSER_IDLE_SECONDS = int(os.environ.get('BROWSER_IDLE_SECONDS', 300))
+# Longest a scrape that needs a new browser waits for memory under the cap before it is turned away
+MEMORY_WAIT_SECONDS = 60
+
+MEMORY_BUCKETS = tuple(size * MB for size in (128, 256, 512, 768, 1024, 1536, 2048, 4096))
+
+active_browsers = metrics.gauge('active_browsers', 'Chromium instances currently running')
+chromium_rss = metrics.gauge('chromium_rss_bytes', 'Resident memory of all Chromium processes of this worker')
+launches_total = metrics.counter('browser_launches_total', 'Chromium instances launched')
+memory_waits_total = metrics.counter('browser_memory_waits_total', 'Scrapes that waited for Chromium memory to drop under the cap')
+profiles_per_browser = metrics.histogram('browser_profiles_served', 'Profiles a browser served before it was closed',
+                                         buckets=(1, 2, 5, 10, 25, 50, 100, 250))
+rss_at_close = metrics.histogram('browser_rss_at_close_bytes', 'Resident memory of a browser when it was closed',
+                                 buckets=MEMORY_BUCKETS)
+
+def _recycle_counter(reason):
+    return metrics.counter('browser_recycles_total', 'Browsers closed, by reason', {'reason': reason})
+
+def _child_pids(pid):
+    """
+    PIDs of a process's direct children. Browser processes are found by their place in the
+    tree rather than by name, which differs between builds (chrome, chromium, headless_shell):
+    the Playwright driver is a child of this process and each browser's main process is a
+    child of the driver (renderers are children of that).
+    """
+    if psutil is None or pid is None:
+        return set()
+    try:
+        return {child.pid for child in psutil.Process(pid).children()}
+    except psutil.Error:
+        return set()
+
+def _new_child(pid, before):
+    new = _child_pids(pid) - before
+    return next(iter(new)) if len(new) == 1 else None
+
+class BrowserUnavailable(Exception):
+    """Chromium memory stayed over the cap, so no browser could be launched"""
+
+class ManagedBrowser:
+    """A launched Chromium with its usage: profiles served, scrapes running and memory"""
+
+    def __init__(self, browser, root_pid):
+        self.browser = browser
+        self.root_pid = root_pid
+        self.launched_at = time.time()
+        self.last_used = self.launched_at
+        self.profiles_served = 0
+        self.active = 0
+        self.retiring = None  # Reason it is being replaced, once it is
+
+    def rss(self):
+        """Resident memory of the browser and its renderer, GPU and utility processes"""
+        if psutil is None or self.root_pid is None:
+            return 0
+        try:
+            root = psutil.Process(self.root_pid)
+            return sum(process.memory_info().rss for process in [root] + root.children(recursive=True))
+        except psutil.Error:
+            return 0
+
+class BrowserManager:
+    """
+    Chromium lifecycle for the scraper loop. Scrapes share a browser through separate
+    contexts; a browser is recycled after BROWSER_MAX_PROFILES profiles or above
+    BROWSER_MAX_RSS_MB. While all Chromium processes together are above
+    CHROMIUM_MEMORY_CAP_MB, older browsers are drained and closed and new scrapes share
+    the current one; no browser is launched until memory is back under the cap.
+    Must only be used from the scraper loop.
+    """
+
+    def __init__(self, max_profiles=BROWSER_MAX_PROFILES, max_rss_mb=BROWSER_MAX_RSS_MB,
+                 memory_cap_mb=CHROMIUM_MEMORY_CAP_MB, idle_seconds=BROWSER_IDLE_SECONDS):
+        self.max_profiles = max_profiles
+        self.max_rss = max_rss_mb * MB
+        self.memory_cap = memory_cap_mb * MB
+        self.idle_seconds = idle_seconds
+        self._playwright = None
+        self._driver_pid = None
+        self._current = None
+        self._browsers = []
+        self._launch_lock = None
+        self._released = None
+        # Pending idle-close tasks; the loop only keeps weak references to tasks
+        self._idle_tasks = set()
+
+    def _ensure_primitives(self):
+        # asyncio primitives bind to the loop they're first used on
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+            self._released = asyncio.Condition()
+
+    def total_rss(self):
+        total = sum(managed.rss() for managed in self._browsers)
+        chromium_rss.set(total)
+        return total
+
+    def stats(self):
+        """Per-browser usage, for logs and sizing"""
+        return [
+            {
+                'pid': managed.root_pid,
+                'profiles_served': managed.profiles_served,
+                'active_scrapes': managed.active,
+                'rss_mb': round(managed.rss() / MB, 1),
+                'age_seconds': round(time.time() - managed.launched_at),
+                'retiring': managed.retiring
+            }
+            for managed in self._browsers
+        ]
+
+    async def _launch(self):
+        if self._playwright is None:
+            children_before = _child_pids(os.getpid())
+            self._playwright = await async_playwright().start()
+            self._driver_pid = _new_child(os.getpid(), children_before)
+        roots_before = _child_pids(self._driver_pid)
+        with span('browser_launch'):
+            browser = await self._playwright.chromium.launch(headless=True)
+        managed = ManagedBrowser(browser, _new_child(self._driver_pid, roots_before))
+        if psutil is not None and managed.root_pid is None:
+            logger.warning('Could not find the launched Chromium process; its memory is not counted '
+                           'against BROWSER_MAX_RSS_MB or CHROMIUM_MEMORY_CAP_MB')
+        browser.on('disconnected', lambda _: self._forget(managed, 'disconnected'))
+        self._browsers.append(managed)
+        launches_total.inc()
+        active_browsers.set(len(self._browsers))
+        logger.info(f'Launched Chromium (pid {managed.root_pid}), {len(self._browsers)} running')
+        return managed
+
+    def _forget(self, managed, reason):
+        if managed in self._browsers:
+            self._browsers.remove(managed)
+            if reason == 'disconnected' and managed.retiring is None:
+                logger.warning(f'Chromium (pid {managed.root_pid}) disconnected unexpectedly')
+                _recycle_counter('crash').inc()
+            active_browsers.set(len(self._browsers))
+        if self._current is managed:
+            self._current = None
+
+    def _retire(self, managed, reason):
+        if managed.retiring is None:
+            managed.retiring = reason
+            logger.info(f'Recycling Chromium (pid {managed.root_pid}) after {managed.profiles_served} profiles: {reason}')
+            _recycle_counter(reason).inc()
+        if self._current is managed:
+            self._current = None
+
+    async def _close_if_idle(self, managed):
+        if managed.active or managed not in self._browsers:
+            return
+        rss = managed.rss()
+        self._forget(managed, managed.retiring or 'idle')
+        profiles_per_browser.observe(managed.profiles_served)
+        if rss:
+            rss_at_close.observe(rss)
+        try:
+            await managed.browser.close()
+        except Exception as e:
+            logger.warning(f'Error closing Chromium: {str(e)}')
+        self.total_rss()
+
+    async def _close_when_idle_for(self, managed, seconds):
+        await asyncio.sleep(seconds)
+        if not managed.active and time.time() - managed.last_used >= seconds:
+            self._retire(managed, 'idle')
+            await self._close_if_idle(managed)
+
+    def _usable_current(self):
+        current = self._current
+        return current if current is not None and current.browser.is_connected() else None
+
+    async def _wait_for_memory(self):
+        """
+        While Chromium is over the memory cap, recycle every browser but the current one and
+        wait for the busy ones to drain. Returns as soon as only the current browser is left
+        to share; False if memory is still over the cap.
+        """
+        if psutil is None:
+            return True
+        deadline = time.time() + MEMORY_WAIT_SECONDS
+        waited = False
+        while self.total_rss() >= self.memory_cap:
+            current = self._usable_current()
+            draining = [managed for managed in self._browsers if managed is not current]
+            for managed in draining:
+                self._retire(managed, 'memory_cap')
+                await self._close_if_idle(managed)
+            if self.total_rss() < self.memory_cap:
+                break
+            if current is not None and not any(managed in self._browsers for managed in draining):
+                return False
+            if time.time() >= deadline:
+                return False
+            if not waited:
+                waited = True
+                memory_waits_total.inc()
+                logger.warning(f'Chromium memory over {self.memory_cap // MB} MB, waiting for running scrapes')
+            async with self._released:
+                try:
+                    await asyncio.wait_for(self._released.wait(), timeout=max(0.1, deadline - time.time()))
+                except asyncio.TimeoutError:
+                    pass
+        return True
+
+    async def _acquire(self):
+        self._ensure_primitives()
+        under_cap = await self._wait_for_memory()
+        async with self._launch_lock:
+            if self._usable_current() is None:
+                if not under_cap:
+                    raise BrowserUnavailable(f'Chromium memory still over {self.memory_cap // MB} MB '
+                                             f'after {MEMORY_WAIT_SECONDS}s, not launching another browser')
+                self._current = await self._launch()
+            managed = self._current
+        managed.active += 1
+        return managed
+
+    async def _release(self, managed):
+        managed.active -= 1
+        managed.profiles_served += 1
+        managed.last_used = time.time()
+        if managed.profiles_served >= self.max_profiles:
+            self._retire(managed, 'profiles')
+        elif managed.rss() >= self.max_rss:
+            self._retire(managed, 'rss')
+        if managed.retiring:
+            await self._close_if_idle(managed)
+        elif not managed.active and self.idle_seconds > 0:
+            task = asyncio.ensure_future(self._close_when_idle_for(managed, self.idle_seconds))
+            self._idle_tasks.add(task)
+            task.add_done_callback(self._idle_tasks.discard)
+        self.total_rss()
+        async with self._released:
+            self._released.notify_all()
+
+    @asynccontextmanager
+    async def browser(self):
+        """A running browser to open a context in for one profile"""
+        managed = await self._acquire()
+        try:
+            yield managed.browser
+        finally:
+            await self._release(managed)
+
+# Create global browser manager instance (used on the scraper loop only)
+browser_manager = BrowserManager()
@@ -1,23 +1,90 @@
+import asyncio
 import os
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import logging
-import requests
+import threading
+from concurrent.futures import Future
+import httpx
 
 # Import Gemini API key from credentials module
 from credentials import get_gemini_api_key
+from answer_cache import answer_cache
+from async_http import get_async_client
+from scraping import run_sync
+import metrics
+from metrics import span, SIZE_BUCKETS
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Overridable so the benchmarks can point at a local Gemini-compatible stub
+GEMINI_API_BASE = os.environ.get('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com')
+# Context caching needs an explicitly versioned model
+CHAT_MODEL = os.environ.get('GEMINI_CHAT_MODEL', 'gemini-2.0-flash-001')
+
+active_chat_sessions = metrics.gauge('active_chat_sessions', 'Chat sessions held in memory')
+
+def _to_contents(history: List[Dict[str, List[str]]]) -> List[dict]:
+    """Convert chat history to Gemini `contents`"""
+    return [
+        {
+            "role": msg["role"],
+            "parts": [{"text": msg["parts"][0]}]
+        }
+        for msg in history
+    ]
+
+def _context_cache_request(history: List[Dict[str, List[str]]], ttl_seconds: int, api_key: str):
+    url = f"{GEMINI_API_BASE}/v1beta/cachedContents?key={api_key}"
+    payload = {
+        "model": f"models/{CHAT_MODEL}",
+        "contents": _to_contents(history),
+        "ttl": f"{int(ttl_seconds)}s"
+    }
+    return url, payload
+
+async def acreate_context_cache(history: List[Dict[str, List[str]]], ttl_seconds: int) -> Optional[str]:
+    """Store a conversation prefix as a Gemini cachedContent; returns its name or None if caching isn't available."""
+    api_key = get_gemini_api_key()
+    if not api_key:
+        return None
+    try:
+        url, payload = _context_cache_request(history, ttl_seconds, api_key)
+        with span('gemini_cache_create'):
+            response = await get_async_client().post(url, json=payload)
+        response.raise_for_status()
+        name = response.json()["name"]
+        logger.info(f'Created Gemini context cache {name}')
+        return name
+    except Exception as e:
+        # e.g. the context is below the model's minimum cacheable size
+        logger.warning(f'Gemini context caching unavailable, using full history: {str(e)}')
+        return None
+
 class ChatSession:
-    def __init__(self, session_id: str, summary_data: str):
-        """Initialize a new chat session."""
+    def __init__(self, session_id: str, summary_data: str, context_cache: Optional[dict] = None,
+                 analysis_id: Optional[str] = None, start: bool = True, analysis_version: Optional[float] = None):
+        """Initialize a new chat session.
+        With a context_cache, the opening exchange comes from the cache instead of a new Gemini call.
+        With start=False the opening exchange is left to `await session.astart()`.
+        analysis_version (the stored analysis's mtime) keeps cached answers to this version."""
         self.session_id = session_id
         self.summary_data = summary_data
+        self.analysis_id = analysis_id
+        self.analysis_version = analysis_version
         self.created_at = datetime.now()
         self.last_accessed = datetime.now()
         self.history: List[Dict[str, List[str]]] = []
+        # Turns at the start of history that are held server-side in cached_content
+        self.cached_content: Optional[str] = None
+        self.cached_turns = 0
+        
+        if context_cache:
+            self.history = list(context_cache['history'])
+            self.cached_content = context_cache['name']
+            self.cached_turns = len(self.history) if self.cached_content else 0
+            return
         
         # Initialize chat with context
         initial_prompt = f"""You are an AI assistant helping to analyze and discuss a LinkedIn profile summary.
@@ -28,36 +95,96 @@ class ChatSession:
         Make sure to keep your responses properly formatted and prefer not using any bold formatting or lists, answer in an intuitive paragraph style chat format. if your refer anything from the data provided also make sure not to use any asterix or other symbols used for markdown formatting.
         Please help answer questions and provide insights about this profile. Keep your responses professional and focused on the career and professional aspects discussed in the summary."""
         
+        # Add initial context to history
+        self.history.append({"role": "user", "parts": [initial_prompt]})
+        if start:
+            run_sync(self.astart())
+
+    async def astart(self):
+        """Get the opening response of a session created with start=False"""
+        if len(self.history) != 1:
+            return
         try:
-            # Add initial context to history
-            self.history.append({"role": "user", "parts": [initial_prompt]})
             # Get initial response from Gemini
-            initial_response = self._get_gemini_response(self.history)
+            initial_response = await self._aget_gemini_response(self.history)
             self.history.append({"role": "model", "parts": [initial_response]})
         except Exception as e:
             logger.error(f"Failed to initialize chat session: {str(e)}")
             raise
 
+    def _is_first_turn(self) -> bool:
+        # First questions don't depend on the conversation, so they can be answered from cache
+        return bool(self.analysis_id) and answer_cache.enabled and len(self.history) == 2
+
     def send_message(self, message: str) -> str:
         """Send a message to the chat and get the response."""
+        return run_sync(self.asend_message(message))
+
+    async def asend_message(self, message: str, run_cpu=asyncio.to_thread) -> str:
+        """send_message() for async callers; `run_cpu(fn, *args)` runs the question embedding off the event loop."""
         try:
             self.last_accessed = datetime.now()
             
+            first_turn = self._is_first_turn()
+            if first_turn:
+                cached_answer, question_vector = await run_cpu(answer_cache.lookup, self.analysis_id, self.analysis_version, message)
+                if cached_answer is not None:
+                    self.history.append({"role": "user", "parts": [message]})
+                    self.history.append({"role": "model", "parts": [cached_answer]})
+                    return cached_answer
+            
             # Add user message to history
             self.history.append({"role": "user", "parts": [message]})
             
             # Get response from Gemini
-            response = self._get_gemini_response(self.history)
+            response = await self._aget_gemini_response(self.history)
             
             # Add response to history
             self.history.append({"role": "model", "parts": [response]})
             
+            if first_turn and not response.startswith("Error"):
+                await run_cpu(answer_cache.store, self.analysis_id, self.analysis_version, message, question_vector, response)
+            
             return response
         except Exception as e:
             logger.error(f"Error in chat message exchange: {str(e)}")
             raise
 
-    def _get_gemini_response(self, history: List[Dict[str, List[str]]]) -> str:
+    def _gemini_request(self, history: List[Dict[str, List[str]]], api_key: str):
+        """URL, payload and the turns actually sent for a generateContent call"""
+        # Only the turns after the cached prefix are sent when a context cache is in use
+        cached_content = self.cached_content
+        sent_history = history[self.cached_turns:] if cached_content else history
+        payload = {
+            "contents": _to_contents(sent_history)
+        }
+        if cached_content:
+            payload["cachedContent"] = cached_content
+        url = f"{GEMINI_API_BASE}/v1beta/models/{CHAT_MODEL}:generateContent?key={api_key}"
+        return url, payload, sent_history
+
+    def _cache_rejected(self, status_code: int) -> bool:
+        """Drop an expired or rejected context cache; True if the call should be retried with full history"""
+        if not self.cached_content or status_code not in (400, 403, 404):
+            return False
+        logger.warning(f'Gemini context cache {self.cached_content} unusable ({status_code}), resending full history')
+        metrics.counter('gemini_context_cache_fallbacks_total', 'Chat calls that fell back to full history').inc()
+        self.cached_content = None
+        self.cached_turns = 0
+        return True
+
+    def _answer_from_response(self, sent_history, content: bytes, result: dict) -> str:
+        metrics.histogram('gemini_prompt_bytes', 'Size of prompts sent to Gemini', {'call': 'chat'}, SIZE_BUCKETS).observe(
+            sum(len(msg["parts"][0]) for msg in sent_history)
+        )
+        metrics.histogram('gemini_response_bytes', 'Size of Gemini responses', {'call': 'chat'}, SIZE_BUCKETS).observe(len(content))
+        if "candidates" in result:
+            return result["candidates"][0]["content"]["parts"][0]["text"]
+        else:
+            logger.error('Unexpected API response format')
+            return "Error: Unable to generate response from the API"
+
+    async def _aget_gemini_response(self, history: List[Dict[str, List[str]]]) -> str:
         """Get response from Gemini API using the same approach as generate_summary.py."""
         try:
             # Get Gemini API key
@@ -67,34 +194,17 @@ class ChatSession:
                 logger.error('Gemini API key not set')
                 return "Error: Gemini API key not configured"
 
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "contents": [
-                    {
-                        "role": msg["role"],
-                        "parts": [{"text": msg["parts"][0]}]
-                    }
-                    for msg in history
-                ]
-            }
-            
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={api_key}"
+            url, payload, sent_history = self._gemini_request(history, api_key)
             
             logger.info('Sending request to Gemini API')
-            response = requests.post(url, headers=headers, json=payload)
+            with span('gemini_chat'):
+                response = await get_async_client().post(url, json=payload)
+            if self._cache_rejected(response.status_code):
+                return await self._aget_gemini_response(history)
             response.raise_for_status()
-            
-            result = response.json()
-            if "candidates" in result:
-                return result["candidates"][0]["content"]["parts"][0]["text"]
-            else:
-                logger.error('Unexpected API response format')
-                return "Error: Unable to generate response from the API"
+            return self._answer_from_response(sent_history, response.content, response.json())
                 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f'Error calling Gemini API: {str(e)}')
             return f"Error calling Gemini API: {str(e)}"
         except Exception as e:
@@ -106,16 +216,123 @@ class ChatManager:
         """Initialize the chat manager."""
         self.sessions: Dict[str, ChatSession] = {}
         self.session_timeout = timedelta(minutes=session_timeout_minutes)
+        # Opening exchange and Gemini cachedContent name per analysis ID
+        self.context_caches: Dict[str, dict] = {}
+        # Context caches being built, per analysis ID; concurrent inits wait for these instead
+        # of each making their own opening call and cachedContent
+        self._building: Dict[str, Future] = {}
+        self._cache_lock = threading.Lock()
+
+    def _get_context_cache(self, analysis_id: str) -> Optional[dict]:
+        """Return the unexpired context cache for an analysis, if any."""
+        with self._cache_lock:
+            return self._unexpired_context_cache(analysis_id)
+
+    def _unexpired_context_cache(self, analysis_id: str) -> Optional[dict]:
+        # Caller holds _cache_lock
+        context_cache = self.context_caches.get(analysis_id)
+        if context_cache and datetime.now() < context_cache['expires_at']:
+            return context_cache
+        self.context_caches.pop(analysis_id, None)
+        return None
+
+    def _claim_context_cache(self, analysis_id: str):
+        """
+        Look up the context cache of an analysis, or claim building it.
+        Returns:
+            Tuple containing:
+            - the unexpired context cache, or None
+            - the future of a build already in flight (to await), or None
+            - a new future if this caller builds the cache, or None
+        """
+        with self._cache_lock:
+            context_cache = self._unexpired_context_cache(analysis_id)
+            if context_cache:
+                return context_cache, None, None
+            building = self._building.get(analysis_id)
+            if building is not None:
+                return None, building, None
+            build = self._building[analysis_id] = Future()
+            return None, None, build
 
-    def create_session(self, session_id: str, summary_data: str) -> ChatSession:
-        """Create a new chat session."""
+    def _cacheable_opening(self, session: ChatSession) -> Optional[list]:
+        opening = session.history[:2]
+        if len(opening) < 2 or opening[1]["parts"][0].startswith("Error"):
+            return None
+        return opening
+
+    def _store_context_cache(self, analysis_id: str, opening: list, name: Optional[str], build: Future) -> Optional[dict]:
+        with self._cache_lock:
+            context_cache = {
+                'name': name,
+                'history': opening,
+                'expires_at': datetime.now() + self.session_timeout
+            }
+            # Not if the analysis was regenerated while the cache was being built
+            if self._building.get(analysis_id) is not build:
+                return None
+            self.context_caches[analysis_id] = context_cache
+            return context_cache
+
+    def _finish_build(self, analysis_id: str, build: Future, context_cache: Optional[dict]):
+        with self._cache_lock:
+            if self._building.get(analysis_id) is build:
+                del self._building[analysis_id]
+        if not build.done():
+            build.set_result(context_cache)
+
+    async def _acreate_context_cache(self, analysis_id: str, session: ChatSession, build: Future) -> Optional[dict]:
+        """Cache a fresh session's opening exchange for later sessions on the same analysis."""
+        opening = self._cacheable_opening(session)
+        if not opening:
+            return None
+        # Server-side cache lives exactly as long as an idle session
+        name = await acreate_context_cache(opening, self.session_timeout.total_seconds())
+        return self._store_context_cache(analysis_id, opening, name, build)
+
+    def create_session(self, session_id: str, summary_data: str, analysis_id: Optional[str] = None,
+                       analysis_version: Optional[float] = None) -> ChatSession:
+        """Create a new chat session.
+        Sessions on the same analysis share a Gemini context cache when available."""
+        return run_sync(self.acreate_session(session_id, summary_data, analysis_id, analysis_version))
+
+    async def acreate_session(self, session_id: str, summary_data: str, analysis_id: Optional[str] = None,
+                              analysis_version: Optional[float] = None) -> ChatSession:
+        """create_session() for async callers"""
+        context_cache = building = build = None
         try:
-            session = ChatSession(session_id, summary_data)
+            if analysis_id:
+                context_cache, building, build = self._claim_context_cache(analysis_id)
+                if building is not None:
+                    # Another init is building this analysis's cache; share it rather than build a second one
+                    context_cache = await asyncio.wrap_future(building)
+            with span('chat_init'):
+                session = ChatSession(session_id, summary_data, context_cache, analysis_id, start=False,
+                                      analysis_version=analysis_version)
+                await session.astart()
+            if analysis_id:
+                metrics.counter('chat_context_cache_requests_total', 'Chat sessions by context cache outcome',
+                                {'result': 'hit' if context_cache else 'miss'}).inc()
+                if build is not None:
+                    self._finish_build(analysis_id, build, await self._acreate_context_cache(analysis_id, session, build))
             self.sessions[session_id] = session
+            active_chat_sessions.set(len(self.sessions))
             return session
         except Exception as e:
             logger.error(f"Failed to create chat session: {str(e)}")
             raise
+        finally:
+            if build is not None:
+                # Waiters fall back to sessions of their own if the build failed
+                self._finish_build(analysis_id, build, None)
+
+    def invalidate_analysis(self, analysis_id: str):
+        """Drop the context cache and cached answers of an analysis that was regenerated."""
+        with self._cache_lock:
+            self.context_caches.pop(analysis_id, None)
+            # A build in flight is for the old version; it is finished but not stored
+            self._building.pop(analysis_id, None)
+        answer_cache.clear(analysis_id)
 
     def get_session(self, session_id: str) -> Optional[ChatSession]:
         """Get an existing chat session."""
@@ -125,6 +342,7 @@ class ChatManager:
             if datetime.now() - session.last_accessed > self.session_timeout:
                 logger.info(f"Session {session_id} has expired")
                 del self.sessions[session_id]
+                active_chat_sessions.set(len(self.sessions))
                 return None
             return session
         return None
@@ -138,6 +356,13 @@ class ChatManager:
         ]
         for session_id in expired_sessions:
             del self.sessions[session_id]
+        active_chat_sessions.set(len(self.sessions))
+        with self._cache_lock:
+            for analysis_id in [
+                analysis_id for analysis_id, context_cache in self.context_caches.items()
+                if current_time >= context_cache['expires_at']
+            ]:
+                del self.context_caches[analysis_id]
 
 # Create global chat manager instance
 chat_manager = ChatManager() 
\ No newline at end of file
@@ -1,18 +1,39 @@
 # Global credentials storage
+import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
 GLOBAL_LINKEDIN_EMAIL = None
 GLOBAL_LINKEDIN_PASSWORD = None
 GLOBAL_GEMINI_API_KEY = None
+# Every LinkedIn account scrapes may use, email -> password; the global one is among them
+LINKEDIN_ACCOUNTS = {}
+
+def _mask(email):
+    return f'{email[:3]}***{email[-3:]}'
 
 def set_linkedin_credentials(email, password):
     """Set LinkedIn credentials"""
     global GLOBAL_LINKEDIN_EMAIL, GLOBAL_LINKEDIN_PASSWORD
+    if GLOBAL_LINKEDIN_EMAIL and GLOBAL_LINKEDIN_EMAIL != email:
+        # The previous global account is replaced, not kept in the pool alongside the new one
+        remove_linkedin_account(GLOBAL_LINKEDIN_EMAIL)
     GLOBAL_LINKEDIN_EMAIL = email
     GLOBAL_LINKEDIN_PASSWORD = password
-    logger.info(f'LinkedIn credentials set. Email: {email[:3]}***{email[-3:]}')
+    add_linkedin_account(email, password)
+    logger.info(f'LinkedIn credentials set. Email: {_mask(email)}')
+
+def add_linkedin_account(email, password):
+    """Add an account to the scraping pool, or update its password"""
+    LINKEDIN_ACCOUNTS[email] = password
+    logger.info(f'LinkedIn account {_mask(email)} in pool, {len(LINKEDIN_ACCOUNTS)} accounts')
+
+def remove_linkedin_account(email):
+    """Take an account out of the scraping pool"""
+    if LINKEDIN_ACCOUNTS.pop(email, None) is not None:
+        logger.info(f'LinkedIn account {_mask(email)} removed from pool, {len(LINKEDIN_ACCOUNTS)} accounts')
 
 def set_gemini_api_key(api_key):
     """Set Gemini API key"""
@@ -25,7 +46,24 @@ def get_linkedin_credentials():
     logger.info(f'Retrieving LinkedIn credentials. Email set: {bool(GLOBAL_LINKEDIN_EMAIL)}')
     return GLOBAL_LINKEDIN_EMAIL, GLOBAL_LINKEDIN_PASSWORD
 
+def get_linkedin_accounts():
+    """(email, password) of every account in the scraping pool"""
+    return list(LINKEDIN_ACCOUNTS.items())
+
 def get_gemini_api_key():
     """Get Gemini API key"""
     logger.info(f'Retrieving Gemini API key. Key set: {bool(GLOBAL_GEMINI_API_KEY)}')
-    return GLOBAL_GEMINI_API_KEY 
\ No newline at end of file
+    return GLOBAL_GEMINI_API_KEY
+
+def load_linkedin_accounts_from_env():
+    """Add the accounts in LINKEDIN_ACCOUNTS, a JSON list of {"email", "password"} objects"""
+    raw = os.environ.get('LINKEDIN_ACCOUNTS')
+    if not raw:
+        return
+    try:
+        for account in json.loads(raw):
+            add_linkedin_account(account['email'], account['password'])
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f'Invalid LINKEDIN_ACCOUNTS: {str(e)}')
+
+load_linkedin_accounts_from_env()
@@ -0,0 +1,470 @@
+"""
+Bulk export of stored analyses.
+
+Streams every analysis in cache/ into three tables: one row per profile (typed profile
+fields, summary, similarity metrics, timestamps) and one row per experience and per
+education entry. Files are read one at a time, so memory stays flat however large the
+store is. Pass the watermark printed by the last run as --since to export only analyses
+written after it.
+
+Usage (from the backend directory):
+    python export_analyses.py --format parquet --output exports/ --since 1760000000.25:3f2a9c0d1e4b5a6c7d8e
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import pathlib
+import re
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+
+from generate_summary import parse_linkedin_data
+from profile_facts import PRESENT, parse_duration, experience_months
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export needs pyarrow
+    pyarrow = None
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # XLSX export needs openpyxl
+    Workbook = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = pathlib.Path('cache')
+# Rows buffered per table before a Parquet row group is written
+EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', 1000))
+# Exports built for the API, and how long they are kept for download
+EXPORT_JOBS_DIR = pathlib.Path('exports') / 'jobs'
+EXPORT_RETENTION_SECONDS = int(os.environ.get('EXPORT_RETENTION_SECONDS', 3600))
+
+# Column name and type of each table
+SCHEMAS = {
+    'profiles': [
+        ('analysis_id', 'string'),
+        ('url', 'string'),
+        ('name', 'string'),
+        ('designation', 'string'),
+        ('location', 'string'),
+        ('about_title', 'string'),
+        ('about', 'string'),
+        ('experience_count', 'int'),
+        ('education_count', 'int'),
+        ('posts_count', 'int'),
+        ('experience_months', 'int'),
+        ('overlapping_experience_months', 'int'),
+        ('summary', 'string'),
+        ('summary_options', 'string'),
+        ('similarity_score', 'float'),
+        ('raw_data_length', 'int'),
+        ('summary_length', 'int'),
+        ('analyzed_at', 'timestamp'),
+        ('stored_at', 'timestamp')
+    ],
+    'experience': [
+        ('analysis_id', 'string'),
+        ('position', 'int'),
+        ('title', 'string'),
+        ('company', 'string'),
+        ('location', 'string'),
+        ('duration', 'string'),
+        ('start_month', 'date'),
+        ('end_month', 'date'),
+        ('is_current', 'bool'),
+        ('months', 'int')
+    ],
+    'education': [
+        ('analysis_id', 'string'),
+        ('position', 'int'),
+        ('school', 'string'),
+        ('degree', 'string'),
+        ('duration', 'string'),
+        ('start_year', 'int'),
+        ('end_year', 'int')
+    ]
+}
+FORMATS = ('csv', 'parquet', 'xlsx')
+
+class ExportUnavailable(Exception):
+    """The requested format needs a package that isn't installed"""
+
+def _text(value):
+    return None if value in (None, '', 'N/A') else str(value)
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc) if seconds is not None else None
+
+def _month_date(month_index):
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def parse_watermark(watermark):
+    """
+    Split a watermark into the newest mtime exported and the analysis IDs exported at
+    exactly that mtime. A bare mtime (no IDs) is accepted too.
+    Raises ValueError if it is malformed.
+    """
+    mtime, _, names = str(watermark).partition(':')
+    return float(mtime), frozenset(name for name in names.split(',') if name)
+
+def format_watermark(mtime, names):
+    return f'{mtime!r}:{",".join(sorted(names))}'
+
+def iter_analysis_files(cache_dir=CACHE_DIR, since=None):
+    """
+    Analysis files written since the watermark `since`, oldest first.
+    Returns:
+        Tuple containing:
+        - list of (mtime, path)
+        - the watermark to pass as `since` next time
+    """
+    since_mtime, since_names = parse_watermark(since) if since is not None else (None, frozenset())
+    files = []
+    for path in cache_dir.glob('*.json'):
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            continue  # Removed since the listing
+        # mtimes can be coarse, so files sharing the watermark's mtime are told apart by name
+        if since_mtime is None or mtime > since_mtime or (mtime == since_mtime and path.stem not in since_names):
+            files.append((mtime, path))
+    files.sort()
+    if not files:
+        return files, since
+    # Files written after this listing have a later mtime, or the same one and a name not in the watermark
+    newest = files[-1][0]
+    names = {path.stem for mtime, path in files if mtime == newest}
+    if newest == since_mtime:
+        names |= since_names
+    return files, format_watermark(newest, names)
+
+def analysis_rows(analysis, stored_at):
+    """Yield (table, row) for one stored analysis"""
+    analysis_id = analysis.get('analysis_id')
+    analyzed_at = analysis.get('analyzed_at') or stored_at
+    sections = parse_linkedin_data(analysis.get('raw_data') or '')
+    profile = sections.get('profile') or {}
+    experience = sections.get('experience') or []
+    education = sections.get('education') or []
+    # "Present" means the day of the analysis, not the day of the export
+    as_of = _timestamp(analyzed_at).date()
+    total_months, overlap_months = experience_months(experience, today=as_of)
+    similarity = analysis.get('similarity_analysis') or {}
+    similarity_metrics = similarity.get('metrics') or {}
+
+    yield 'profiles', {
+        'analysis_id': analysis_id,
+        'url': analysis.get('url'),
+        'name': _text(profile.get('Name')),
+        'designation': _text(profile.get('Designation')),
+        'location': _text(profile.get('Location')),
+        'about_title': _text(profile.get('About Title')),
+        'about': _text(profile.get('About')),
+        'experience_count': len(experience),
+        'education_count': len(education),
+        'posts_count': len(sections.get('posts') or []),
+        'experience_months': total_months,
+        'overlapping_experience_months': overlap_months,
+        'summary': analysis.get('summary'),
+        'summary_options': json.dumps(analysis['summary_options']) if analysis.get('summary_options') else None,
+        'similarity_score': similarity.get('score'),
+        'raw_data_length': similarity_metrics.get('raw_data_length'),
+        'summary_length': similarity_metrics.get('summary_length'),
+        'analyzed_at': _timestamp(analyzed_at),
+        'stored_at': _timestamp(stored_at)
+    }
+
+    for position, exp in enumerate(experience):
+        interval = parse_duration(exp.get('Duration'), today=as_of)
+        is_current = any(word in (exp.get('Duration') or '').lower() for word in PRESENT)
+        yield 'experience', {
+            'analysis_id': analysis_id,
+            'position': position,
+            'title': _text(exp.get('Title')),
+            'company': _text(exp.get('Company')),
+            'location': _text(exp.get('Location')),
+            'duration': _text(exp.get('Duration')),
+            'start_month': _month_date(interval[0]) if interval else None,
+            # Interval ends are exclusive; the last month worked is the one before
+            'end_month': _month_date(interval[1] - 1) if interval and not is_current else None,
+            'is_current': is_current,
+            'months': interval[1] - interval[0] if interval else None
+        }
+
+    for position, edu in enumerate(education):
+        # Years as written: a degree listed as '2015 - 2019' ended in 2019
+        years = [int(year) for year in re.findall(r'\b\d{4}\b', (edu.get('Duration') or '').split('·')[0])]
+        yield 'education', {
+            'analysis_id': analysis_id,
+            'position': position,
+            'school': _text(edu.get('School')),
+            'degree': _text(edu.get('Degree')),
+            'duration': _text(edu.get('Duration')),
+            'start_year': years[0] if years else None,
+            'end_year': years[-1] if years and not any(word in edu['Duration'].lower() for word in PRESENT) else None
+        }
+
+def iter_export_rows(files, tables=SCHEMAS):
+    """Yield (table, row) for every analysis file, loading one file at a time"""
+    for stored_at, path in files:
+        try:
+            analysis = json.loads(path.read_bytes())
+        except (OSError, ValueError) as e:
+            logger.warning(f'Skipping unreadable analysis {path.name}: {str(e)}')
+            continue
+        for table, row in analysis_rows(analysis, stored_at):
+            if table in tables:
+                yield table, row
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat().replace('+00:00', 'Z')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def iter_csv(rows, table):
+    """CSV text of one table, a line at a time, for streaming responses"""
+    columns = [column for column, _ in SCHEMAS[table]]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row_table, row in rows:
+        if row_table != table:
+            continue
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def _arrow_schema(table):
+    types = {
+        'string': pyarrow.string(),
+        'int': pyarrow.int64(),
+        'float': pyarrow.float64(),
+        'bool': pyarrow.bool_(),
+        'timestamp': pyarrow.timestamp('ms', tz='UTC'),
+        'date': pyarrow.date32()
+    }
+    return pyarrow.schema([(column, types[kind]) for column, kind in SCHEMAS[table]])
+
+def write_parquet(rows, paths):
+    """Write each table to its Parquet file in row groups of EXPORT_BATCH_ROWS; returns rows per table"""
+    if pyarrow is None:
+        raise ExportUnavailable('Parquet export needs pyarrow (pip install pyarrow)')
+    writers = {table: pyarrow.parquet.ParquetWriter(str(path), _arrow_schema(table)) for table, path in paths.items()}
+    batches = {table: [] for table in paths}
+    counts = {table: 0 for table in paths}
+
+    def flush(table):
+        if batches[table]:
+            writers[table].write_table(pyarrow.Table.from_pylist(batches[table], schema=writers[table].schema))
+            batches[table] = []
+
+    try:
+        for table, row in rows:
+            if table not in writers:
+                continue
+            batches[table].append(row)
+            counts[table] += 1
+            if len(batches[table]) >= EXPORT_BATCH_ROWS:
+                flush(table)
+        for table in writers:
+            flush(table)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return counts
+
+def write_xlsx(rows, path, tables=SCHEMAS):
+    """Write one sheet per table with openpyxl's streaming writer; returns rows per table"""
+    if Workbook is None:
+        raise ExportUnavailable('XLSX export needs openpyxl (pip install openpyxl)')
+    workbook = Workbook(write_only=True)
+    sheets = {}
+    for table in tables:
+        sheets[table] = workbook.create_sheet(table)
+        sheets[table].append([column for column, _ in SCHEMAS[table]])
+    counts = {table: 0 for table in tables}
+    for table, row in rows:
+        if table not in sheets:
+            continue
+        # Excel has no time zones; timestamps are written as naive UTC
+        sheets[table].append([
+            value.replace(tzinfo=None) if isinstance(value, datetime) else value
+            for value in (row[column] for column, _ in SCHEMAS[table])
+        ])
+        counts[table] += 1
+    workbook.save(str(path))
+    return counts
+
+def write_csv(rows, paths):
+    """Write each table to its CSV file; returns rows per table"""
+    files = {table: open(path, 'w', newline='', encoding='utf-8') for table, path in paths.items()}
+    writers = {table: csv.writer(f) for table, f in files.items()}
+    counts = {table: 0 for table in paths}
+    try:
+        for table, columns in ((table, [column for column, _ in SCHEMAS[table]]) for table in paths):
+            writers[table].writerow(columns)
+        for table, row in rows:
+            if table not in writers:
+                continue
+            writers[table].writerow([_csv_value(row[column]) for column, _ in SCHEMAS[table]])
+            counts[table] += 1
+    finally:
+        for f in files.values():
+            f.close()
+    return counts
+
+def export(output_dir, export_format='csv', since=None, cache_dir=CACHE_DIR, tables=SCHEMAS):
+    """
+    Export analyses written after `since` into output_dir: one file per table for CSV and
+    Parquet, one workbook with a sheet per table for XLSX.
+    Returns:
+        Tuple containing:
+        - rows written per table
+        - the watermark to pass as `since` next time
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f'Unknown export format: {export_format}')
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    files, watermark = iter_analysis_files(cache_dir, since)
+    rows = iter_export_rows(files, tables)
+    if export_format == 'xlsx':
+        counts = write_xlsx(rows, output_dir / 'analyses.xlsx', tables)
+    else:
+        paths = {table: output_dir / f'{table}.{export_format}' for table in tables}
+        writer = write_parquet if export_format == 'parquet' else write_csv
+        counts = writer(rows, paths)
+    logger.info(f'Exported {len(files)} analyses: {counts}')
+    return counts, watermark
+
+class ExportJobs:
+    """
+    Parquet and XLSX exports built on a background thread, so requests don't wait for them.
+    Each job lives in jobs_dir under a random ID, so any worker can answer a poll for it:
+    `<id>.json` holds its state (building, done or failed, plus the watermark) and
+    `<id>.export` the finished file. Jobs are deleted after retention_seconds.
+    """
+
+    def __init__(self, jobs_dir=EXPORT_JOBS_DIR, cache_dir=CACHE_DIR,
+                 retention_seconds=EXPORT_RETENTION_SECONDS, workers=1):
+        self.jobs_dir = pathlib.Path(jobs_dir)
+        self.cache_dir = cache_dir
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export')
+
+    def _state_path(self, job_id):
+        return self.jobs_dir / f'{job_id}.json'
+
+    def file_path(self, job_id):
+        return self.jobs_dir / f'{job_id}.export'
+
+    def _write_state(self, job_id, state):
+        tmp_path = self.jobs_dir / f'{job_id}.json.tmp'
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, self._state_path(job_id))
+
+    def status(self, job_id):
+        """State of an export job, or None if it is unknown or expired"""
+        try:
+            return json.loads(self._state_path(job_id).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def start(self, export_format, since=None, tables=SCHEMAS):
+        """Queue an export (Parquet of one table, or XLSX) and return its job ID"""
+        if export_format == 'parquet':
+            if pyarrow is None:
+                raise ExportUnavailable('Parquet export needs pyarrow (pip install pyarrow)')
+            if len(tables) != 1:
+                raise ValueError('A Parquet export holds one table')
+            filename = f'{next(iter(tables))}.parquet'
+        elif export_format == 'xlsx':
+            if Workbook is None:
+                raise ExportUnavailable('XLSX export needs openpyxl (pip install openpyxl)')
+            filename = 'analyses.xlsx'
+        else:
+            raise ValueError(f'Unsupported export job format: {export_format}')
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        state = {'status': 'building', 'format': export_format, 'filename': filename, 'created_at': time.time()}
+        self._write_state(job_id, state)
+        self._executor.submit(self._run, job_id, state, since, list(tables))
+        return job_id
+
+    def _run(self, job_id, state, since, tables):
+        build_dir = self.jobs_dir / f'{job_id}.building'
+        try:
+            counts, watermark = export(build_dir, state['format'], since, self.cache_dir, tables)
+            os.replace(build_dir / state['filename'], self.file_path(job_id))
+            state.update(status='done', counts=counts, watermark=watermark)
+        except Exception as e:
+            logger.error(f'Export {job_id} failed: {str(e)}')
+            state.update(status='failed', error=str(e))
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+        self._write_state(job_id, state)
+
+    def cleanup(self):
+        """Delete jobs older than retention_seconds, downloaded or not"""
+        cutoff = time.time() - self.retention_seconds
+        for path in self.jobs_dir.iterdir():
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+                if path.is_dir():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink()
+            except OSError:
+                continue  # Removed meanwhile, or still being downloaded on Windows
+
+def main():
+    parser = argparse.ArgumentParser(description='Export stored analyses to CSV, Parquet or XLSX')
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--output', default='exports', help='Directory to write the export files to')
+    parser.add_argument('--since', help='Only export analyses written since this watermark (printed by the last export)')
+    parser.add_argument('--cache-dir', default=str(CACHE_DIR), help='Directory of the stored analyses')
+    parser.add_argument('--tables', default=','.join(SCHEMAS), help='Comma separated tables to export')
+    args = parser.parse_args()
+
+    tables = [table for table in args.tables.split(',') if table]
+    unknown = set(tables) - set(SCHEMAS)
+    if unknown:
+        parser.error(f'Unknown tables: {", ".join(sorted(unknown))}')
+
+    if args.since is not None:
+        try:
+            parse_watermark(args.since)
+        except ValueError:
+            parser.error(f'Invalid watermark: {args.since}')
+
+    started = time.time()
+    try:
+        counts, watermark = export(args.output, args.format, args.since, pathlib.Path(args.cache_dir), tables)
+    except ExportUnavailable as e:
+        parser.exit(1, f'{e}\n')
+    print(json.dumps({
+        'rows': counts,
+        'watermark': watermark,
+        'seconds': round(time.time() - started, 2)
+    }, indent=2))
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
@@ -1,26 +1,38 @@
-import requests
+import asyncio
+import httpx
 import json
+import ast
+import re
 import os
 import sys
 from io import StringIO
 import logging
 from datetime import datetime
-from scraping import main as scrape_linkedin
+from scraping import main_async as scrape_linkedin_async, run_sync
+from section_store import (
+    SECTION_TTLS,
+    load_sections,
+    stale_sections,
+    update_sections,
+    summary_fingerprint,
+    get_stored_summary,
+    save_summary
+)
+from profile_facts import extract_facts, prepend_facts
+from async_http import get_async_client
 
 # Import Gemini API key from credentials module
 from credentials import get_gemini_api_key
+import metrics
+from metrics import span, SIZE_BUCKETS
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-def capture_linkedin_data(profile_url):
-    """Capture the printed output from LinkedIn scraping"""
-    logger.info('Starting LinkedIn data capture')
-    try:
-        # Check if input is "1234" and return dummy data
-        if profile_url == "1234":
-            logger.info('Using dummy LinkedIn data')
-            dummy_data = """
+# Overridable so the benchmarks can point at a local Gemini-compatible stub
+GEMINI_API_BASE = os.environ.get('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com')
+
+DUMMY_LINKEDIN_DATA = """
 === Profile Information ===
 {'Name': 'John Doe', 'Designation': 'Senior Software Engineer', 'Location': 'San Francisco Bay Area'}
 
@@ -35,14 +47,21 @@ def capture_linkedin_data(profile_url):
 [{'School': 'Stanford University', 'Degree': 'MS Computer Science', 'Duration': '2016 - 2018'},
 {'School': 'MIT', 'Degree': 'BS Computer Science', 'Duration': '2012 - 2016'}]
 """
-            return dummy_data
 
-        # Run the LinkedIn scraping with the provided URL
-        result = scrape_linkedin(profile_url)
-        
-        if result:
-            # Convert the result to a string format
-            output = f"""
+def _merge_scrape(profile_url, record, stale, scraped):
+    """Store freshly scraped sections in the section record"""
+    failed = [section for section in stale if not scraped or scraped.get(section) is None]
+    if scraped:
+        update_sections(profile_url, record, scraped)
+    if failed and any(section in record['sections'] for section in failed):
+        logger.warning(f'Re-scrape of {failed} failed, falling back to previously scraped sections')
+
+def _format_capture(record):
+    """Captured LinkedIn data as text, or None if a section was never scraped"""
+    if all(section in record['sections'] for section in SECTION_TTLS):
+        result = {section: entry['data'] for section, entry in record['sections'].items()}
+        # Convert the result to a string format
+        output = f"""
 === Profile Information ===
 {result['profile']}
 
@@ -55,18 +74,163 @@ def capture_linkedin_data(profile_url):
 === Posts ===
 {result['posts']}
 """
-            logger.info('Successfully captured LinkedIn data')
-            return output
+        logger.info('Successfully captured LinkedIn data')
+        return output
+    else:
+        logger.error('Failed to scrape LinkedIn data')
+        return None
+
+def capture_linkedin_data(profile_url):
+    """Capture the printed output from LinkedIn scraping"""
+    return run_sync(acapture_linkedin_data(profile_url))
+
+async def acapture_linkedin_data(profile_url):
+    """capture_linkedin_data() for async callers; section store reads and writes run off the event loop"""
+    logger.info('Starting LinkedIn data capture')
+    try:
+        # Check if input is "1234" and return dummy data
+        if profile_url == "1234":
+            logger.info('Using dummy LinkedIn data')
+            return DUMMY_LINKEDIN_DATA
+
+        # Re-scrape only the sections whose TTL has passed
+        record = await asyncio.to_thread(load_sections, profile_url)
+        stale = stale_sections(record)
+        if stale:
+            logger.info(f'Scraping stale sections: {stale}')
+            previous_posts = record['sections'].get('posts', {}).get('data')
+            scraped = await scrape_linkedin_async(profile_url, sections=stale, previous_posts=previous_posts)
+            await asyncio.to_thread(_merge_scrape, profile_url, record, stale, scraped)
         else:
-            logger.error('Failed to scrape LinkedIn data')
-            return None
+            logger.info('All sections are fresh, skipping scraping')
+        return _format_capture(record)
             
     except Exception as e:
         logger.error(f'Error capturing LinkedIn data: {str(e)}')
         return None
 
+SECTION_NAMES = {
+    'Profile Information': 'profile',
+    'Experience': 'experience',
+    'Education': 'education',
+    'Posts': 'posts',
+    'Recent Posts': 'posts',
+    'Generated Professional Summary': 'summary'
+}
+
+def parse_linkedin_data(linkedin_data):
+    """Parse the captured LinkedIn output back into a dict of structured sections"""
+    sections = {}
+    parts = re.split(r'^=== (.+?) ===$', linkedin_data, flags=re.MULTILINE)
+    for title, content in zip(parts[1::2], parts[2::2]):
+        name = SECTION_NAMES.get(title.strip())
+        if not name:
+            continue
+        content = content.strip()
+        if name == 'summary':
+            sections[name] = content
+            continue
+        # Anything printed after a section (e.g. progress messages) follows a blank line
+        for candidate in (content, content.split('\n\n')[0]):
+            try:
+                sections[name] = ast.literal_eval(candidate)
+                break
+            except (ValueError, SyntaxError):
+                continue
+    return sections
+
+def build_summary_prompt(linkedin_data, custom_prompt=None, summary_options=None):
+    """
+    Build the Gemini prompt for a summary.
+    Returns:
+        Tuple containing:
+        - the prompt
+        - the locally computed facts to prepend to the summary
+    """
+    # Default prompt template
+    default_prompt = """
+    Please analyze this LinkedIn profile data and provide a comprehensive professional summary of the person. 
+    Include their current role, key achievements, career progression, educational background, and any notable patterns or expertise areas.
+    
+    Format the response in markdown with:
+    - Use # for main sections
+    - Use ## for subsections
+    - Use bullet points for lists
+    - Use **bold** for emphasis on key points
+    - Use proper markdown formatting throughout
+    
+    Focus on:
+    1. Current role and responsibilities
+    2. Career progression and achievements
+    3. Educational background
+    4. Areas of expertise
+    5. Key skills and competencies
+    6. Notable patterns in their professional journey
+    """
+
+    # Fields picked in summary_options are computed from the scraped data rather than
+    # asked of the model, so they are exact and the same on every run
+    facts = {}
+    if summary_options:
+        logger.info(f'Summary options received: {json.dumps(summary_options, indent=2)}')
+        facts = extract_facts(parse_linkedin_data(linkedin_data), summary_options)
+
+    if facts:
+        summary_instructions = "\n\nThese facts are shown above your summary already, so don't restate them as headings, and keep any figures you mention consistent with them:\n" + "\n".join(
+            f"- {label}: {value}" for label, value in facts.items()
+        )
+        logger.info(f'Summary facts added: {summary_instructions}')
+    else:
+        summary_instructions = ""
+
+    # Add custom requirements if provided
+    if custom_prompt:
+        additional_instructions = f"\n\nAdditionally, please make sure to take the following specific requirements into account in your analysis:\n{custom_prompt}"
+        logger.info(f'Additional custom instructions added: {additional_instructions}')
+    else:
+        additional_instructions = ""
+
+    # Combine default prompt, summary options, custom requirements, and LinkedIn data
+    final_prompt = f"""
+    {default_prompt}
+    {summary_instructions}
+    {additional_instructions}
+
+    Here's the LinkedIn data:
+    {linkedin_data}
+
+    Please provide a well-structured, professional response using proper markdown formatting throughout.
+    """
+    return final_prompt, facts
+
+def _summary_request(final_prompt, api_key):
+    """URL and payload of a generateContent call for a summary prompt"""
+    url = f"{GEMINI_API_BASE}/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+    payload = {
+        "contents": [{
+            "parts": [{"text": final_prompt}]
+        }]
+    }
+    return url, payload
+
+def _summary_from_response(final_prompt, content, result, facts):
+    """Record prompt/response sizes and extract the summary from a generateContent response"""
+    metrics.histogram('gemini_prompt_bytes', 'Size of prompts sent to Gemini', {'call': 'summary'}, SIZE_BUCKETS).observe(len(final_prompt))
+    metrics.histogram('gemini_response_bytes', 'Size of Gemini responses', {'call': 'summary'}, SIZE_BUCKETS).observe(len(content))
+    if "candidates" in result:
+        summary = result["candidates"][0]["content"]["parts"][0]["text"]
+        logger.info('Successfully generated summary')
+        return prepend_facts(summary, facts)
+    else:
+        logger.error('Unexpected API response format')
+        return "Error: Unable to generate summary from the API response"
+
 def generate_summary(linkedin_data, custom_prompt=None, summary_options=None):
     """Generate a summary using Gemini API"""
+    return run_sync(agenerate_summary(linkedin_data, custom_prompt, summary_options))
+
+async def agenerate_summary(linkedin_data, custom_prompt=None, summary_options=None):
+    """generate_summary() over the shared async HTTP client"""
     logger.info('Starting summary generation')
     try:
         # Get Gemini API key
@@ -76,124 +240,72 @@ def generate_summary(linkedin_data, custom_prompt=None, summary_options=None):
             logger.error('Gemini API key not set')
             return "Error: Gemini API key not configured"
 
-        # Default prompt template
-        default_prompt = """
-        Please analyze this LinkedIn profile data and provide a comprehensive professional summary of the person. 
-        Include their current role, key achievements, career progression, educational background, and any notable patterns or expertise areas.
-        
-        Format the response in markdown with:
-        - Use # for main sections
-        - Use ## for subsections
-        - Use bullet points for lists
-        - Use **bold** for emphasis on key points
-        - Use proper markdown formatting throughout
-        
-        Focus on:
-        1. Current role and responsibilities
-        2. Career progression and achievements
-        3. Educational background
-        4. Areas of expertise
-        5. Key skills and competencies
-        6. Notable patterns in their professional journey
-        """
-
-        # Add specific summary options if provided
-        summary_sections = []
-        if summary_options:
-            logger.info(f'Summary options received: {json.dumps(summary_options, indent=2)}')
-            if summary_options.get('years_of_experience'):
-                summary_sections.append("BEFORE RESPONDING WITH ANYTHING ELSE FROM THE SUMMARY, START YOUR RESPONSE WITH A ONE LINER BOLD DESCRIPTION OF THE YEARS OF EXPERIENCE OF THE USER IN THE FORMAT Years of Experience : .One liner short bold description. BEFORE RESPONDING WITH ANYTHING ELSE FROM THE SUMMARY, START YOUR RESPONSE WITH A ONE LINER BOLD DESCRIPTION OF THE YEARS OF EXPERIENCE OF THE USER IN THE FORMAT Years of Experience : .One liner short bold description. BEFORE RESPONDING WITH ANYTHING ELSE FROM THE SUMMARY, START YOUR RESPONSE WITH A ONE LINER BOLD DESCRIPTION OF THE YEARS OF EXPERIENCE OF THE USER IN THE FORMAT Years of Experience : .One liner short bold description.")
-            if summary_options.get('relevant_job_titles'):
-                summary_sections.append("BEFORE RESPONDING WITH ANYTHING ELSE FROM THE SUMMARY, START YOUR RESPONSE WITH A ONE LINER BOLD DESCRIPTION OF THE RELEVANT JOB TITLES OF THE USER IN THE FORMAT Relevant Job Titles : .One liner short bold description. BEFORE RESPONDING WITH ANYTHING ELSE FROM THE SUMMARY, START YOUR RESPONSE WITH A ONE LINER BOLD DESCRIPTION OF THE RELEVANT JOB TITLES OF THE USER IN THE FORMAT Relevant Job Titles : .One liner short bold description. BEFORE RESPONDING WITH ANYTHING ELSE FROM THE SUMMARY, START YOUR RESPONSE WITH A ONE LINER BOLD DESCRIPTION OF THE RELEVANT JOB TITLES OF THE USER IN THE FORMAT Relevant Job Titles : .One liner short bold description.")
-            if summary_options.get('degrees_earned'):
-                summary_sections.append("BEFORE RESPONDING WITH ANYTHING ELSE FROM THE SUMMARY, START YOUR RESPONSE WITH A ONE LINER BOLD DESCRIPTION OF THE DEGREES EARNED OF THE USER IN THE FORMAT Degrees Earned : .One liner short bold description. BEFORE RESPONDING WITH ANYTHING ELSE FROM THE SUMMARY, START YOUR RESPONSE WITH A ONE LINER BOLD DESCRIPTION OF THE DEGREES EARNED OF THE USER IN THE FORMAT Degrees Earned : .One liner short bold description. BEFORE RESPONDING WITH ANYTHING ELSE FROM THE SUMMARY, START YOUR RESPONSE WITH A ONE LINER BOLD DESCRIPTION OF THE DEGREES EARNED OF THE USER IN THE FORMAT Degrees Earned : .One liner short bold description.")
-        
-        if summary_sections:
-            summary_instructions = "\n\nBefore the main summary, " + " ".join(summary_sections)
-            logger.info(f'Summary instructions added: {summary_instructions}')
-        else:
-            summary_instructions = ""
-
-        # Add custom requirements if provided
-        if custom_prompt:
-            additional_instructions = f"\n\nAdditionally, please make sure to take the following specific requirements into account in your analysis:\n{custom_prompt}"
-            logger.info(f'Additional custom instructions added: {additional_instructions}')
-        else:
-            additional_instructions = ""
-
-        # Combine default prompt, summary options, custom requirements, and LinkedIn data
-        final_prompt = f"""
-        {default_prompt}
-        {summary_instructions}
-        {additional_instructions}
-
-        Here's the LinkedIn data:
-        {linkedin_data}
-
-        Please provide a well-structured, professional response using proper markdown formatting throughout.
-        """
-
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "contents": [{
-                "parts": [{"text": final_prompt}]
-            }]
-        }
-        
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+        # Parsing the profile for summary options is CPU work
+        final_prompt, facts = await asyncio.to_thread(build_summary_prompt, linkedin_data, custom_prompt, summary_options)
+        url, payload = _summary_request(final_prompt, api_key)
         
         logger.info('Sending request to Gemini API')
         if custom_prompt:
             logger.info('Including additional custom requirements in analysis')
             
-        response = requests.post(url, headers=headers, json=payload)
+        with span('gemini_summary'):
+            response = await get_async_client().post(url, json=payload)
         response.raise_for_status()
-        
-        result = response.json()
-        if "candidates" in result:
-            summary = result["candidates"][0]["content"]["parts"][0]["text"]
-            logger.info('Successfully generated summary')
-            return summary
-        else:
-            logger.error('Unexpected API response format')
-            return "Error: Unable to generate summary from the API response"
+        return _summary_from_response(final_prompt, response.content, response.json(), facts)
             
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f'Error calling Gemini API: {str(e)}')
         return f"Error calling Gemini API: {str(e)}"
     except Exception as e:
         logger.error(f'Unexpected error in summary generation: {str(e)}')
         return f"Error generating summary: {str(e)}"
 
-def main(profile_url=None, custom_prompt=None, summary_options=None):
-    """Main function to orchestrate the scraping and summary generation process"""
+def _fingerprint(profile_url, linkedin_data, custom_prompt, summary_options):
+    facts = extract_facts(parse_linkedin_data(linkedin_data), summary_options) if summary_options else None
+    return summary_fingerprint(load_sections(profile_url), custom_prompt, summary_options, facts)
+
+def main(profile_url=None, custom_prompt=None, summary_options=None, out=None):
+    """Main function to orchestrate the scraping and summary generation process.
+    Output goes to `out` (stdout by default) so concurrent requests don't share a stream."""
+    run_sync(amain(profile_url, custom_prompt, summary_options, out))
+
+async def amain(profile_url=None, custom_prompt=None, summary_options=None, out=None):
+    """main() for async callers: scraping, Gemini calls and section store I/O don't block the event loop"""
+    out = out or sys.stdout
     logger.info('Starting the summary generation process')
     
     # Remove the environment variable check
     if not profile_url:
         logger.error('No profile URL provided')
-        print("Error: No profile URL provided")
+        print("Error: No profile URL provided", file=out)
         return
     
     # Step 1: Scrape LinkedIn profile data
     logger.info('Starting LinkedIn data capture')
-    linkedin_data = capture_linkedin_data(profile_url)
+    with span('capture_linkedin_data'):
+        linkedin_data = await acapture_linkedin_data(profile_url)
     
     if not linkedin_data:
         logger.error('Failed to capture LinkedIn data')
-        print("Error: Failed to capture LinkedIn data")
+        print("Error: Failed to capture LinkedIn data", file=out)
         return
     
-    # Step 2: Generate summary with optional custom prompt
-    print("\nGenerating summary using Gemini API...")
-    summary = generate_summary(linkedin_data, custom_prompt, summary_options)
+    print(linkedin_data, file=out)
+    
+    # Step 2: Generate summary with optional custom prompt, unless no section changed
+    fingerprint = await asyncio.to_thread(_fingerprint, profile_url, linkedin_data, custom_prompt, summary_options)
+    summary = await asyncio.to_thread(get_stored_summary, profile_url, fingerprint)
+    if summary:
+        logger.info('Profile sections unchanged, reusing stored summary')
+    else:
+        print("\nGenerating summary using Gemini API...", file=out)
+        summary = await agenerate_summary(linkedin_data, custom_prompt, summary_options)
+        if not summary.startswith('Error'):
+            await asyncio.to_thread(save_summary, profile_url, fingerprint, summary)
     
     # Step 3: Output results
-    print("\n=== Generated Professional Summary ===")
-    print(summary)
+    print("\n=== Generated Professional Summary ===", file=out)
+    print(summary, file=out)
     
     logger.info('Summary generation process completed')
 
@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import pathlib
+
+import metrics
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+except ImportError:
+    Fernet = None
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_DIR = pathlib.Path(os.environ.get('LINKEDIN_SESSIONS_DIR', 'sessions'))
+SESSIONS_DIR.mkdir(exist_ok=True)
+# Extra server-side secret mixed into the key derivation, so the files alone can't be decrypted
+SESSION_STORE_SECRET = os.environ.get('SESSION_STORE_SECRET', '')
+
+logins_total = metrics.counter('linkedin_logins_total', 'Form logins performed')
+reuses_total = metrics.counter('linkedin_session_reuses_total', 'Scrapes that reused a stored session')
+probe_failures_total = metrics.counter('linkedin_session_probe_failures_total', 'Stored sessions that were no longer logged in')
+reuse_rate = metrics.gauge('linkedin_session_reuse_rate', 'Share of scrapes that skipped the login form')
+
+_derived_keys = {}
+
+def account_id(email):
+    """Stable, non-reversible ID of an account, used for file names and pacing buckets"""
+    return hashlib.sha256(email.strip().lower().encode('utf-8')).hexdigest()[:16]
+
+def _session_file(email):
+    return SESSIONS_DIR / f'{account_id(email)}.session'
+
+def _fernet(email, password):
+    """Fernet cipher keyed on the account's own password (derived once per process)"""
+    cache_key = (email, password)
+    if cache_key not in _derived_keys:
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=(account_id(email) + SESSION_STORE_SECRET).encode('utf-8'),
+            iterations=200000
+        )
+        _derived_keys[cache_key] = base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8')))
+    return Fernet(_derived_keys[cache_key])
+
+def load_storage_state(email, password):
+    """Return the stored Playwright storage_state for an account, or None"""
+    if Fernet is None:
+        return None
+    session_file = _session_file(email)
+    if not session_file.exists():
+        return None
+    try:
+        return json.loads(_fernet(email, password).decrypt(session_file.read_bytes()))
+    except InvalidToken:
+        # Password changed or the file was written with a different secret
+        logger.warning('Stored LinkedIn session could not be decrypted, discarding it')
+        session_file.unlink()
+        return None
+    except Exception as e:
+        logger.error(f'Error loading LinkedIn session: {str(e)}')
+        return None
+
+def save_storage_state(email, password, storage_state):
+    """Encrypt and store an account's Playwright storage_state"""
+    if Fernet is None:
+        logger.warning('cryptography is not installed, LinkedIn sessions are not persisted')
+        return
+    try:
+        session_file = _session_file(email)
+        tmp_file = session_file.with_suffix('.tmp')
+        tmp_file.write_bytes(_fernet(email, password).encrypt(json.dumps(storage_state).encode('utf-8')))
+        os.replace(tmp_file, session_file)
+        logger.info('Saved LinkedIn session')
+    except Exception as e:
+        logger.error(f'Error saving LinkedIn session: {str(e)}')
+
+def discard_storage_state(email):
+    """Forget an account's stored session"""
+    _session_file(email).unlink(missing_ok=True)
+
+def record_login(probe_failed=False):
+    """Count a form login"""
+    logins_total.inc()
+    if probe_failed:
+        probe_failures_total.inc()
+    _update_reuse_rate()
+
+def record_reuse():
+    """Count a scrape that reused a stored session"""
+    reuses_total.inc()
+    _update_reuse_rate()
+
+def _update_reuse_rate():
+    total = logins_total.value + reuses_total.value
+    reuse_rate.set(reuses_total.value / total if total else 0.0)
@@ -0,0 +1,108 @@
+import atexit
+import json
+import logging
+import os
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+from queue import Queue
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Empty to log to stdout only
+LOG_FILE = os.environ.get('LOG_FILE', 'app.log')
+# Size-based rotation is only safe with a single process writing the file; gunicorn workers
+# would each rotate it on their own, so by default the file is reopened when logrotate moves it
+LOG_ROTATE = os.environ.get('LOG_ROTATE', '').lower() in ('1', 'true', 'yes')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+# Request bodies longer than this are truncated in the logs
+LOG_BODY_MAX_BYTES = int(os.environ.get('LOG_BODY_MAX_BYTES', 2048))
+# Share of requests whose headers and body are dumped; every request still gets a one-line entry
+LOG_REQUEST_SAMPLE_RATE = float(os.environ.get('LOG_REQUEST_SAMPLE_RATE', 0.1))
+
+# Any header or JSON field whose name contains one of these is redacted
+SECRET_MARKERS = ('password', 'api_key', 'apikey', 'secret', 'token', 'authorization', 'cookie')
+REDACTED = '[REDACTED]'
+
+_listener = None
+
+def configure_logging(level=logging.INFO):
+    """
+    Route all logging through a queue so request threads never block on stdout or disk.
+    A background listener thread writes to stdout and to LOG_FILE, which is rotated by size
+    when LOG_ROTATE is set (single process only) and left to logrotate otherwise.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE and LOG_ROTATE:
+        handlers.append(RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT))
+    elif LOG_FILE:
+        handlers.append(WatchedFileHandler(LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = Queue(-1)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(level)
+    return _listener
+
+def _is_secret(name):
+    # Headers spell the markers with dashes (X-Api-Key, x-goog-api-key)
+    name = name.lower().replace('-', '_')
+    return any(marker in name for marker in SECRET_MARKERS)
+
+def redact(value):
+    """Recursively replace secret fields in parsed JSON"""
+    if isinstance(value, dict):
+        return {key: REDACTED if _is_secret(str(key)) else redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+def redact_headers(headers):
+    return {name: REDACTED if _is_secret(name) else value for name, value in headers.items()}
+
+def _truncate(text):
+    if len(text) <= LOG_BODY_MAX_BYTES:
+        return text
+    return f'{text[:LOG_BODY_MAX_BYTES]}... [truncated {len(text) - LOG_BODY_MAX_BYTES} chars]'
+
+def describe_body(request, json_body=None):
+    """Redacted, size-bounded description of a request body; `json_body` is its parsed JSON, if any"""
+    if not request.content_length:
+        return None
+    if json_body is not None:
+        return _truncate(json.dumps(redact(json_body)))
+    # Non-JSON bodies can't be redacted field by field, so only their size is logged
+    return f'<{request.content_length} bytes of {request.content_type}>'
+
+def _sampled(logger, request):
+    """Log the one-line entry of a request; True if its headers and body should be dumped too"""
+    logger.info('%s %s', request.method, request.path)
+    return random.random() < LOG_REQUEST_SAMPLE_RATE
+
+def _log_details(logger, request, body):
+    logger.info('Request Headers: %s', redact_headers(request.headers))
+    if body:
+        logger.info('Request Data: %s', body)
+
+def log_request(logger, request):
+    """One line per request, plus a sampled dump of redacted headers and body"""
+    if _sampled(logger, request):
+        json_body = request.get_json(silent=True) if request.is_json and request.content_length else None
+        _log_details(logger, request, describe_body(request, json_body))
+
+async def alog_request(logger, request):
+    """log_request() for Quart, whose request bodies are read asynchronously"""
+    if _sampled(logger, request):
+        json_body = await request.get_json(silent=True) if request.is_json and request.content_length else None
+        _log_details(logger, request, describe_body(request, json_body))
@@ -0,0 +1,155 @@
+import bisect
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds; a full scrape takes tens of seconds
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+# Size buckets in bytes for Gemini prompts / responses
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+class Counter:
+    """Monotonically increasing value, e.g. number of logins"""
+    type_name = 'counter'
+
+    def __init__(self, name: str, description: str, labels: dict = None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+class Gauge:
+    """Value that can go up and down, e.g. a reuse rate"""
+    type_name = 'gauge'
+
+    def __init__(self, name: str, description: str, labels: dict = None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, e.g. stage latencies"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: dict = None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    @property
+    def value(self):
+        return {'count': self.count, 'sum': self.sum}
+
+    def samples(self):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            samples.append((self.name + '_bucket', {**self.labels, 'le': le}, cumulative))
+        samples.append((self.name + '_sum', self.labels, self.sum))
+        samples.append((self.name + '_count', self.labels, self.count))
+        return samples
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def _get_or_create(cls, name, description, labels, **kwargs):
+    key = (name, tuple(sorted((labels or {}).items())))
+    with _registry_lock:
+        metric = _registry.get(key)
+        if metric is None:
+            metric = cls(name, description, labels, **kwargs)
+            _registry[key] = metric
+        return metric
+
+def counter(name: str, description: str = '', labels: dict = None) -> Counter:
+    """Get or create a counter"""
+    return _get_or_create(Counter, name, description, labels)
+
+def gauge(name: str, description: str = '', labels: dict = None) -> Gauge:
+    """Get or create a gauge"""
+    return _get_or_create(Gauge, name, description, labels)
+
+def histogram(name: str, description: str = '', labels: dict = None, buckets=LATENCY_BUCKETS) -> Histogram:
+    """Get or create a histogram"""
+    return _get_or_create(Histogram, name, description, labels, buckets=buckets)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def snapshot() -> dict:
+    """Current value of every metric in this process"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name + _format_labels(metric.labels): metric.value for metric in metrics}
+
+def render_prometheus() -> str:
+    """All metrics of this process in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    lines = []
+    last_name = None
+    for metric in metrics:
+        if metric.name != last_name:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            last_name = metric.name
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage into the stage_duration_seconds histogram"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start_time
+        histogram('stage_duration_seconds', 'Latency of each pipeline stage', {'stage': stage}).observe(duration)
+        logger.debug(f'Stage {stage} took {duration:.3f} seconds')
@@ -0,0 +1,140 @@
+import re
+from datetime import date
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+PRESENT = ('present', 'now', 'current')
+DATE_PATTERN = re.compile(r'^(?:([A-Za-z]{3})[a-z]*\.?\s+)?(\d{4})$')
+
+def _month_index(text, is_end, today=None):
+    """
+    Months since year 0 for a LinkedIn date such as 'Mar 2019', '2019' or 'Present'.
+    End dates are exclusive: 'Jun 2021' ends at the start of July 2021, like LinkedIn counts it.
+    """
+    text = text.strip()
+    if text.lower() in PRESENT:
+        today = today or date.today()
+        return today.year * 12 + today.month
+    match = DATE_PATTERN.match(text)
+    if not match:
+        return None
+    month_name, year = match.groups()
+    year = int(year)
+    if month_name:
+        month = MONTHS.get(month_name.lower())
+        if month is None:
+            return None
+        return year * 12 + month - 1 + (1 if is_end else 0)
+    # Year only: '2018 - 2020' counts as two years
+    return year * 12
+
+def parse_duration(duration, today=None):
+    """Parse 'Jan 2020 - Present · 4 yrs' into a (start, end) month interval, or None"""
+    if not duration or duration == 'N/A':
+        return None
+    date_range = duration.split('·')[0]
+    parts = re.split(r'\s+[-–—]\s+', date_range.strip())
+    start = _month_index(parts[0], is_end=False, today=today)
+    if start is None:
+        return None
+    # A single date ('2019' or 'Mar 2019') is a role that lasted that year or month
+    end = _month_index(parts[-1], is_end=True, today=today)
+    if end is not None and len(parts) == 1 and parts[0].strip().isdigit():
+        end += 12
+    if end is None or end <= start:
+        return None
+    return start, end
+
+def experience_months(experience, today=None):
+    """
+    Total and overlapping months of experience from the Duration strings.
+    Returns:
+        Tuple containing:
+        - months covered by at least one role (overlaps counted once)
+        - months during which two or more roles overlapped
+    """
+    intervals = sorted(
+        interval for interval in (parse_duration(exp.get('Duration'), today) for exp in experience or [])
+        if interval
+    )
+    covered = 0
+    summed = 0
+    current_start = current_end = None
+    for start, end in intervals:
+        summed += end - start
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                covered += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        covered += current_end - current_start
+    return covered, summed - covered
+
+def format_months(months):
+    years, months = divmod(months, 12)
+    parts = []
+    if years:
+        parts.append(f'{years} year{"s" if years != 1 else ""}')
+    if months or not years:
+        parts.append(f'{months} month{"s" if months != 1 else ""}')
+    return ' '.join(parts)
+
+def _distinct(values):
+    """Distinct non-empty values in their original order, compared case-insensitively"""
+    seen = set()
+    result = []
+    for value in values:
+        if not value or value == 'N/A':
+            continue
+        value = value.strip()
+        if value.lower() not in seen:
+            seen.add(value.lower())
+            result.append(value)
+    return result
+
+def job_titles(experience):
+    """Distinct job titles, most recent first"""
+    return _distinct(exp.get('Title') for exp in experience or [])
+
+def degrees(education):
+    """Distinct degrees with the school they were earned at"""
+    return _distinct(
+        f"{edu['Degree']} ({edu['School']})" if edu.get('School') not in (None, 'N/A') else edu['Degree']
+        for edu in education or []
+        if edu.get('Degree') not in (None, 'N/A')
+    )
+
+def extract_facts(sections, summary_options):
+    """
+    Compute the requested summary_options fields from the structured profile sections.
+    Returns an ordered dict of header label -> value.
+    """
+    facts = {}
+    if summary_options.get('years_of_experience'):
+        total, overlap = experience_months(sections.get('experience'))
+        if total:
+            value = format_months(total)
+            if overlap:
+                value += f' (including {format_months(overlap)} of overlapping roles)'
+            facts['Years of Experience'] = value
+        else:
+            facts['Years of Experience'] = 'Not listed'
+    if summary_options.get('relevant_job_titles'):
+        facts['Relevant Job Titles'] = ', '.join(job_titles(sections.get('experience'))) or 'Not listed'
+    if summary_options.get('degrees_earned'):
+        facts['Degrees Earned'] = ', '.join(degrees(sections.get('education'))) or 'Not listed'
+    return facts
+
+def prepend_facts(summary, facts):
+    """Put one bold header line per fact at the top of the summary (inside a ```markdown fence if present)"""
+    if not facts:
+        return summary
+    header = '\n\n'.join(f'**{label} :** {value}' for label, value in facts.items()) + '\n\n'
+    fence = '```markdown\n'
+    if summary.startswith(fence):
+        return fence + header + summary[len(fence):]
+    return header + summary
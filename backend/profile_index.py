@@ -0,0 +1,401 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from similarity_calculator import SimilarityCalculator
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = pathlib.Path(os.environ.get('PROFILE_INDEX_DIR', 'vector_index'))
+# Past this many profiles the exact matmul gives way to an HNSW graph (if hnswlib is installed)
+ANN_THRESHOLD = int(os.environ.get('PROFILE_INDEX_ANN_THRESHOLD', '20000'))
+# The HNSW graph is saved whole, so only every this many added profiles
+ANN_CHECKPOINT_EVERY = int(os.environ.get('PROFILE_INDEX_ANN_CHECKPOINT_EVERY', '1000'))
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+# Sections embedded separately so candidates can be scored per section
+RANK_SECTIONS = ('experience', 'education', 'posts')
+
+def get_profile_id(url: str) -> str:
+    """Stable identifier for a LinkedIn profile URL (unlike hash(), survives restarts)"""
+    normalized = url.strip().lower().split('?')[0].rstrip('/')
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+def section_text(value) -> str:
+    """Flatten a scraped section (dict / list of dicts / list of posts) into plain text for embedding"""
+    if isinstance(value, dict):
+        return ', '.join(f'{k}: {v}' for k, v in value.items() if v and v != 'N/A')
+    if isinstance(value, list):
+        return '\n'.join(section_text(item) for item in value if item)
+    return str(value or '').strip()
+
+class ProfileIndex:
+    """
+    Persistent vector index over analyzed profiles.
+
+    Every row is L2-normalized, so a dot product is a cosine similarity and an exact
+    search is a single matrix-vector product. Once the corpus passes ann_threshold an
+    HNSW graph takes over the search.
+
+    On disk the vectors are raw float32 rows, memory-mapped and written in place, and the
+    metadata is an append-only log whose lines commit their rows. Adding a profile writes
+    one row and one line, and other workers only replay the lines they haven't seen.
+    """
+
+    def __init__(self, index_dir: pathlib.Path = INDEX_DIR, ann_threshold: int = ANN_THRESHOLD):
+        self.index_dir = pathlib.Path(index_dir)
+        self.index_dir.mkdir(exist_ok=True)
+        self.ann_threshold = ann_threshold
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._sections = np.zeros((0, len(RANK_SECTIONS), EMBEDDING_DIM), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._meta: List[dict] = []
+        # Log line that last wrote each row, so an ANN checkpoint knows which rows it is missing
+        self._row_entries: List[int] = []
+        self._ann = None
+        self._log_offset = 0  # Bytes of the metadata log applied so far
+        self._log_entries = 0  # Lines of the metadata log applied so far
+        self._ann_entries = 0  # Lines covered by the saved ANN checkpoint
+        with self._lock, self._file_lock():
+            self._migrate_legacy()
+        self._refresh()
+        if self._size:
+            logger.info(f'Loaded profile index with {self._size} profiles')
+
+    @property
+    def _matrix_file(self):
+        return self.index_dir / 'embeddings.f32'
+
+    @property
+    def _sections_file(self):
+        return self.index_dir / 'section_embeddings.f32'
+
+    @property
+    def _log_file(self):
+        return self.index_dir / 'profiles.jsonl'
+
+    @property
+    def _ann_file(self):
+        return self.index_dir / 'ann.bin'
+
+    @property
+    def _ann_checkpoint_file(self):
+        return self.index_dir / 'ann.json'
+
+    def __len__(self):
+        return self._size
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize writers across worker processes"""
+        with open(self.index_dir / '.lock', 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _migrate_legacy(self):
+        """Convert an index saved as whole .npy / .json files to the append-only layout"""
+        legacy_matrix = self.index_dir / 'embeddings.npy'
+        legacy_sections = self.index_dir / 'section_embeddings.npy'
+        legacy_meta = self.index_dir / 'profiles.json'
+        if self._log_file.exists() or not legacy_meta.exists() or not legacy_matrix.exists():
+            return
+        try:
+            with open(legacy_meta, 'r') as f:
+                meta = json.load(f)
+            matrix = np.load(legacy_matrix).astype(np.float32, copy=False)
+            sections = np.zeros((len(matrix), len(RANK_SECTIONS), EMBEDDING_DIM), dtype=np.float32)
+            if legacy_sections.exists():
+                stored = np.load(legacy_sections)
+                if stored.shape == sections.shape:
+                    sections = stored.astype(np.float32, copy=False)
+            if len(meta) != len(matrix):
+                logger.error('Legacy profile index is inconsistent on disk, ignoring it')
+                return
+            matrix.tofile(self._matrix_file)
+            sections.tofile(self._sections_file)
+            with open(self._log_file, 'w') as f:
+                for row, entry in enumerate(meta):
+                    f.write(json.dumps({'row': row, **entry}) + '\n')
+            for legacy_file in (legacy_matrix, legacy_sections, legacy_meta, self._ann_file):
+                legacy_file.unlink(missing_ok=True)
+            logger.info(f'Migrated profile index with {len(meta)} profiles')
+        except Exception as e:
+            logger.error(f'Error migrating profile index: {str(e)}')
+
+    def _refresh(self):
+        """Apply metadata lines appended since the last refresh, by this or another worker process"""
+        with self._lock:
+            try:
+                if not self._log_file.exists() or self._log_file.stat().st_size == self._log_offset:
+                    return
+                with open(self._log_file, 'rb') as f:
+                    f.seek(self._log_offset)
+                    tail = f.read()
+            except OSError as e:
+                logger.error(f'Error reading profile index: {str(e)}')
+                return
+            # A line commits its row only once it is complete
+            tail = tail[:tail.rfind(b'\n') + 1]
+            updated = []
+            for line in tail.splitlines():
+                self._log_entries += 1
+                try:
+                    meta = json.loads(line)
+                    row = meta.pop('row')
+                except (ValueError, KeyError):
+                    logger.error('Skipping corrupt profile index entry')
+                    continue
+                if row > self._size:
+                    logger.error(f'Skipping profile index entry for unknown row {row}')
+                    continue
+                if row == self._size:
+                    self._size += 1
+                    self._ids.append(meta['profile_id'])
+                    self._meta.append(meta)
+                    self._row_entries.append(self._log_entries)
+                else:
+                    self._meta[row] = meta
+                    self._row_entries[row] = self._log_entries
+                self._rows[meta['profile_id']] = row
+                updated.append(row)
+            self._log_offset += len(tail)
+            self._map()
+            if updated:
+                self._update_ann(updated)
+
+    def _map(self):
+        """Memory-map the vector files once they hold rows not mapped yet"""
+        if len(self._matrix) >= self._size:
+            return
+        rows = self._matrix_file.stat().st_size // (EMBEDDING_DIM * 4)
+        self._matrix = np.memmap(self._matrix_file, dtype=np.float32, mode='r', shape=(rows, EMBEDDING_DIM))
+        self._sections = np.memmap(self._sections_file, dtype=np.float32, mode='r',
+                                   shape=(rows, len(RANK_SECTIONS), EMBEDDING_DIM))
+
+    def _write_row(self, row: int, vector: np.ndarray, section_vectors: np.ndarray, meta: dict):
+        """Write a row's vectors in place, then commit them with a metadata line"""
+        for path, values in ((self._matrix_file, vector), (self._sections_file, section_vectors)):
+            with open(path, 'r+b' if path.exists() else 'wb') as f:
+                f.seek(row * values.nbytes)
+                f.write(values.tobytes())
+        with open(self._log_file, 'ab') as f:
+            # Drop a line left incomplete by a writer that crashed
+            f.truncate(self._log_offset)
+            f.write((json.dumps({'row': row, **meta}) + '\n').encode('utf-8'))
+
+    def _build_ann(self):
+        """Switch to an HNSW graph once the corpus is large enough, resuming from the saved checkpoint"""
+        if hnswlib is None or self._size < self.ann_threshold:
+            return
+        ann = hnswlib.Index(space='ip', dim=EMBEDDING_DIM)
+        entries = self._load_ann_checkpoint(ann)
+        if entries is None:
+            logger.info(f'Building ANN index over {self._size} profiles')
+            ann = hnswlib.Index(space='ip', dim=EMBEDDING_DIM)
+            ann.init_index(max_elements=self._size * 2, ef_construction=200, M=16)
+            entries = 0
+        # Replay the rows written since the checkpoint
+        rows = np.flatnonzero(np.array(self._row_entries) > entries)
+        if len(rows):
+            ann.add_items(np.asarray(self._matrix[rows]), rows)
+        self._ann = ann
+        self._ann_entries = entries
+
+    def _load_ann_checkpoint(self, ann) -> Optional[int]:
+        """Load the saved HNSW graph into ann; returns the number of log lines it covers"""
+        try:
+            with open(self._ann_checkpoint_file, 'r') as f:
+                entries = json.load(f)['entries']
+            if entries > self._log_entries:
+                return None
+            ann.load_index(str(self._ann_file), max_elements=self._size * 2)
+            if ann.get_current_count() > self._size:
+                return None
+            return entries
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f'Rebuilding stale ANN index: {str(e)}')
+            return None
+
+    def _update_ann(self, rows: List[int]):
+        if self._ann is None:
+            self._build_ann()
+            return
+        if self._size > self._ann.get_max_elements():
+            self._ann.resize_index(self._size * 2)
+        rows = np.unique(rows)
+        # Labels are rows, so an updated profile replaces its point in the graph
+        self._ann.add_items(np.asarray(self._matrix[rows]), rows)
+
+    def _checkpoint_ann(self):
+        """Save the HNSW graph every ANN_CHECKPOINT_EVERY lines; loading replays the lines after it"""
+        if self._ann is None or self._log_entries - self._ann_entries < ANN_CHECKPOINT_EVERY:
+            return
+        tmp_ann = self.index_dir / 'ann.bin.tmp'
+        tmp_checkpoint = self.index_dir / 'ann.json.tmp'
+        self._ann.save_index(str(tmp_ann))
+        with open(tmp_checkpoint, 'w') as f:
+            json.dump({'entries': self._log_entries}, f)
+        # Graph first: a newer graph with an older line count only replays a few lines twice
+        os.replace(tmp_ann, self._ann_file)
+        os.replace(tmp_checkpoint, self._ann_checkpoint_file)
+        self._ann_entries = self._log_entries
+
+    def add(self, profile_id: str, url: str, documents: Dict[str, str], metadata: Optional[dict] = None):
+        """
+        Embed a profile's sections and upsert its row.
+        The profile vector is the normalized mean of the section embeddings, so no single
+        section gets truncated away by the model's input length limit.
+        """
+        texts = {name: text for name, text in documents.items() if text and text.strip()}
+        if not texts:
+            logger.warning(f'Nothing to index for profile {profile_id}')
+            return
+        embeddings = np.asarray(SimilarityCalculator().get_embeddings(list(texts.values())), dtype=np.float32)
+        vector = embeddings.mean(axis=0)
+        vector /= np.linalg.norm(vector) or 1.0
+        # Sections the profile doesn't have stay zero and score 0
+        section_vectors = np.zeros((len(RANK_SECTIONS), EMBEDDING_DIM), dtype=np.float32)
+        names = list(texts)
+        for slot, section in enumerate(RANK_SECTIONS):
+            if section in texts:
+                section_vectors[slot] = embeddings[names.index(section)]
+
+        meta = {
+            'profile_id': profile_id,
+            'url': url,
+            'indexed_at': time.time(),
+            **(metadata or {})
+        }
+        with self._lock, self._file_lock():
+            self._refresh()
+            self._write_row(self._rows.get(profile_id, self._size), vector, section_vectors, meta)
+            self._refresh()
+            self._checkpoint_ann()
+        logger.info(f'Indexed profile {profile_id} ({self._size} profiles in index)')
+
+    def get_vector(self, profile_id: str) -> Optional[np.ndarray]:
+        """Return the stored vector for a profile, if it has been indexed"""
+        with self._lock:
+            self._refresh()
+            row = self._rows.get(profile_id)
+            return None if row is None else self._matrix[row].copy()
+
+    def search(self, query: np.ndarray, top_k: int = 10, exclude_ids=()) -> List[dict]:
+        """Return the top_k most similar profiles to a normalized query vector"""
+        with self._lock:
+            self._refresh()
+            if self._size == 0:
+                return []
+            k = min(top_k + len(exclude_ids), self._size)
+            query = np.asarray(query, dtype=np.float32)
+            if self._ann is not None:
+                self._ann.set_ef(max(2 * k, 50))
+                labels, distances = self._ann.knn_query(query, k=k)
+                rows, scores = labels[0], 1.0 - distances[0]
+            else:
+                all_scores = self._matrix[:self._size] @ query
+                rows = np.argpartition(-all_scores, k - 1)[:k]
+                rows = rows[np.argsort(-all_scores[rows])]
+                scores = all_scores[rows]
+
+            results = []
+            for row, score in zip(rows, scores):
+                meta = self._meta[row]
+                if meta['profile_id'] in exclude_ids:
+                    continue
+                results.append({**meta, 'score': float(score)})
+                if len(results) == top_k:
+                    break
+            return results
+
+    def search_text(self, text: str, top_k: int = 10) -> List[dict]:
+        """Return the top_k profiles most similar to free text such as a job description"""
+        query = SimilarityCalculator().get_embeddings([text.strip()])[0]
+        return self.search(query, top_k)
+
+    def search_profile(self, profile_id: str, top_k: int = 10) -> Optional[List[dict]]:
+        """Return the top_k profiles most similar to an already indexed profile"""
+        vector = self.get_vector(profile_id)
+        if vector is None:
+            return None
+        return self.search(vector, top_k, exclude_ids=(profile_id,))
+
+    def rank(self, query: np.ndarray, profile_ids: List[str]) -> Tuple[List[dict], List[str]]:
+        """
+        Score the given profiles against a normalized query vector.
+        Profile and section vectors of all candidates are gathered into one matrix and
+        scored with a single matmul.
+        Returns:
+            Tuple containing:
+            - results sorted by overall score, with per-section sub-scores
+            - profile IDs that are not in the index
+        """
+        with self._lock:
+            self._refresh()
+            rows, missing = [], []
+            for profile_id in dict.fromkeys(profile_ids):
+                row = self._rows.get(profile_id)
+                if row is None:
+                    missing.append(profile_id)
+                else:
+                    rows.append(row)
+            if not rows:
+                return [], missing
+
+            rows = np.array(rows)
+            n_sections = len(RANK_SECTIONS)
+            candidates = np.concatenate([
+                self._matrix[rows],
+                self._sections[rows].reshape(-1, EMBEDDING_DIM)
+            ])
+            scores = candidates @ np.asarray(query, dtype=np.float32)
+            overall = scores[:len(rows)]
+            section_scores = scores[len(rows):].reshape(len(rows), n_sections)
+            has_section = self._sections[rows].any(axis=2)
+
+            results = []
+            for i in np.argsort(-overall):
+                results.append({
+                    **self._meta[rows[i]],
+                    'score': float(overall[i]),
+                    'section_scores': {
+                        section: float(section_scores[i, slot]) if has_section[i, slot] else None
+                        for slot, section in enumerate(RANK_SECTIONS)
+                    }
+                })
+            return results, missing
+
+    def rank_text(self, text: str, profile_ids: List[str]) -> Tuple[List[dict], List[str]]:
+        """Rank profiles against free text such as a job description, encoding it once"""
+        query = SimilarityCalculator().get_embeddings([text.strip()])[0]
+        return self.rank(query, profile_ids)
+
+# Create global profile index instance
+profile_index = ProfileIndex()
@@ -0,0 +1,161 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import request
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# SQLite file shared by all gunicorn workers on the instance
+RATE_LIMIT_DB = os.environ.get('RATE_LIMIT_DB', 'rate_limits.db')
+
+def _limit(endpoint_class, burst, per_minute):
+    """(bucket capacity, tokens refilled per second) for an endpoint class, overridable from the environment"""
+    prefix = f'RATE_LIMIT_{endpoint_class.upper()}'
+    burst = float(os.environ.get(f'{prefix}_BURST', burst))
+    per_minute = float(os.environ.get(f'{prefix}_PER_MINUTE', per_minute))
+    return burst, per_minute / 60.0
+
+ENDPOINT_LIMITS = {
+    'analyze': _limit('analyze', 3, 6),  # Each uncached analysis starts a Chromium
+    'chat': _limit('chat', 10, 30),  # Each message is a Gemini round trip
+    'export': _limit('export', 2, 2)  # Each export reads the whole store
+}
+MAX_BUCKETS = int(os.environ.get('RATE_LIMIT_MAX_BUCKETS', 10000))
+IDLE_SECONDS = 3600  # Buckets idle this long are full again and can be dropped
+EVICT_EVERY = 500  # Run eviction once every this many admissions per process
+
+class TokenBucketLimiter:
+    """
+    Token buckets per client and endpoint class, stored in SQLite so every worker
+    process sees the same state. Idle buckets are evicted least recently used first.
+    Limiters sharing the file keep their buckets in separate tables so one's eviction
+    never drops another's.
+    """
+
+    def __init__(self, db_path=RATE_LIMIT_DB, limits=ENDPOINT_LIMITS,
+                 max_buckets=MAX_BUCKETS, idle_seconds=IDLE_SECONDS, table='buckets'):
+        self.db_path = db_path
+        self.limits = limits
+        self.table = table
+        self.max_buckets = max_buckets
+        self.idle_seconds = idle_seconds
+        self._local = threading.local()
+        self._admissions = 0
+        with self._connection() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    client TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (client, endpoint)
+                )
+            """)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_updated_at ON {table} (updated_at)')
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, client, endpoint_class):
+        """
+        Take one token from the client's bucket for this endpoint class.
+        Returns:
+            Tuple containing:
+            - whether the request is admitted
+            - seconds until a token is available (0 when admitted)
+        """
+        capacity, refill_rate = self.limits[endpoint_class]
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                f'SELECT tokens, updated_at FROM {self.table} WHERE client = ? AND endpoint = ?',
+                (client, endpoint_class)
+            ).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * refill_rate)
+            admitted = tokens >= 1
+            if admitted:
+                tokens -= 1
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (client, endpoint, tokens, updated_at) VALUES (?, ?, ?, ?)',
+                (client, endpoint_class, tokens, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._admissions += 1
+        if self._admissions % EVICT_EVERY == 0:
+            self.evict(now)
+        return admitted, 0.0 if admitted else (1 - tokens) / refill_rate
+
+    def evict(self, now=None):
+        """Drop idle buckets, then the least recently used ones beyond max_buckets"""
+        now = now or time.time()
+        conn = self._connection()
+        conn.execute(f'DELETE FROM {self.table} WHERE updated_at < ?', (now - self.idle_seconds,))
+        conn.execute(f"""
+            DELETE FROM {self.table} WHERE rowid IN (
+                SELECT rowid FROM {self.table} ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_buckets,))
+
+_limiter = None
+
+def get_limiter():
+    """Process-wide limiter, created on first use"""
+    global _limiter
+    if _limiter is None:
+        _limiter = TokenBucketLimiter()
+    return _limiter
+
+def check_rate_limit(client, endpoint_class):
+    """Seconds the client must wait before a request of this class is admitted, or None if admitted now"""
+    try:
+        admitted, retry_after = get_limiter().acquire(client, endpoint_class)
+    except Exception as e:
+        # Fail open: a broken limiter shouldn't take the API down
+        logger.error(f'Rate limiter error: {str(e)}')
+        return None
+
+    if admitted:
+        return None
+    logger.warning(f'Rate limit exceeded for IP {client} on {endpoint_class}')
+    metrics.counter('rate_limited_requests_total', 'Requests rejected by the rate limiter', {'endpoint': endpoint_class}).inc()
+    return math.ceil(retry_after)
+
+def rate_limited(retry_after):
+    """429 response as (body, status, headers), which Flask and Quart views can both return"""
+    return (
+        {'error': f'Please wait {retry_after} seconds before making another request'},
+        429,
+        {'Retry-After': str(retry_after)}
+    )
+
+def rate_limit(endpoint_class):
+    """Rate limiting decorator: admits a request only if the client's bucket has a token"""
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            retry_after = check_rate_limit(request.remote_addr, endpoint_class)
+            if retry_after is not None:
+                return rate_limited(retry_after)
+            return f(*args, **kwargs)
+        return wrapped
+    return decorator
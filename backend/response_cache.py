@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Memory budget for serialized responses held by each worker
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# How often an entry is checked against its file, which another worker may have rewritten
+RESPONSE_CACHE_REVALIDATE_SECONDS = float(os.environ.get('RESPONSE_CACHE_REVALIDATE_SECONDS', 2))
+
+hits_total = metrics.counter('response_cache_requests_total', 'In-memory response cache lookups', {'result': 'hit'})
+misses_total = metrics.counter('response_cache_requests_total', 'In-memory response cache lookups', {'result': 'miss'})
+bytes_gauge = metrics.gauge('response_cache_bytes', 'Bytes of serialized responses held in memory')
+
+class CachedResponse:
+    """Serialized JSON response plus what's needed to tell if it still matches its file"""
+    __slots__ = ('body', 'etag', 'mtime', 'generation', 'checked_at')
+
+    def __init__(self, body, mtime, generation):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.mtime = mtime
+        self.generation = generation
+        self.checked_at = time.time()
+
+class ResponseCache:
+    """
+    Memory-bounded LRU of pre-serialized analysis responses in front of the on-disk cache.
+    An entry is valid while the cache generation it was stored under is current (clearing
+    bumps it) and its file still has the mtime it was read or written with.
+    """
+
+    def __init__(self, cache_dir, ttl, max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 revalidate_seconds=RESPONSE_CACHE_REVALIDATE_SECONDS):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _mtime(self, analysis_id):
+        try:
+            return (self.cache_dir / f'{analysis_id}.json').stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def get(self, analysis_id):
+        """Fresh serialized response for an analysis, or None to fall back to the disk tier"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(analysis_id)
+            if entry is not None and (entry.generation != self.generation or now - entry.mtime >= self.ttl):
+                # Cleared, or old enough to be refreshed; the disk tier decides what to serve
+                self._remove(analysis_id)
+                entry = None
+        if entry is not None and now - entry.checked_at >= self.revalidate_seconds:
+            if self._mtime(analysis_id) != entry.mtime:
+                with self._lock:
+                    if self._entries.get(analysis_id) is entry:
+                        self._remove(analysis_id)
+                entry = None
+            else:
+                entry.checked_at = now
+        if entry is None:
+            misses_total.inc()
+            return None
+        with self._lock:
+            if analysis_id in self._entries:
+                self._entries.move_to_end(analysis_id)
+        hits_total.inc()
+        return entry
+
+    def put(self, analysis_id, body, mtime, generation):
+        """
+        Remember the serialized response read from or written to a cache file with this mtime.
+        `generation` is the one read before the file was, so a clear() that happened while
+        reading or writing it leaves the entry invalid.
+        """
+        entry = CachedResponse(body, mtime, generation)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if generation != self.generation:
+                return entry
+            self._remove(analysis_id)
+            self._entries[analysis_id] = entry
+            self._bytes += len(body)
+            # Least recently used responses make room
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+            bytes_gauge.set(self._bytes)
+        return entry
+
+    def _remove(self, analysis_id):
+        entry = self._entries.pop(analysis_id, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+            bytes_gauge.set(self._bytes)
+
+    def discard(self, analysis_id):
+        with self._lock:
+            self._remove(analysis_id)
+
+    def clear(self):
+        """Invalidate every entry, including ones another thread is about to store"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+            bytes_gauge.set(0)
@@ -1,85 +1,136 @@
-from playwright.sync_api import sync_playwright
-import time
+import asyncio
+import threading
 import logging
 import os
+import hashlib
 
-# Use credentials from credentials module
-from credentials import get_linkedin_credentials
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from account_pool import account_pool, AccountChallenged, AccountLoginRejected, AccountUnavailable
+from linkedin_sessions import load_storage_state, save_storage_state, record_login, record_reuse
+from browser_manager import browser_manager, BrowserUnavailable
+from metrics import span
 
 POSTS_CAP = 15  # Maximum number of posts to scrape
+LINKEDIN_BASE_URL = os.environ.get("LINKEDIN_BASE_URL", "https://www.linkedin.com")
 
 logger = logging.getLogger(__name__)
 
-def scrape_all_posts(page, profile_url):
-    """Scroll and extract all LinkedIn posts from a profile's activity."""
-    logger.info('Starting to scrape posts')
+# URL fragments of LinkedIn's security checkpoints and login walls
+CHALLENGE_MARKERS = ('/checkpoint/', '/challenge', '/authwall', '/login', '/uas/')
+# Paths of the login form itself, which a submitted login navigates away from
+LOGIN_FORM_PATHS = ('/login', '/uas/login')
+# Errors LinkedIn shows next to the form fields for a wrong email or password
+LOGIN_ERROR_SELECTORS = ('#error-for-password', '#error-for-username')
+# How long a submitted login may take to leave the login form
+LOGIN_TIMEOUT_MS = int(os.environ.get('LINKEDIN_LOGIN_TIMEOUT_MS', 20000))
+
+POST_TEXT_SELECTOR = "div.update-components-text.relative.update-components-update-v2__commentary span.break-words"
+
+# Returns the text of every post rendered after the first `offset` ones, in a single round trip
+NEW_POSTS_SCRIPT = """([selector, offset]) =>
+    Array.from(document.querySelectorAll(selector)).slice(offset).map(el => el.innerText)"""
+
+def post_hash(text):
+    """Content hash used to dedupe posts across scrolls and scrapes"""
+    return hashlib.sha1(text.strip().encode('utf-8')).hexdigest()
+
+async def collect_posts(page, cap=POSTS_CAP, seen_hashes=None, max_scrolls=10):
+    """
+    Collect post texts while scrolling, reading only newly rendered posts after each scroll.
+    Stops as soon as `cap` posts are collected, or at the first post in `seen_hashes`
+    (posts are newest first, so everything after it was seen by the previous scrape).
+    """
     posts = []
+    hashes = set()
+    offset = 0
+    last_height = 0
+    for scroll_attempt in range(max_scrolls + 1):
+        texts = await page.evaluate(NEW_POSTS_SCRIPT, [POST_TEXT_SELECTOR, offset])
+        offset += len(texts)
+        for text in texts:
+            text_hash = post_hash(text)
+            if seen_hashes and text_hash in seen_hashes:
+                logger.info(f'Reached previously scraped post after {len(posts)} new posts')
+                return posts
+            if text_hash in hashes:
+                continue
+            hashes.add(text_hash)
+            posts.append(text)
+            if len(posts) >= cap:
+                return posts
+
+        if scroll_attempt == max_scrolls:
+            break
+        await page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
+        await asyncio.sleep(2)
+
+        new_height = await page.evaluate("document.body.scrollHeight")
+        if new_height == last_height:
+            break
+        last_height = new_height
+        logger.debug(f'Scroll attempt {scroll_attempt + 1}/{max_scrolls}')
+    return posts
+
+async def scrape_all_posts(page, profile_url, previous_posts=None):
+    """Scroll and extract up to POSTS_CAP LinkedIn posts from a profile's activity.
+    With previous_posts, only posts newer than the last scrape are read.
+    Returns None if the activity page could not be scraped."""
+    logger.info('Starting to scrape posts')
     try:
-        page.goto(profile_url + "recent-activity/all/", timeout=30000)
+        await page.goto(profile_url + "recent-activity/all/", timeout=30000)
         logger.info('Navigated to activity page')
         
-        page.wait_for_selector("div.update-components-text.relative.update-components-update-v2__commentary", timeout=30000)
+        try:
+            await page.wait_for_selector("div.update-components-text.relative.update-components-update-v2__commentary", timeout=30000)
+        except PlaywrightTimeoutError:
+            # The page loaded but shows no posts; keep the ones already collected
+            logger.info('No posts found on activity page')
+            return list(previous_posts or [])
         logger.info('Found posts container')
 
-        last_height = 0
-        scroll_attempts = 0
-
-        while scroll_attempts < 10 and len(posts) < POSTS_CAP:
-            page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
-            time.sleep(2)
-
-            new_height = page.evaluate("document.body.scrollHeight")
-            if new_height == last_height:
-                break
-            last_height = new_height
-            scroll_attempts += 1
-            logger.debug(f'Scroll attempt {scroll_attempts}/10')
-
-        post_elements = page.locator("div.update-components-text.relative.update-components-update-v2__commentary span.break-words").all()
-        logger.info(f'Found {len(post_elements)} posts')
-        
-        for post in post_elements:
-            if len(posts) >= POSTS_CAP:
-                break
-            posts.append(post.inner_text())
+        seen_hashes = {post_hash(post) for post in previous_posts} if previous_posts else None
+        posts = await collect_posts(page, POSTS_CAP, seen_hashes)
+        if previous_posts:
+            posts = (posts + list(previous_posts))[:POSTS_CAP]
         
         logger.info(f'Scraped {len(posts)} posts (capped at {POSTS_CAP})')
         return posts
     except Exception as e:
         logger.error(f'Error scraping posts: {str(e)}')
-        return []
+        return None
 
-def scrape_experience(page, profile_url):
-    """Extracts experience details from a LinkedIn profile."""
+async def scrape_experience(page, profile_url):
+    """Extracts experience details from a LinkedIn profile, or None if the section could not be scraped."""
     logger.info('Starting to scrape experience')
     try:
-        page.goto(profile_url + "details/experience/", timeout=30000)
+        await page.goto(profile_url + "details/experience/", timeout=30000)
         logger.info('Navigated to experience page')
         logger.info(profile_url + "details/experience/")
         
-        page.wait_for_selector("div.scaffold-finite-scroll__content", timeout=30000)
+        await page.wait_for_selector("div.scaffold-finite-scroll__content", timeout=30000)
         logger.info('Found experience container')
 
         last_height = 0
         for attempt in range(5):
-            page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
-            time.sleep(2)
-            new_height = page.evaluate("document.body.scrollHeight")
+            await page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
+            await asyncio.sleep(2)
+            new_height = await page.evaluate("document.body.scrollHeight")
             if new_height == last_height:
                 break
             last_height = new_height
             logger.debug(f'Scroll attempt {attempt + 1}/5')
 
-        experience_blocks = page.locator("li.pvs-list__paged-list-item").all()
+        experience_blocks = await page.locator("li.pvs-list__paged-list-item").all()
         logger.info(f'Found {len(experience_blocks)} experience entries')
         
         experience_list = []
         for exp in experience_blocks:
             try:
-                title = exp.locator("div.display-flex.align-items-center.mr1.hoverable-link-text.t-bold span[aria-hidden='true']").first.inner_text() if exp.locator("div.display-flex.align-items-center.mr1.hoverable-link-text.t-bold span[aria-hidden='true']").count() > 0 else "N/A"
-                company = exp.locator("span.t-14.t-normal span[aria-hidden='true']").first.inner_text() if exp.locator("span.t-14.t-normal span[aria-hidden='true']").count() > 0 else "N/A"
-                duration = exp.locator("span.pvs-entity__caption-wrapper[aria-hidden='true']").first.inner_text() if exp.locator("span.pvs-entity__caption-wrapper[aria-hidden='true']").count() > 0 else "N/A"
-                location = exp.locator("span.t-14.t-normal.t-black--light span[aria-hidden='true']").nth(1).inner_text() if exp.locator("span.t-14.t-normal.t-black--light span[aria-hidden='true']").count() > 1 else "N/A"
+                title = (await exp.locator("div.display-flex.align-items-center.mr1.hoverable-link-text.t-bold span[aria-hidden='true']").first.inner_text()) if (await exp.locator("div.display-flex.align-items-center.mr1.hoverable-link-text.t-bold span[aria-hidden='true']").count()) > 0 else "N/A"
+                company = (await exp.locator("span.t-14.t-normal span[aria-hidden='true']").first.inner_text()) if (await exp.locator("span.t-14.t-normal span[aria-hidden='true']").count()) > 0 else "N/A"
+                duration = (await exp.locator("span.pvs-entity__caption-wrapper[aria-hidden='true']").first.inner_text()) if (await exp.locator("span.pvs-entity__caption-wrapper[aria-hidden='true']").count()) > 0 else "N/A"
+                location = (await exp.locator("span.t-14.t-normal.t-black--light span[aria-hidden='true']").nth(1).inner_text()) if (await exp.locator("span.t-14.t-normal.t-black--light span[aria-hidden='true']").count()) > 1 else "N/A"
                 
                 experience_list.append({
                     "Title": title,
@@ -94,38 +145,38 @@ def scrape_experience(page, profile_url):
         return experience_list
     except Exception as e:
         logger.error(f'Error scraping experience section: {str(e)}')
-        return []
+        return None
 
-def scrape_education(page, profile_url):
-    """Extracts education details from a LinkedIn profile."""
+async def scrape_education(page, profile_url):
+    """Extracts education details from a LinkedIn profile, or None if the section could not be scraped."""
     logger.info('Starting to scrape education')
     try:
-        page.goto(profile_url + "details/education/", timeout=30000)
+        await page.goto(profile_url + "details/education/", timeout=30000)
         logger.info('Navigated to education page')
         logger.info(profile_url + "details/education/")
         
-        page.wait_for_selector("div.scaffold-finite-scroll__content", timeout=30000)
+        await page.wait_for_selector("div.scaffold-finite-scroll__content", timeout=30000)
         logger.info('Found education container')
 
         last_height = 0
         for attempt in range(5):
-            page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
-            time.sleep(2)
-            new_height = page.evaluate("document.body.scrollHeight")
+            await page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
+            await asyncio.sleep(2)
+            new_height = await page.evaluate("document.body.scrollHeight")
             if new_height == last_height:
                 break
             last_height = new_height
             logger.debug(f'Scroll attempt {attempt + 1}/5')
 
-        education_blocks = page.locator("li.pvs-list__paged-list-item").all()
+        education_blocks = await page.locator("li.pvs-list__paged-list-item").all()
         logger.info(f'Found {len(education_blocks)} education entries')
         
         education_list = []
         for edu in education_blocks:
             try:
-                school = edu.locator("div.display-flex.align-items-center.mr1.hoverable-link-text.t-bold span[aria-hidden='true']").first.inner_text() if edu.locator("div.display-flex.align-items-center.mr1.hoverable-link-text.t-bold span[aria-hidden='true']").count() > 0 else "N/A"
-                degree = edu.locator("span.t-14.t-normal span[aria-hidden='true']").first.inner_text() if edu.locator("span.t-14.t-normal span[aria-hidden='true']").count() > 0 else "N/A"
-                duration = edu.locator("span.pvs-entity__caption-wrapper[aria-hidden='true']").first.inner_text() if edu.locator("span.pvs-entity__caption-wrapper[aria-hidden='true']").count() > 0 else "N/A"
+                school = (await edu.locator("div.display-flex.align-items-center.mr1.hoverable-link-text.t-bold span[aria-hidden='true']").first.inner_text()) if (await edu.locator("div.display-flex.align-items-center.mr1.hoverable-link-text.t-bold span[aria-hidden='true']").count()) > 0 else "N/A"
+                degree = (await edu.locator("span.t-14.t-normal span[aria-hidden='true']").first.inner_text()) if (await edu.locator("span.t-14.t-normal span[aria-hidden='true']").count()) > 0 else "N/A"
+                duration = (await edu.locator("span.pvs-entity__caption-wrapper[aria-hidden='true']").first.inner_text()) if (await edu.locator("span.pvs-entity__caption-wrapper[aria-hidden='true']").count()) > 0 else "N/A"
                 
                 education_list.append({
                     "School": school,
@@ -139,21 +190,21 @@ def scrape_education(page, profile_url):
         return education_list
     except Exception as e:
         logger.error(f'Error scraping education section: {str(e)}')
-        return []
+        return None
 
-def scrape_profile_info(page, profile_url):
-    """Extracts comprehensive profile information."""
+async def scrape_profile_info(page, profile_url):
+    """Extracts comprehensive profile information, or None if the profile page could not be scraped."""
     logger.info('Starting to scrape profile info')
     try:
-        page.goto(profile_url, timeout=30000)
+        await page.goto(profile_url, timeout=30000)
         logger.info('Navigated to profile page')
         
-        page.wait_for_selector("div.mt2.relative", timeout=30000)
+        await page.wait_for_selector("div.mt2.relative", timeout=30000)
         logger.info('Found profile container')
         
-        name = page.locator("h1.TfZOidgbseHvfVjmVghPLqMaKHCaBSBgoRKASA").inner_text() if page.locator("h1.TfZOidgbseHvfVjmVghPLqMaKHCaBSBgoRKASA").count() > 0 else profile_url
-        designation = page.locator("div.text-body-medium").inner_text() if page.locator("div.text-body-medium").count() > 0 else "N/A"
-        location = page.locator("span.text-body-small.inline.t-black--light").first.inner_text() if page.locator("span.text-body-small.inline.t-black--light").count() > 0 else "N/A"
+        name = (await page.locator("h1.TfZOidgbseHvfVjmVghPLqMaKHCaBSBgoRKASA").inner_text()) if (await page.locator("h1.TfZOidgbseHvfVjmVghPLqMaKHCaBSBgoRKASA").count()) > 0 else profile_url
+        designation = (await page.locator("div.text-body-medium").inner_text()) if (await page.locator("div.text-body-medium").count()) > 0 else "N/A"
+        location = (await page.locator("span.text-body-small.inline.t-black--light").first.inner_text()) if (await page.locator("span.text-body-small.inline.t-black--light").count()) > 0 else "N/A"
         
         profile_info = {
             "Name": name,
@@ -165,90 +216,160 @@ def scrape_profile_info(page, profile_url):
         return profile_info
     except Exception as e:
         logger.error(f'Error scraping profile info: {str(e)}')
-        return {
-            "Name": "N/A",
-            "Designation": "N/A",
-            "Location": "N/A",
-            "About Title": "N/A",
-            "About": "N/A"
-        } 
-
-def main(profile_url=None):
-    """Main function to orchestrate the LinkedIn scraping process."""
+        return None
+
+async def is_logged_in(context):
+    """Cheap session probe: the feed answers 200 when logged in and redirects to the login page otherwise"""
+    try:
+        response = await context.request.get(LINKEDIN_BASE_URL + "/feed/", max_redirects=0, timeout=10000)
+        return response.status == 200
+    except Exception as e:
+        logger.warning(f'LinkedIn session probe failed: {str(e)}')
+        return False
+
+async def login(page, linkedin_email, linkedin_password):
+    """Log in to LinkedIn through the login form."""
+    # Navigate to LinkedIn login
+    logger.info('Navigating to LinkedIn login page')
+    await page.goto(LINKEDIN_BASE_URL + "/login")
+
+    # Fill login form and submit
+    logger.info('Attempting to log in')
+    await page.fill("input[name='session_key']", linkedin_email)
+    await page.fill("input[name='session_password']", linkedin_password)
+    await page.click("button[type='submit']")
+
+    # Wait until LinkedIn navigates away from the form, however slowly, before classifying
+    try:
+        await page.wait_for_url(lambda url: not _linkedin_path(url).startswith(LOGIN_FORM_PATHS), timeout=LOGIN_TIMEOUT_MS)
+        await page.wait_for_load_state('domcontentloaded', timeout=LOGIN_TIMEOUT_MS)
+    except PlaywrightTimeoutError:
+        pass
+
+    # A wrong password is shown on the form (at /login or /checkpoint/lg/login-submit)
+    error = await login_error(page)
+    if error:
+        raise AccountLoginRejected(f'LinkedIn rejected the login: {error}')
+    if _linkedin_path(page.url).startswith(LOGIN_FORM_PATHS):
+        raise TimeoutError(f'Login did not leave the login form within {LOGIN_TIMEOUT_MS} ms')
+    if is_challenged(page):
+        raise AccountChallenged(f'Login did not complete, landed on {page.url}')
+    logger.info('Login successful')
+
+async def login_error(page):
+    """Text of the error LinkedIn shows on the login form for a wrong email or password, if any"""
+    for selector in LOGIN_ERROR_SELECTORS:
+        error = page.locator(selector).first
+        if await error.count() and await error.is_visible():
+            return (await error.inner_text()).strip() or 'wrong email or password'
+    return None
+
+def _linkedin_path(url):
+    return url.removeprefix(LINKEDIN_BASE_URL)
+
+def is_challenged(page):
+    """Whether LinkedIn sent the page to a checkpoint or back to the login form"""
+    path = _linkedin_path(page.url)
+    return any(path.startswith(marker) for marker in CHALLENGE_MARKERS)
+
+SECTION_SCRAPERS = {
+    'profile': scrape_profile_info,
+    'experience': scrape_experience,
+    'education': scrape_education,
+    'posts': scrape_all_posts
+}
+
+async def scrape(profile_url=None, sections=None, previous_posts=None):
+    """Scrape a LinkedIn profile on the current event loop.
+    Only the given sections are scraped; all of them by default. previous_posts
+    from the last scrape lets the posts scraper stop at the first post already seen."""
     if not profile_url:
         logger.error('No profile URL provided')
         return None
     
-    # Get LinkedIn credentials
-    linkedin_email, linkedin_password = get_linkedin_credentials()
-    
-    # Detailed logging for credentials
-    logger.info(f'Attempting to scrape profile. Email provided: {bool(linkedin_email)}')
-    logger.info(f'Password provided: {bool(linkedin_password)}')
-    
-    # Check if credentials are set
-    if not linkedin_email or not linkedin_password:
-        logger.error('LinkedIn credentials not set')
-        logger.error(f'Actual email value: {linkedin_email}')
-        logger.error(f'Actual password value: {"*" if linkedin_password else "None"}')
-        return None
-        
     logger.info('Starting LinkedIn scraping process')
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-
-            # Navigate to LinkedIn login
-            logger.info('Navigating to LinkedIn login page')
-            page.goto("https://www.linkedin.com/login")
-
-            # Fill login form and submit
-            logger.info('Attempting to log in')
-            page.fill("input[name='session_key']", linkedin_email)
-            page.fill("input[name='session_password']", linkedin_password)
-            page.click("button[type='submit']")
-
-            # Wait for page load
-            page.wait_for_timeout(1500)
-            logger.info('Login successful')
-
-            # Navigate to profile page and scrape profile information
-            logger.info('Starting profile information scraping')
-            profile_info = scrape_profile_info(page, profile_url)
-            print("\n=== Profile Information ===")
-            print(profile_info)
-
-            # Scrape experience
-            logger.info('Starting experience scraping')
-            experience = scrape_experience(page, profile_url)
-            print("\n=== Experience ===")
-            print(experience)
-
-            # Scrape education
-            logger.info('Starting education scraping')
-            education = scrape_education(page, profile_url)
-            print("\n=== Education ===")
-            print(education)
-
-            # Scrape posts
-            logger.info('Starting posts scraping')
-            posts = scrape_all_posts(page, profile_url)
-            print("\n=== Recent Posts ===")
-            print(posts)
-
-            browser.close()
-            
-            return {
-                'profile': profile_info,
-                'experience': experience,
-                'education': education,
-                'posts': posts
-            }
+        # Browsers are shared between scrapes and recycled by the browser manager; taken
+        # first, so a scrape turned away for memory doesn't count against an account
+        async with browser_manager.browser() as browser:
+            # The least-loaded healthy account with pacing budget left
+            async with account_pool.account() as account:
+                logger.info(f'Scraping with LinkedIn account {account.masked_email}')
+                # Reuse the account's stored session when it is still logged in
+                storage_state = load_storage_state(account.email, account.password)
+                context = await browser.new_context(storage_state=storage_state) if storage_state else await browser.new_context()
+                try:
+                    page = await context.new_page()
+
+                    with span('session_probe'):
+                        logged_in = bool(storage_state) and await is_logged_in(context)
+                    if logged_in:
+                        logger.info('Reusing stored LinkedIn session')
+                        record_reuse()
+                    else:
+                        with span('login'):
+                            await login(page, account.email, account.password)
+                        save_storage_state(account.email, account.password, await context.storage_state())
+                        record_login(probe_failed=bool(storage_state))
+
+                    # Scrape only the requested sections
+                    result = {}
+                    for section in sections or SECTION_SCRAPERS:
+                        logger.info(f'Starting {section} scraping')
+                        with span(f'scrape_{section}'):
+                            if section == 'posts':
+                                result[section] = await scrape_all_posts(page, profile_url, previous_posts)
+                            else:
+                                result[section] = await SECTION_SCRAPERS[section](page, profile_url)
+                        # Section scrapers return None instead of raising, so check where LinkedIn sent us
+                        if is_challenged(page):
+                            raise AccountChallenged(f'Checkpoint while scraping {section}: {page.url}')
+
+                    if logged_in:
+                        # LinkedIn rotates session cookies; store the fresh ones for the next scrape
+                        save_storage_state(account.email, account.password, await context.storage_state())
+                finally:
+                    await context.close()
+
+            return result
+    except (AccountUnavailable, BrowserUnavailable) as e:
+        logger.error(f'Cannot scrape: {str(e)}')
+        return None
     except Exception as e:
         logger.error(f'Error during LinkedIn scraping: {str(e)}')
         return None
 
+_scraper_loop = None
+_scraper_loop_lock = threading.Lock()
+
+def get_scraper_loop():
+    """
+    Event loop thread that runs every scrape in the process. Playwright objects belong to
+    the loop that created them, so sync callers and async request handlers share this one
+    and scrapes run concurrently on it instead of each blocking a thread.
+    """
+    global _scraper_loop
+    with _scraper_loop_lock:
+        if _scraper_loop is None:
+            _scraper_loop = asyncio.new_event_loop()
+            threading.Thread(target=_scraper_loop.run_forever, name='scraper-loop', daemon=True).start()
+    return _scraper_loop
+
+def run_sync(coro):
+    """Run a coroutine on the scraper loop and wait for its result; for sync callers only,
+    never from the scraper loop itself"""
+    return asyncio.run_coroutine_threadsafe(coro, get_scraper_loop()).result()
+
+def main(profile_url=None, sections=None, previous_posts=None):
+    """Main function to orchestrate the LinkedIn scraping process; blocks until the scrape is done."""
+    return run_sync(scrape(profile_url, sections, previous_posts))
+
+async def main_async(profile_url=None, sections=None, previous_posts=None):
+    """Scrape from any event loop without blocking it."""
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+        scrape(profile_url, sections, previous_posts), get_scraper_loop()
+    ))
+
 if __name__ == "__main__":
     # Configure logging
     logging.basicConfig(
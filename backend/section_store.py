@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import time
+
+from profile_index import get_profile_id
+
+logger = logging.getLogger(__name__)
+
+SECTIONS_DIR = pathlib.Path('cache') / 'sections'
+SECTIONS_DIR.mkdir(parents=True, exist_ok=True)
+
+# How long each scraped section stays fresh: posts change daily, education almost never
+SECTION_TTLS = {
+    'profile': int(os.environ.get('SECTION_TTL_PROFILE', 3 * 86400)),
+    'experience': int(os.environ.get('SECTION_TTL_EXPERIENCE', 7 * 86400)),
+    'education': int(os.environ.get('SECTION_TTL_EDUCATION', 30 * 86400)),
+    'posts': int(os.environ.get('SECTION_TTL_POSTS', 12 * 3600))
+}
+MAX_STORED_SUMMARIES = 5  # Per profile, one per prompt / options combination
+
+def content_hash(value):
+    """Hash of a section's content, independent of dict ordering"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _record_file(profile_url):
+    return SECTIONS_DIR / f'{get_profile_id(profile_url)}.json'
+
+def load_sections(profile_url):
+    """Load the per-section record of a profile"""
+    try:
+        record_file = _record_file(profile_url)
+        if record_file.exists():
+            with open(record_file, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        logger.error(f'Error reading section cache: {str(e)}')
+    return {'url': profile_url, 'sections': {}, 'summaries': {}}
+
+def _write_record(profile_url, record):
+    record_file = _record_file(profile_url)
+    tmp_file = record_file.with_suffix('.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmp_file, record_file)
+
+def stale_sections(record):
+    """Sections that are missing or older than their TTL"""
+    now = time.time()
+    stale = []
+    for section, ttl in SECTION_TTLS.items():
+        entry = record['sections'].get(section)
+        if not entry or now - entry['scraped_at'] > ttl:
+            stale.append(section)
+    return stale
+
+def update_sections(profile_url, record, scraped):
+    """
+    Store freshly scraped sections with their timestamp and content hash.
+    Sections that failed to scrape (None) keep their previous entry and timestamp.
+    Returns the sections whose content actually changed.
+    """
+    changed = []
+    now = time.time()
+    stored = [section for section, data in scraped.items() if data is not None]
+    for section in stored:
+        data = scraped[section]
+        new_hash = content_hash(data)
+        previous = record['sections'].get(section)
+        if not previous or previous['hash'] != new_hash:
+            changed.append(section)
+        record['sections'][section] = {
+            'data': data,
+            'hash': new_hash,
+            'scraped_at': now
+        }
+    try:
+        _write_record(profile_url, record)
+        logger.info(f'Updated sections {stored} for {profile_url}, changed: {changed}')
+    except Exception as e:
+        logger.error(f'Error saving section cache: {str(e)}')
+    return changed
+
+def summary_fingerprint(record, custom_prompt=None, summary_options=None, facts=None):
+    """Identifies a summary by the section hashes it was generated from plus the prompt.
+    Locally computed facts are included because ongoing roles make them change over time."""
+    section_hashes = {section: entry['hash'] for section, entry in record['sections'].items()}
+    return content_hash([section_hashes, custom_prompt, summary_options, facts])
+
+def get_stored_summary(profile_url, fingerprint):
+    """Return a previously generated summary for unchanged sections, if any"""
+    entry = load_sections(profile_url).get('summaries', {}).get(fingerprint)
+    return entry['summary'] if entry else None
+
+def save_summary(profile_url, fingerprint, summary):
+    """Remember a generated summary so it's only regenerated when a section changes"""
+    try:
+        record = load_sections(profile_url)
+        summaries = record.setdefault('summaries', {})
+        summaries[fingerprint] = {'summary': summary, 'created_at': time.time()}
+        # Keep only the most recent few
+        for old in sorted(summaries, key=lambda k: summaries[k]['created_at'])[:-MAX_STORED_SUMMARIES]:
+            del summaries[old]
+        _write_record(profile_url, record)
+    except Exception as e:
+        logger.error(f'Error saving summary to section cache: {str(e)}')
@@ -1,7 +1,8 @@
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from typing import Tuple
+from typing import List, Tuple
 import os
+from metrics import span
 
 class SimilarityCalculator:
     _instance = None
@@ -21,7 +22,15 @@ class SimilarityCalculator:
         """
         Convert text to embedding vector
         """
-        return self.model.encode([text])[0]
+        with span('embedding'):
+            return self.model.encode([text])[0]
+
+    def get_embeddings(self, texts: List[str], normalize: bool = True) -> np.ndarray:
+        """
+        Convert a batch of texts to an embedding matrix in a single forward pass
+        """
+        with span('embedding'):
+            return self.model.encode(texts, normalize_embeddings=normalize)
 
     def cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
         """
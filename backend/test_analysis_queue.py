@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from analysis_queue import AnalysisQueue, QueueFull, queue_full_response
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.005)
+
+def queued(queue):
+    return len(queue._live) + len(queue._background)
+
+def start_waiter(queue, name, order, release, background=False):
+    """Thread that takes a slot, records its name and holds the slot until `release` is set"""
+    def run():
+        with queue.slot(background=background):
+            order.append(name)
+            release.wait(2)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_admits_up_to_concurrency():
+    queue = AnalysisQueue(concurrency=2, max_depth=0)
+    with queue.slot(), queue.slot():
+        assert queue._running == 2
+        with pytest.raises(QueueFull):
+            with queue.slot():
+                pass
+    assert queue._running == 0
+
+def test_queue_full_reports_position_and_retry_after():
+    queue = AnalysisQueue(concurrency=1, max_depth=1)
+    queue._avg_seconds = 30
+    release = threading.Event()
+    order = []
+    with queue.slot():
+        waiter = start_waiter(queue, 'queued', order, release)
+        wait_until(lambda: queued(queue) == 1)
+        with pytest.raises(QueueFull) as excinfo:
+            with queue.slot():
+                pass
+        assert excinfo.value.position == 2
+        assert excinfo.value.retry_after == 60
+    release.set()
+    waiter.join()
+    assert order == ['queued']
+
+def test_background_waiters_are_never_turned_away():
+    queue = AnalysisQueue(concurrency=1, max_depth=0)
+    release = threading.Event()
+    order = []
+    with queue.slot():
+        waiter = start_waiter(queue, 'refresh', order, release, background=True)
+        wait_until(lambda: queued(queue) == 1)
+    release.set()
+    waiter.join()
+    assert order == ['refresh']
+
+def test_slot_is_handed_to_live_waiters_first_in_fifo_order():
+    queue = AnalysisQueue(concurrency=1, max_depth=5)
+    release = threading.Event()
+    release.set()
+    order = []
+    threads = []
+    with queue.slot():
+        for name, background in (('refresh', True), ('live-1', False), ('live-2', False)):
+            threads.append(start_waiter(queue, name, order, release, background))
+            wait_until(lambda: queued(queue) == len(threads))
+    for thread in threads:
+        thread.join()
+    assert order == ['live-1', 'live-2', 'refresh']
+    assert queue._running == 0
+
+def test_live_waiter_gives_up_after_max_wait():
+    queue = AnalysisQueue(concurrency=1, max_depth=5, max_wait=0.05)
+    with queue.slot():
+        with pytest.raises(QueueFull) as excinfo:
+            with queue.slot():
+                pass
+        assert excinfo.value.position == 1
+        assert queued(queue) == 0
+    assert queue._running == 0
+
+def test_async_waiter_gives_up_after_max_wait():
+    queue = AnalysisQueue(concurrency=1, max_depth=5, max_wait=0.05)
+
+    async def run():
+        async with queue.aslot():
+            with pytest.raises(QueueFull):
+                async with queue.aslot():
+                    pass
+
+    asyncio.run(run())
+    assert queue._running == 0
+    assert queued(queue) == 0
+
+def test_queue_full_response():
+    body, status, headers = queue_full_response(QueueFull(3, 12))
+    assert status == 503
+    assert headers == {'Retry-After': '12'}
+    assert body['queue_position'] == 3
+    assert body['retry_after'] == 12
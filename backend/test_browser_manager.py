@@ -0,0 +1,79 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+psutil = pytest.importorskip('psutil')
+
+import browser_manager
+from browser_manager import BrowserManager
+
+# Stands in for the Playwright driver: starts a "browser" process for every line it reads
+DRIVER = '''
+import subprocess, sys
+for line in sys.stdin:
+    browser = subprocess.Popen([line.strip(), '30'])
+    print(browser.pid, flush=True)
+'''
+
+class FakeBrowser:
+    def on(self, event, callback):
+        pass
+
+    def is_connected(self):
+        return True
+
+    async def close(self):
+        pass
+
+class FakePlaywright:
+    def __init__(self, browser_executable):
+        self.browser_executable = browser_executable
+        self.driver = None
+        self.browser_pids = []
+
+    async def start(self):
+        self.driver = subprocess.Popen([sys.executable, '-c', DRIVER], stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE, text=True)
+        self.chromium = self
+        return self
+
+    async def launch(self, headless=True):
+        self.driver.stdin.write(f'{self.browser_executable}\n')
+        self.driver.stdin.flush()
+        self.browser_pids.append(int(self.driver.stdout.readline()))
+        return FakeBrowser()
+
+    def kill(self):
+        for pid in self.browser_pids:
+            try:
+                psutil.Process(pid).kill()
+            except psutil.Error:
+                pass
+        self.driver.kill()
+        self.driver.wait()
+
+@pytest.fixture
+def playwright(tmp_path, monkeypatch):
+    # Named like the Chromium headless shell build, which doesn't contain "chrom"
+    executable = tmp_path / 'headless_shell'
+    os.symlink(shutil.which('sleep'), executable)
+    fake = FakePlaywright(executable)
+    monkeypatch.setattr(browser_manager, 'async_playwright', lambda: fake)
+    yield fake
+    fake.kill()
+
+def test_launched_browser_process_is_found(playwright):
+    manager = BrowserManager(idle_seconds=0)
+
+    async def run():
+        async with manager.browser():
+            managed, = manager._browsers
+            assert managed.root_pid is not None, 'no browser process found; memory limits would be disabled'
+            assert managed.root_pid == playwright.browser_pids[0]
+            assert manager.total_rss() > 0
+
+    asyncio.run(run())
@@ -0,0 +1,132 @@
+import json
+import os
+from datetime import date, datetime, timezone
+
+import pytest
+
+from export_analyses import (
+    SCHEMAS,
+    analysis_rows,
+    iter_analysis_files,
+    iter_csv,
+    iter_export_rows,
+    parse_watermark
+)
+
+RAW_DATA = """
+=== Profile Information ===
+{'Name': 'Jane Doe', 'Designation': 'Staff Engineer', 'Location': 'N/A', 'About Title': 'About', 'About': 'Builds things'}
+
+=== Experience ===
+[{'Title': 'Staff Engineer', 'Company': 'Acme', 'Duration': 'Jan 2022 - Present · 2 yrs 6 mos', 'Location': 'Remote'}, {'Title': 'Engineer', 'Company': 'Initech', 'Duration': 'Jan 2020 - Dec 2021', 'Location': 'N/A'}]
+
+=== Education ===
+[{'School': 'MIT', 'Degree': 'BSc', 'Duration': '2015 - 2019'}]
+
+=== Posts ===
+['First post', 'Second post']
+
+=== Generated Professional Summary ===
+A summary
+"""
+
+# 2024-06-15 12:00 UTC
+ANALYZED_AT = 1718452800.0
+
+def make_analysis(analysis_id='a' * 20):
+    return {
+        'analysis_id': analysis_id,
+        'url': 'https://www.linkedin.com/in/jane/',
+        'analyzed_at': ANALYZED_AT,
+        'summary_options': {'years_of_experience': True},
+        'summary': 'A summary',
+        'raw_data': RAW_DATA,
+        'similarity_analysis': {'score': 0.5, 'metrics': {'raw_data_length': 100, 'summary_length': 9}}
+    }
+
+def rows_by_table(analysis, stored_at=ANALYZED_AT + 60):
+    tables = {table: [] for table in SCHEMAS}
+    for table, row in analysis_rows(analysis, stored_at):
+        tables[table].append(row)
+    return tables
+
+def test_rows_have_the_columns_of_their_schema():
+    for table, rows in rows_by_table(make_analysis()).items():
+        assert rows, table
+        for row in rows:
+            assert list(row) == [column for column, _ in SCHEMAS[table]]
+
+def test_profile_row():
+    profile, = rows_by_table(make_analysis())['profiles']
+    assert profile['name'] == 'Jane Doe'
+    assert profile['location'] is None
+    assert (profile['experience_count'], profile['education_count'], profile['posts_count']) == (2, 1, 2)
+    # Jan 2020 - Jun 2024, "Present" being the day of the analysis
+    assert profile['experience_months'] == 54
+    assert profile['overlapping_experience_months'] == 0
+    assert profile['summary_options'] == '{"years_of_experience": true}'
+    assert profile['similarity_score'] == 0.5
+    assert profile['analyzed_at'] == datetime(2024, 6, 15, 12, 0, tzinfo=timezone.utc)
+    assert profile['stored_at'] == datetime(2024, 6, 15, 12, 1, tzinfo=timezone.utc)
+
+def test_experience_and_education_rows():
+    tables = rows_by_table(make_analysis())
+    current, previous = tables['experience']
+    assert (current['start_month'], current['end_month'], current['is_current']) == (date(2022, 1, 1), None, True)
+    assert (previous['start_month'], previous['end_month'], previous['months']) == (date(2020, 1, 1), date(2021, 12, 1), 24)
+    assert previous['location'] is None
+    education, = tables['education']
+    assert (education['start_year'], education['end_year']) == (2015, 2019)
+
+def test_csv_has_header_and_one_line_per_row():
+    rows = analysis_rows(make_analysis(), ANALYZED_AT)
+    lines = ''.join(iter_csv(rows, 'experience')).splitlines()
+    assert lines[0] == ','.join(column for column, _ in SCHEMAS['experience'])
+    assert len(lines) == 3
+
+def write_analysis(cache_dir, analysis_id, mtime):
+    path = cache_dir / f'{analysis_id}.json'
+    path.write_text(json.dumps(make_analysis(analysis_id)))
+    os.utime(path, (mtime, mtime))
+    return path
+
+def exported_ids(files):
+    return [path.stem for _, path in files]
+
+def test_watermark_exports_each_file_once(tmp_path):
+    write_analysis(tmp_path, 'b' * 20, 1000.0)
+    write_analysis(tmp_path, 'c' * 20, 2000.0)
+    files, watermark = iter_analysis_files(tmp_path)
+    assert exported_ids(files) == ['b' * 20, 'c' * 20]
+    assert parse_watermark(watermark) == (2000.0, {'c' * 20})
+
+    files, next_watermark = iter_analysis_files(tmp_path, watermark)
+    assert files == []
+    assert next_watermark == watermark
+
+def test_watermark_keeps_files_sharing_its_coarse_mtime(tmp_path):
+    write_analysis(tmp_path, 'c' * 20, 2000.0)
+    _, watermark = iter_analysis_files(tmp_path)
+    # Written after the last export within the same mtime tick, with a smaller name
+    write_analysis(tmp_path, 'a' * 20, 2000.0)
+    files, watermark = iter_analysis_files(tmp_path, watermark)
+    assert exported_ids(files) == ['a' * 20]
+    assert parse_watermark(watermark) == (2000.0, {'a' * 20, 'c' * 20})
+    assert iter_analysis_files(tmp_path, watermark)[0] == []
+
+def test_bare_mtime_watermark_includes_that_mtime(tmp_path):
+    write_analysis(tmp_path, 'b' * 20, 1000.0)
+    write_analysis(tmp_path, 'c' * 20, 2000.0)
+    files, _ = iter_analysis_files(tmp_path, '2000.0')
+    assert exported_ids(files) == ['c' * 20]
+
+def test_invalid_watermark():
+    with pytest.raises(ValueError):
+        parse_watermark('yesterday')
+
+def test_unreadable_files_are_skipped(tmp_path):
+    write_analysis(tmp_path, 'b' * 20, 1000.0)
+    (tmp_path / f'{"c" * 20}.json').write_text('{not json')
+    files, _ = iter_analysis_files(tmp_path)
+    tables = [table for table, _ in iter_export_rows(files, ['profiles'])]
+    assert tables == ['profiles']
@@ -0,0 +1,10 @@
+from logging_setup import REDACTED, redact, redact_headers
+
+def test_header_style_keys_are_redacted():
+    headers = redact_headers({'X-Api-Key': 'k1', 'x-goog-api-key': 'k2', 'X-Auth-Token': 't', 'Content-Type': 'application/json'})
+    assert headers == {'X-Api-Key': REDACTED, 'x-goog-api-key': REDACTED, 'X-Auth-Token': REDACTED,
+                       'Content-Type': 'application/json'}
+
+def test_nested_json_fields_are_redacted():
+    body = redact({'url': 'https://x', 'credentials': [{'email': 'a@b.c', 'password': 'p', 'api-key': 'k'}]})
+    assert body == {'url': 'https://x', 'credentials': [{'email': 'a@b.c', 'password': REDACTED, 'api-key': REDACTED}]}
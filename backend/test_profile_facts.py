@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+
+from profile_facts import (
+    parse_duration,
+    experience_months,
+    format_months,
+    job_titles,
+    degrees,
+    extract_facts,
+    prepend_facts
+)
+
+TODAY = date(2024, 6, 15)
+
+def months(year, month):
+    return year * 12 + month - 1
+
+@pytest.mark.parametrize('duration, expected', [
+    ('Jan 2020 - Mar 2020 · 3 mos', (months(2020, 1), months(2020, 4))),
+    ('Jan 2020 - Present · 4 yrs 6 mos', (months(2020, 1), months(2024, 7))),
+    ('September 2019 – June 2021', (months(2019, 9), months(2021, 7))),
+    ('2018 - 2020', (2018 * 12, 2020 * 12)),
+    ('2019', (2019 * 12, 2020 * 12)),
+    ('Mar 2019', (months(2019, 3), months(2019, 4))),
+])
+def test_parse_duration(duration, expected):
+    assert parse_duration(duration, today=TODAY) == expected
+
+@pytest.mark.parametrize('duration', [None, '', 'N/A', 'sometime', 'Mar 2021 - Jan 2020', 'Foo 2020 - Present'])
+def test_parse_duration_rejects_unparseable(duration):
+    assert parse_duration(duration, today=TODAY) is None
+
+def test_experience_months_counts_overlaps_once():
+    experience = [
+        {'Duration': 'Jan 2020 - Dec 2020'},  # 12 months
+        {'Duration': 'Jul 2020 - Jun 2021'},  # 12 months, 6 overlapping
+        {'Duration': 'Jan 2023 - Mar 2023'},  # 3 months after a gap
+        {'Duration': 'N/A'}
+    ]
+    assert experience_months(experience, today=TODAY) == (21, 6)
+
+def test_experience_months_nested_role():
+    experience = [
+        {'Duration': 'Jan 2018 - Dec 2021'},
+        {'Duration': 'Mar 2019 - Apr 2019'}
+    ]
+    assert experience_months(experience, today=TODAY) == (48, 2)
+
+def test_experience_months_empty():
+    assert experience_months(None) == (0, 0)
+    assert experience_months([{'Duration': 'N/A'}]) == (0, 0)
+
+@pytest.mark.parametrize('value, expected', [
+    (0, '0 months'),
+    (1, '1 month'),
+    (12, '1 year'),
+    (25, '2 years 1 month'),
+])
+def test_format_months(value, expected):
+    assert format_months(value) == expected
+
+def test_job_titles_and_degrees_are_distinct():
+    experience = [{'Title': 'Engineer'}, {'Title': 'engineer '}, {'Title': 'N/A'}, {'Title': 'Lead'}]
+    education = [
+        {'Degree': 'BSc', 'School': 'MIT'},
+        {'Degree': 'N/A', 'School': 'Somewhere'},
+        {'Degree': 'MSc', 'School': 'N/A'}
+    ]
+    assert job_titles(experience) == ['Engineer', 'Lead']
+    assert degrees(education) == ['BSc (MIT)', 'MSc']
+
+def test_extract_facts_only_requested_fields():
+    sections = {'experience': [{'Title': 'Engineer', 'Duration': 'Jan 2020 - Dec 2020'}], 'education': []}
+    facts = extract_facts(sections, {'years_of_experience': True, 'degrees_earned': True})
+    assert facts == {'Years of Experience': '1 year', 'Degrees Earned': 'Not listed'}
+
+def test_prepend_facts_inside_markdown_fence():
+    summary = '```markdown\n# Summary\n```'
+    result = prepend_facts(summary, {'Degrees Earned': 'BSc (MIT)'})
+    assert result == '```markdown\n**Degrees Earned :** BSc (MIT)\n\n# Summary\n```'
+    assert prepend_facts('text', {}) == 'text'
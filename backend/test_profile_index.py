@@ -0,0 +1,55 @@
+import json
+
+import numpy as np
+import pytest
+
+import profile_index
+from profile_index import EMBEDDING_DIM, ProfileIndex
+
+def unit(*hot):
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    vector[list(hot)] = 1.0
+    return vector / np.linalg.norm(vector)
+
+class FakeCalculator:
+    """Embeds 'e<n>' as the n-th basis vector"""
+    def get_embeddings(self, texts):
+        return [unit(int(text.split()[0][1:])) for text in texts]
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch):
+    monkeypatch.setattr(profile_index, 'SimilarityCalculator', FakeCalculator)
+
+def test_other_workers_pick_up_added_and_updated_rows(tmp_path):
+    writer, reader = ProfileIndex(tmp_path), ProfileIndex(tmp_path)
+    writer.add('a', 'https://a', {'experience': 'e1'})
+    writer.add('b', 'https://b', {'experience': 'e2'})
+    assert [r['profile_id'] for r in reader.search(unit(2), top_k=1)] == ['b']
+
+    writer.add('a', 'https://a', {'experience': 'e3'})
+    assert len(reader) == 2
+    assert reader.get_vector('a')[3] == pytest.approx(1.0)
+    # One row per profile on disk, one log line per add
+    assert (tmp_path / 'embeddings.f32').stat().st_size == 2 * EMBEDDING_DIM * 4
+    assert len((tmp_path / 'profiles.jsonl').read_text().splitlines()) == 3
+
+def test_incomplete_log_line_is_ignored_and_replaced(tmp_path):
+    index = ProfileIndex(tmp_path)
+    index.add('a', 'https://a', {'experience': 'e1'})
+    with open(tmp_path / 'profiles.jsonl', 'a') as f:
+        f.write('{"row": 1, "profile_id": "tor')
+    assert len(ProfileIndex(tmp_path)) == 1
+
+    index.add('b', 'https://b', {'experience': 'e2'})
+    lines = (tmp_path / 'profiles.jsonl').read_text().splitlines()
+    assert [json.loads(line)['profile_id'] for line in lines] == ['a', 'b']
+    assert len(ProfileIndex(tmp_path)) == 2
+
+def test_legacy_index_is_migrated(tmp_path):
+    meta = [{'profile_id': 'a', 'url': 'https://a'}, {'profile_id': 'b', 'url': 'https://b'}]
+    np.save(tmp_path / 'embeddings.npy', np.stack([unit(1), unit(2)]))
+    (tmp_path / 'profiles.json').write_text(json.dumps(meta))
+    index = ProfileIndex(tmp_path)
+    assert len(index) == 2
+    assert index.search(unit(1), top_k=1)[0]['profile_id'] == 'a'
+    assert not (tmp_path / 'profiles.json').exists()
@@ -0,0 +1,83 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import TokenBucketLimiter, rate_limited
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'time', fake)
+    return fake
+
+@pytest.fixture
+def limiter(tmp_path, clock):
+    # Burst of 3, one token every 10 seconds
+    return TokenBucketLimiter(db_path=str(tmp_path / 'limits.db'), limits={'analyze': (3, 0.1)})
+
+def test_burst_then_retry_after(limiter, clock):
+    for _ in range(3):
+        assert limiter.acquire('1.2.3.4', 'analyze') == (True, 0.0)
+    admitted, retry_after = limiter.acquire('1.2.3.4', 'analyze')
+    assert not admitted
+    assert retry_after == pytest.approx(10.0)
+
+def test_tokens_refill_over_time(limiter, clock):
+    for _ in range(3):
+        limiter.acquire('1.2.3.4', 'analyze')
+    clock.now += 4
+    admitted, retry_after = limiter.acquire('1.2.3.4', 'analyze')
+    assert not admitted
+    assert retry_after == pytest.approx(6.0)
+    clock.now += 6
+    assert limiter.acquire('1.2.3.4', 'analyze')[0]
+
+def test_refill_is_capped_at_burst(limiter, clock):
+    limiter.acquire('1.2.3.4', 'analyze')
+    clock.now += 3600
+    assert [limiter.acquire('1.2.3.4', 'analyze')[0] for _ in range(4)] == [True, True, True, False]
+
+def test_clients_have_separate_buckets(limiter, clock):
+    for _ in range(3):
+        limiter.acquire('1.2.3.4', 'analyze')
+    assert not limiter.acquire('1.2.3.4', 'analyze')[0]
+    assert limiter.acquire('5.6.7.8', 'analyze')[0]
+
+def test_state_is_shared_between_limiters_on_one_file(tmp_path, clock):
+    db_path = str(tmp_path / 'limits.db')
+    first = TokenBucketLimiter(db_path=db_path, limits={'analyze': (1, 0.1)})
+    second = TokenBucketLimiter(db_path=db_path, limits={'analyze': (1, 0.1)})
+    assert first.acquire('1.2.3.4', 'analyze')[0]
+    assert not second.acquire('1.2.3.4', 'analyze')[0]
+
+def test_evict_keeps_most_recent_buckets(tmp_path, clock):
+    limiter = TokenBucketLimiter(db_path=str(tmp_path / 'limits.db'), limits={'analyze': (3, 0.1)}, max_buckets=2)
+    for client in ('a', 'b', 'c'):
+        limiter.acquire(client, 'analyze')
+        clock.now += 1
+    limiter.evict()
+    clients = [row[0] for row in limiter._connection().execute('SELECT client FROM buckets ORDER BY client')]
+    assert clients == ['b', 'c']
+
+def test_evict_leaves_other_tables_on_the_file(tmp_path, clock):
+    db_path = str(tmp_path / 'limits.db')
+    pacing = TokenBucketLimiter(db_path=db_path, limits={'scrape': (1, 0.001)}, table='account_buckets')
+    requests = TokenBucketLimiter(db_path=db_path, limits={'analyze': (3, 0.1)}, max_buckets=1)
+    assert pacing.acquire('account', 'scrape')[0]
+    for client in ('a', 'b'):
+        clock.now += 1
+        requests.acquire(client, 'analyze')
+    requests.evict()
+    assert not pacing.acquire('account', 'scrape')[0]
+
+def test_rate_limited_response():
+    body, status, headers = rate_limited(7)
+    assert status == 429
+    assert headers == {'Retry-After': '7'}
+    assert '7 seconds' in body['error']
@@ -0,0 +1,26 @@
+import os
+
+from response_cache import ResponseCache
+
+def write(cache_dir, analysis_id, body):
+    path = cache_dir / f'{analysis_id}.json'
+    path.write_bytes(body)
+    return os.stat(path).st_mtime
+
+def test_entry_read_before_clear_is_not_served(tmp_path):
+    cache = ResponseCache(tmp_path, ttl=3600)
+    mtime = write(tmp_path, 'a', b'{"old": true}')
+    generation = cache.generation
+    body = (tmp_path / 'a.json').read_bytes()
+    # Cleared after the read but before the entry is stored
+    cache.clear()
+    cache.put('a', body, mtime, generation)
+    assert cache.get('a') is None
+
+def test_entry_is_served_until_its_file_changes(tmp_path):
+    cache = ResponseCache(tmp_path, ttl=3600, revalidate_seconds=0)
+    mtime = write(tmp_path, 'a', b'{}')
+    cache.put('a', b'{}', mtime, cache.generation)
+    assert cache.get('a').body == b'{}'
+    os.utime(tmp_path / 'a.json', (mtime + 10, mtime + 10))
+    assert cache.get('a') is None
@@ -0,0 +1,25 @@
+import pytest
+
+import section_store
+from section_store import load_sections, update_sections
+
+PROFILE_URL = 'https://www.linkedin.com/in/jane/'
+
+@pytest.fixture(autouse=True)
+def sections_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(section_store, 'SECTIONS_DIR', tmp_path)
+
+def test_failed_sections_keep_their_previous_entry():
+    record = load_sections(PROFILE_URL)
+    update_sections(PROFILE_URL, record, {'experience': [{'Title': 'Engineer'}], 'posts': ['First post']})
+    previous = dict(record['sections'])
+
+    changed = update_sections(PROFILE_URL, record, {'experience': None, 'posts': ['Second post', 'First post']})
+    assert changed == ['posts']
+    assert record['sections']['experience'] == previous['experience']
+    assert load_sections(PROFILE_URL)['sections']['experience'] == previous['experience']
+
+def test_failed_section_is_not_stored_when_never_scraped():
+    record = load_sections(PROFILE_URL)
+    assert update_sections(PROFILE_URL, record, {'profile': None}) == []
+    assert 'profile' not in load_sections(PROFILE_URL)['sections']
@@ -23,6 +23,24 @@ const api = axios.create({
   baseURL: API_BASE_URL,
 });
 
+// Analysis IDs of profiles analyzed in this browser, so repeat analyses can be revalidated
+// with a cacheable GET (answered with a 304 when unchanged) instead of a new POST
+const ANALYSIS_IDS_KEY = 'analysisIds';
+
+const getAnalysisIds = () => {
+  try {
+    return JSON.parse(localStorage.getItem(ANALYSIS_IDS_KEY)) || {};
+  } catch {
+    return {};
+  }
+};
+
+const rememberAnalysisId = (key, analysisId) => {
+  if (analysisId) {
+    localStorage.setItem(ANALYSIS_IDS_KEY, JSON.stringify({ ...getAnalysisIds(), [key]: analysisId }));
+  }
+};
+
 const queryClient = new QueryClient({
   defaultOptions: {
     queries: {
@@ -429,16 +447,32 @@ function App() {
     setError(null);
 
     try {
-      const response = await api.post('/analyze-profile', { 
-        url,
-        customPrompt: customPrompt.trim() || undefined,
-        summaryOptions
-      });
+      const analysisKey = `${url}|${customPrompt.trim()}`;
+      const knownAnalysisId = getAnalysisIds()[analysisKey];
+      let response = null;
+      if (knownAnalysisId) {
+        try {
+          response = await api.get(`/analyses/${knownAnalysisId}`);
+        } catch (err) {
+          // Missing or out of date, so fall back to analyzing the profile again
+          if (err.response?.status !== 404) {
+            throw err;
+          }
+        }
+      }
+      if (!response) {
+        response = await api.post('/analyze-profile', { 
+          url,
+          customPrompt: customPrompt.trim() || undefined,
+          summaryOptions
+        });
+      }
       
       if (response.data.error) {
         throw new Error(response.data.error);
       }
 
+      rememberAnalysisId(analysisKey, response.data.analysis_id);
       setAnalysisResult(response.data);
       setChatState({
         messages: [],
@@ -555,6 +589,7 @@ function App() {
             <ChatDialog
               isOpen={isChatOpen}
               onClose={handleChatClose}
+              analysisId={analysisResult?.analysis_id}
               summary={analysisResult?.summary || ''}
               rawData={analysisResult?.raw_data || ''}
               chatState={chatState}
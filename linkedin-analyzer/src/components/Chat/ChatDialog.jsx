@@ -78,7 +78,7 @@ const ChatInput = ({ onSendMessage, disabled }) => {
   );
 };
 
-const ChatDialog = ({ isOpen, onClose, summary, rawData, chatState, onChatStateUpdate }) => {
+const ChatDialog = ({ isOpen, onClose, analysisId, summary, rawData, chatState, onChatStateUpdate }) => {
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
   const messagesEndRef = useRef(null);
@@ -95,20 +95,20 @@ const ChatDialog = ({ isOpen, onClose, summary, rawData, chatState, onChatStateU
 
   // Initialize chat session if needed
   useEffect(() => {
-    if (isOpen && !chatState.sessionId && summary && rawData) {
+    if (isOpen && !chatState.sessionId && (analysisId || (summary && rawData))) {
       initializeChat();
     }
-  }, [isOpen, summary, rawData]);
+  }, [isOpen, analysisId, summary, rawData]);
 
   const initializeChat = async () => {
     try {
       setIsLoading(true);
       setError(null);
       
-      const response = await api.post('/chat/init', {
-        summary,
-        raw_data: rawData,
-      });
+      // The server already holds the analysis; only fall back to re-uploading it for old results
+      const response = await api.post('/chat/init', analysisId
+        ? { analysis_id: analysisId }
+        : { summary, raw_data: rawData });
 
       if (response.data.session_id) {
         onChatStateUpdate({